@@ -7,5 +7,14 @@ gosu munge /usr/sbin/munged
 echo "---> Starting the slurmctld service ..."
 gosu root /opt/apps/slurm/sbin/slurmctld
 
+echo "---> Starting the Slurm job state poller ..."
+cd /home/nbcc/www/prowave && gosu nbcc python manage.py poll_slurm_jobs &
+
+echo "---> Starting the job submission worker ..."
+cd /home/nbcc/www/prowave && gosu nbcc python manage.py process_submissions &
+
+echo "---> Starting the file checksum updater ..."
+cd /home/nbcc/www/prowave && gosu nbcc python manage.py update_checksums &
+
 echo "---> Starting ProWaVE web service ..."
 cd /home/nbcc/www/prowave && gosu nbcc python manage.py runserver 0.0.0.0:8000
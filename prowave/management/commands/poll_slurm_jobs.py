@@ -0,0 +1,41 @@
+"""
+poll_slurm_jobs
+
+execution backend (SlurmBackend는 squeue/sacct) 를 주기적으로 조회하여 job 상태를 prowave.models.JobState에 기록함
+웹 요청에서는 squeue를 실행하지 않고 JobState만 읽음
+
+    python manage.py poll_slurm_jobs [--interval 10] [--once]
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from prowave.utils.backends import execution_backend
+
+
+class Command(BaseCommand):
+    help = 'Poll squeue/sacct and store Slurm job states in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='polling interval in seconds (default: settings.JOB_POLL_INTERVAL)')
+        parser.add_argument('--once', action='store_true', help='poll once and exit')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.JOB_POLL_INTERVAL
+        while True:
+            try:
+                for job in execution_backend().poll():
+                    self.stdout.write('%d %s %s' % (job.job_id, job.state, job.node))
+            except Exception as e:  # pylint: disable=broad-except
+                if options['once']:
+                    raise
+                # squeue 일시 장애 등으로 poller가 종료되지 않도록 오류를 출력하고 다음 주기에 다시 시도함
+                self.stderr.write('poll_slurm_jobs: %s' % e)
+            if options['once']:
+                return
+            # 오래 실행되는 프로세스이므로 매 주기마다 만료된 DB 연결을 정리함
+            close_old_connections()
+            time.sleep(interval)
@@ -0,0 +1,49 @@
+"""
+process_submissions
+
+Submission 대기열에서 queued 상태의 작업을 가져와 처리 (PDB 다운로드, cleanup, sbatch 제출) 하는 worker
+여러 프로세스를 동시에 실행해도 같은 Submission을 두 번 처리하지 않음
+
+    python manage.py process_submissions [--interval 1] [--once]
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from prowave.models import Submission
+
+
+class Command(BaseCommand):
+    help = 'Process queued job submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='polling interval in seconds (default: settings.SUBMISSION_POLL_INTERVAL)')
+        parser.add_argument('--once', action='store_true', help='process queued submissions and exit')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.SUBMISSION_POLL_INTERVAL
+        while True:
+            try:
+                self.drain()
+            except Exception as e:  # pylint: disable=broad-except
+                if options['once']:
+                    raise
+                # DB 연결 오류 등으로 worker가 종료되지 않도록 오류를 출력하고 다음 주기에 다시 시도함
+                self.stderr.write('process_submissions: %s' % e)
+            if options['once']:
+                return
+            close_old_connections()
+            time.sleep(interval)
+
+    def drain(self):
+        """
+        대기중인 Submission이 없을 때까지 처리
+        """
+        submission = Submission.claim()
+        while submission is not None:
+            submission.process()
+            self.stdout.write('%d %s %s %s' % (submission.id, submission.action, submission.state, submission.error))
+            submission = Submission.claim()
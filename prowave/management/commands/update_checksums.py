@@ -0,0 +1,42 @@
+"""
+update_checksums
+
+WEBMD_DATA_DIR, PROWAVE_DATA_DIR 의 파일 중 SHA-256이 저장되지 않았거나 바뀐 파일을 주기적으로 계산하여
+prowave.models.FileChecksum에 기록함 (prowave.utils.manifest.update_checksums)
+compute node가 mount된 work directory에 직접 쓴 파일도 manifest에 포함되며, 웹 요청에서는 SHA-256을 계산하지 않음
+
+    python manage.py update_checksums [--interval 60] [--once]
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from prowave.utils.manifest import update_checksums
+
+
+class Command(BaseCommand):
+    help = 'Compute and store SHA-256 checksums of new or modified work directory files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='scan interval in seconds (default: settings.CHECKSUM_UPDATE_INTERVAL)')
+        parser.add_argument('--once', action='store_true', help='scan once and exit')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.CHECKSUM_UPDATE_INTERVAL
+        while True:
+            try:
+                for data_dir in (settings.WEBMD_DATA_DIR, settings.PROWAVE_DATA_DIR):
+                    for file_path in update_checksums(data_dir):
+                        self.stdout.write(file_path)
+            except Exception as e:  # pylint: disable=broad-except
+                if options['once']:
+                    raise
+                # 파일 시스템 일시 장애 등으로 종료되지 않도록 오류를 출력하고 다음 주기에 다시 시도함
+                self.stderr.write('update_checksums: %s' % e)
+            if options['once']:
+                return
+            close_old_connections()
+            time.sleep(interval)
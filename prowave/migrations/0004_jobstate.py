@@ -0,0 +1,25 @@
+# Generated by Django 2.2.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prowave', '0003_auto_20190322_1106'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobState',
+            fields=[
+                ('job_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('state', models.CharField(default='PENDING', max_length=50)),
+                ('node', models.CharField(blank=True, default='', max_length=200)),
+                ('start_time', models.DateTimeField(null=True)),
+                ('end_time', models.DateTimeField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
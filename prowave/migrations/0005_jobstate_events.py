@@ -0,0 +1,28 @@
+# Generated by Django 2.2.2 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prowave', '0004_jobstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobstate',
+            name='message',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='jobstate',
+            name='progress',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='jobstate',
+            name='tracked',
+            field=models.BooleanField(default=False),
+        ),
+    ]
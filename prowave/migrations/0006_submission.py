@@ -0,0 +1,29 @@
+# Generated by Django 2.2.2 on 2026-10-18 15:40
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prowave', '0005_jobstate_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Submission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('action', models.CharField(max_length=50)),
+                ('work_id', models.IntegerField()),
+                ('params', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('submitted', 'Submitted'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True, default='')),
+                ('attempts', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.2 on 2026-10-18 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prowave', '0006_submission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobstate',
+            name='array_job_id',
+            field=models.IntegerField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobstate',
+            name='array_task_id',
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prowave', '0008_filechecksum'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE SEQUENCE prowave_local_job_id_seq',
+            reverse_sql='DROP SEQUENCE prowave_local_job_id_seq',
+        ),
+    ]
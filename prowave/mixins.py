@@ -1,8 +1,7 @@
 import glob
 import os
 import requests
-import subprocess
-from django.conf import settings
+from prowave.utils.backends import execution_backend
 
 
 class ModellerMixin:
@@ -14,7 +13,7 @@ class SlurmMixin:
 
     def submit_batch(self, base_name, sub_cmd, partition=None, dependency=None, gres=None):
         """
-        Slurm workload manager에 작업을 위임하기 위한 함수
+        Slurm workload manager (settings.EXECUTION_BACKEND) 에 작업을 위임하기 위한 함수
 
         :param base_name:
         :param sub_cmd:
@@ -23,25 +22,5 @@ class SlurmMixin:
         :param gres:
         :return:
         """
-        sbatch_exe = os.path.join(settings.SLURM_HOME, 'bin/sbatch')
-        assert os.path.exists(sbatch_exe)
         assert os.path.exists(self.work_dir)
-        cwd = os.getcwd()
-        try:
-            os.chdir('/home/nbcc')
-            cmd = [sbatch_exe, '--job-name', base_name]
-            if partition:
-                cmd += ['--partition', partition]
-            if dependency:
-                cmd += ['--dependency', dependency]
-            if gres:
-                cmd += ['--gres', gres]
-            cmd += sub_cmd
-            output = subprocess.check_output(cmd)
-            job_id = output.decode().split()[-1]
-            try:
-                return int(job_id)
-            except ValueError:
-                return -1
-        finally:
-            os.chdir(cwd)
+        return execution_backend().submit(sub_cmd, base_name, partition=partition, dependency=dependency, gres=gres)
@@ -6,11 +6,16 @@ import json
 import subprocess
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import JSONField
 from django.db import models, transaction
+from django.utils import timezone
 from geoip2 import database as geoip2_db
 from geoip2.errors import AddressNotFoundError
 from prowave.utils import get_rcsb_pdb, save_uploaded_pdb
-from prowave.utils.pdbutil import Topology
+from prowave.utils.pdbcolumnar import ColumnarModel
+from prowave.utils.pdbutil import Topology, open_structure
+from prowave.utils.backends import execution_backend
+from prowave.utils.slurm import format_elapsed, parse_slurm_time, sacct_jobs, squeue_jobs
 
 
 class UserInfo(models.Model):
@@ -143,19 +148,72 @@ class Work(models.Model):
         """
         Work.create
         """
+        instance = cls._create(owner, email, source, kwargs)
+        instance.prepare(mode, source, remote_ip, **kwargs)
+        return instance
+
+    @classmethod
+    @transaction.atomic()
+    def enqueue(cls, owner, email, mode, source, remote_ip, *args, **kwargs):
+        """
+        Work를 만들고 업로드된 파일만 저장한 뒤, PDB 다운로드, cleanup, sbatch 제출은 Submission으로 대기열에 넣음
+        process_submissions 명령이 Work.prepare, Work.run을 수행함
+
+        :return: (Work, Submission)
+        """
+        instance = cls._create(owner, email, source, kwargs)
+        params = dict(kwargs, mode=mode, source=source, remote_ip=remote_ip)
+        submission = Submission.objects.create(action='sfe.create', work_id=instance.id, params=params)
+        return instance, submission
+
+    @classmethod
+    @transaction.atomic()
+    def enqueue_batch(cls, owner, email, mode, remote_ip, pdb_ids=(), files=(), **kwargs):
+        """
+        여러 PDB ID 또는 파일에 대한 Work를 한 번에 만들고 (bulk_create), 하나의 Submission으로 대기열에 넣음
+        process_submissions 명령이 각 Work를 준비한 뒤 하나의 job array로 제출함
+
+        :return: (Work 의 list, Submission)
+        """
+        works = cls.objects.bulk_create([cls(email=email, owner=owner) for _ in range(len(pdb_ids) + len(files))])
+        items = []
+        for work, pdb_id in zip(works, pdb_ids):
+            items.append({'work_id': work.id, 'source': 'rcsb', 'pdb_id': pdb_id})
+        for work, file in zip(works[len(pdb_ids):], files):
+            save_uploaded_pdb(file, work.work_dir)
+            items.append({'work_id': work.id, 'source': 'upload', 'filename': file.name})
+
+        params = dict(kwargs, mode=mode, remote_ip=remote_ip, items=items, work_ids=[work.id for work in works])
+        submission = Submission.objects.create(action='sfe.batch', work_id=works[0].id, params=params)
+        return works, submission
+
+    @classmethod
+    def _create(cls, owner, email, source, kwargs):
+        """
+        Work를 만들고 업로드된 파일을 work_dir에 저장
+        kwargs의 file은 저장된 파일 이름 (filename) 으로 바뀜
+        """
         instance = cls.objects.create(email=email, owner=owner)
+        if source != 'rcsb':
+            file = kwargs.pop('file')
+            save_uploaded_pdb(file, instance.work_dir)
+            kwargs['filename'] = file.name
+        return instance
+
+    def prepare(self, mode, source, remote_ip, **kwargs):
+        """
+        RCSB PDB 다운로드, WorkHistory 기록 및 cleaned.pdb, model.pdb 생성
+        """
+        owner = self.owner
         if source == 'rcsb':
             pdb_id = kwargs.get('pdb_id')
-            filename = '%s.pdb' % pdb_id
-            get_rcsb_pdb(pdb_id, instance.work_dir)
+            filename = os.path.basename(get_rcsb_pdb(pdb_id, self.work_dir))
         else:
-            file = kwargs.get('file')
-            filename = file.name
-            save_uploaded_pdb(file, instance.work_dir)
+            filename = kwargs.get('filename')
 
         history = WorkHistory.objects.create(
-            work_id=instance.id,
-            email=email,
+            work_id=self.id,
+            email=self.email,
             name=owner.info.name if owner else kwargs.get('name'),
             position=owner.info.title if owner else kwargs.get('title'),
             org1=owner.info.organization if owner else kwargs.get('organization'),
@@ -169,44 +227,49 @@ class Work(models.Model):
         history.fill_info()
         history.save()
         # cleanup
-        with open(os.path.join(instance.work_dir, filename), 'r') as stream:
-            topo = Topology(stream)
-        cleaned_pdb_content = topo.cleanup().deserialize()
-        model_pdb_content = topo.create_model().deserialize()
-        with open(os.path.join(instance.work_dir, 'cleaned.pdb'), 'w') as stream:
-            stream.write(cleaned_pdb_content)
-        with open(os.path.join(instance.work_dir, 'model.pdb'), 'w') as stream:
-            stream.write(model_pdb_content)
-        return instance
+        with open_structure(os.path.join(self.work_dir, filename)) as stream:
+            topo = Topology.load(stream, model_class=ColumnarModel)
+        with open(os.path.join(self.work_dir, 'cleaned.pdb'), 'w') as stream:
+            topo.cleanup().write(stream)
+        with open(os.path.join(self.work_dir, 'model.pdb'), 'w') as stream:
+            topo.create_model().write(stream)
+        return self
 
     def run(self):
         """
         Work.run
         """
-        sbatch_exe = os.path.join(settings.SLURM_HOME, 'bin/sbatch')
-        cwd = os.getcwd()
-        try:
-            os.chdir('/home/nbcc')
-            cmd = [
-                sbatch_exe,
-                '--job-name', 'SFE',
-                '--partition', 'prowave',
-                '--gres', 'gpu:1',
-                os.path.join(settings.BASE_DIR, 'sfe/scripts/run.py'),
-                '%d' % self.id,
-                self.history.mode,
-            ]
-            output = subprocess.check_output(cmd)
-            job_id = output.decode().split()[-1]
-            try:
-                slurm_job_id = int(job_id)
-                with open(os.path.join(self.work_dir, 'slurm_job_id'), 'w') as stream:
-                    stream.write('%d' % slurm_job_id)
-                return {'run': True, 'slurm_job_id': slurm_job_id, 'work_id': self.id}
-            except ValueError:
-                return {'run': False, 'slurm_job_id': -1, 'work_id': self.id}
-        finally:
-            os.chdir(cwd)
+        slurm_job_id = execution_backend().submit(
+            [os.path.join(settings.BASE_DIR, 'sfe/scripts/run.py'), '%d' % self.id, self.history.mode],
+            'SFE', partition='prowave', gres='gpu:1')
+        if slurm_job_id < 0:
+            return {'run': False, 'slurm_job_id': -1, 'work_id': self.id}
+
+        with open(os.path.join(self.work_dir, 'slurm_job_id'), 'w') as stream:
+            stream.write('%d' % slurm_job_id)
+        WorkJob.objects.create(job_id=slurm_job_id, work_id=self.id, work_type='sfe')
+        return {'run': True, 'slurm_job_id': slurm_job_id, 'work_id': self.id}
+
+    @classmethod
+    def run_array(cls, works, mode):
+        """
+        여러 Work를 sfe/scripts/run.py의 job array 하나로 제출
+        array task i는 works[i]를 계산하며, 각 Work에는 array job id와 task id를 기록함
+        """
+        work_ids = [work.id for work in works]
+        slurm_job_id = execution_backend().submit(
+            [os.path.join(settings.BASE_DIR, 'sfe/scripts/run.py'), ','.join('%d' % x for x in work_ids), mode],
+            'SFE', partition='prowave', gres='gpu:1', array='0-%d' % (len(works) - 1))
+        if slurm_job_id < 0:
+            return {'run': False, 'slurm_job_id': -1, 'work_ids': work_ids}
+
+        for task_id, work in enumerate(works):
+            with open(os.path.join(work.work_dir, 'slurm_job_id'), 'w') as stream:
+                stream.write('%d' % slurm_job_id)
+            with open(os.path.join(work.work_dir, 'slurm_array_task_id'), 'w') as stream:
+                stream.write('%d' % task_id)
+        WorkJob.objects.bulk_create([WorkJob(job_id=slurm_job_id, work_id=x, work_type='sfe') for x in work_ids])
+        return {'run': True, 'slurm_job_id': slurm_job_id, 'work_ids': work_ids}
 
     @property
     def work_dir(self):
@@ -228,21 +291,52 @@ class Work(models.Model):
         except (AssertionError, ValueError):
             return -1
 
+    @property
+    def slurm_array_task_id(self):
+        """
+        :return: job array로 제출된 경우 이 Work의 array task id, 아니면 None
+        """
+        try:
+            with open(os.path.join(self.work_dir, 'slurm_array_task_id'), 'r') as stream:
+                return int(stream.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def job_state(self):
+        """
+        이 Work의 JobState (execution backend에서 읽음)
+        """
+        return execution_backend().job_state(self.slurm_job_id, self.slurm_array_task_id)
+
     @property
     def status(self):
         """
         job execution status
+        squeue를 실행하지 않고 execution backend가 기록한 JobState를 읽음
         """
         if os.path.exists(os.path.join(self.work_dir, 'result.json')):
             return {'done': True}
 
-        if self.slurm_job_id > 0:
-            squeue_lines = subprocess.check_output(['squeue', '-h']).decode().split('\n')
-            for line in squeue_lines:
-                job_status = line.strip().split()
-                if job_status and self.slurm_job_id == int(job_status[0]):
-                    message = "Job is Running on node {} ({})".format(job_status[7], job_status[5])
-                    return {'done': False, 'found': True, 'message': message}
+        if self.slurm_job_id < 0:
+            submission = Submission.objects.filter(
+                models.Q(work_id=self.id, action='sfe.create') |
+                models.Q(action='sfe.batch', params__work_ids__contains=self.id)
+            ).order_by('-id').first()
+            if submission and submission.pending:
+                return {'done': False, 'found': True, 'message': 'Job is waiting for submission'}
+            if submission and submission.error_for(self.id):
+                return {'done': False, 'found': False, 'failed': True, 'message': submission.error_for(self.id)}
+
+        job = self.job_state
+        if job and job.active:
+            message = "Job is Running on node {} ({})".format(job.node, job.elapsed)
+            status = {'done': False, 'found': True, 'message': message}
+            if job.progress is not None:
+                status['progress'] = job.progress
+            return status
+        if job and job.failed:
+            return {'done': False, 'found': False, 'failed': True, 'message': job.message or job.state}
         return {'done': False, 'found': False}
 
     @property
@@ -290,6 +384,348 @@ class WorkJob(models.Model):
         default='sfe')
 
 
+class JobState(models.Model):
+    """
+    Slurm job 상태
+    poll_slurm_jobs 명령이 squeue/sacct 결과를 주기적으로 기록하고, Work.status, Trajectory.running 등은 이 테이블만 읽음
+    계산 script가 job event (start, progress, success, failure) 를 보낸 job (tracked) 은 event로 상태를 기록하고,
+    event 없이 queue에서 빠진 경우에만 sacct로 최종 상태를 기록함
+    job_id는 prowave.WorkJob, webmd.WorkJob, webmd.WorkAnalysisJob의 job_id
+    job array는 array job id로 기록하고, 각 task는 start event를 보낼 때 task의 job id로 따로 기록함 (array_job_id, array_task_id)
+    """
+    ACTIVE_STATES = ('PENDING', 'CONFIGURING', 'RUNNING', 'COMPLETING', 'SUSPENDED', 'STOPPED',
+                     'REQUEUED', 'REQUEUE_HOLD', 'REQUEUE_FED', 'RESIZING', 'SIGNALING', 'STAGE_OUT')
+    FAILED_STATES = ('FAILED', 'CANCELLED', 'TIMEOUT', 'NODE_FAIL', 'OUT_OF_MEMORY', 'BOOT_FAIL', 'DEADLINE')
+    EVENT_STATES = {
+        'start': 'RUNNING',
+        'progress': 'RUNNING',
+        'success': 'COMPLETED',
+        'failure': 'FAILED',
+    }
+
+    job_id = models.IntegerField(primary_key=True)
+    state = models.CharField(max_length=50, default='PENDING')
+    node = models.CharField(max_length=200, blank=True, default='')
+    start_time = models.DateTimeField(null=True)
+    end_time = models.DateTimeField(null=True)
+    progress = models.FloatField(null=True)
+    message = models.TextField(blank=True, default='')
+    tracked = models.BooleanField(default=False)
+    array_job_id = models.IntegerField(null=True, db_index=True)
+    array_task_id = models.IntegerField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def submitted(cls, job_id):
+        """
+        제출한 job을 PENDING 상태로 기록
+        """
+        return cls.objects.update_or_create(job_id=job_id, defaults={
+            'state': 'PENDING', 'node': '', 'start_time': None, 'end_time': None,
+            'progress': None, 'message': '', 'tracked': False,
+        })[0]
+
+    @classmethod
+    def array_task(cls, job_id, array_job_id, array_task_id):
+        """
+        job array task의 JobState, 처음 event를 보낸 task이면 새로 기록함
+        Slurm은 마지막 task에 array job id를 그대로 쓰므로 이 task는 array job의 JobState를 task로 사용함
+        array job이 기록되어 있지 않으면 DoesNotExist를 발생시킴
+        """
+        array_job = cls.objects.get(job_id=array_job_id)
+        job = cls.objects.get_or_create(job_id=job_id, defaults={'node': array_job.node})[0]
+        if job.array_task_id is None:
+            job.array_job_id = array_job_id
+            job.array_task_id = array_task_id
+            job.save()
+        return job
+
+    @classmethod
+    def is_active(cls, job_id):
+        """
+        job이 queue에 남아있는 (PENDING, RUNNING 등) 상태인지 체크
+        """
+        return cls.objects.filter(job_id=job_id, state__in=cls.ACTIVE_STATES).exists()
+
+    @classmethod
+    def poll(cls, squeue_exe=None, sacct_exe=None):
+        """
+        queue에 남아있는 것으로 기록된 job의 상태를 squeue로 갱신하고,
+        queue에서 빠진 job은 sacct로 최종 상태를 기록함
+        sacct로도 찾을 수 없으면 (accounting 미사용 등) UNKNOWN 상태와 현재 시간을 종료 시간으로 기록함
+        job event를 보낸 (tracked) job은 queue에 있는 동안에는 event로 기록한 상태를 그대로 두고,
+        event 없이 queue에서 빠진 경우 (SIGKILL, OUT_OF_MEMORY, NODE_FAIL 등) 에만 sacct로 최종 상태를 기록함
+
+        :return: 상태가 갱신된 JobState 의 list
+        """
+        jobs = list(cls.objects.filter(state__in=cls.ACTIVE_STATES))
+        if not jobs:
+            return []
+
+        queue = squeue_jobs(squeue_exe or settings.SQUEUE_EXE)
+        # job array의 task는 squeue에 123_4, 123_[5-9] 처럼 표시되므로 array job id로도 찾을 수 있도록 함
+        for key, entry in list(queue.items()):
+            array_job_id = key.split('_')[0]
+            if array_job_id != key and (array_job_id not in queue or entry.state_name == 'RUNNING'):
+                queue[array_job_id] = entry
+        finished = [job.slurm_key for job in jobs if job.slurm_key not in queue]
+        try:
+            accounts = sacct_jobs(finished, sacct_exe or settings.SACCT_EXE)
+        except (OSError, subprocess.CalledProcessError):
+            accounts = dict()
+        for key, account in list(accounts.items()):
+            array_job_id = key.split('_')[0]
+            if array_job_id != key and (array_job_id not in accounts or account.state != 'COMPLETED'):
+                accounts[array_job_id] = account
+
+        now = timezone.now()
+        updated = []
+        for job in jobs:
+            entry = queue.get(job.slurm_key)
+            if entry and job.tracked:
+                continue
+            if entry:
+                values = {
+                    'state': entry.state_name,
+                    'node': entry.nodelist,
+                    'start_time': _aware(parse_slurm_time(entry.start_time)) if entry.state_name != 'PENDING' else None,
+                    'end_time': None,
+                }
+            elif job.slurm_key in accounts:
+                account = accounts[job.slurm_key]
+                values = {
+                    'state': account.state,
+                    'node': account.nodelist if account.nodelist != 'None assigned' else '',
+                    'start_time': _aware(account.start_time) or job.start_time,
+                    'end_time': _aware(account.end_time) or now,
+                }
+            else:
+                values = {'state': 'UNKNOWN', 'end_time': now}
+
+            if any(getattr(job, key) != value for key, value in values.items()):
+                # poll 하는 동안 도착한 success, failure event를 덮어쓰지 않도록 아직 queue에 있는 것으로 기록된 경우에만 갱신함
+                if cls.objects.filter(job_id=job.job_id, state__in=cls.ACTIVE_STATES) \
+                        .update(updated_at=now, **values):
+                    for key, value in values.items():
+                        setattr(job, key, value)
+                    updated.append(job)
+        return updated
+
+    def record_event(self, event, node='', progress=None, message=''):
+        """
+        계산 script가 보낸 job event를 기록
+        이미 끝난 job에 늦게 도착한 start, progress event는 무시함
+
+        :param event: start, progress, success, failure 중 하나
+        :param node: event를 보낸 node 이름
+        :param progress: 진행률 (0 ~ 1)
+        :param message: 진행 상황 또는 오류 메시지
+        """
+        state = self.EVENT_STATES[event]
+        self.tracked = True
+        if state == 'RUNNING' and not self.active:
+            return self
+
+        now = timezone.now()
+        self.state = state
+        if node:
+            self.node = node
+        if message:
+            self.message = message
+        if progress is not None:
+            self.progress = progress
+        if not self.start_time:
+            self.start_time = now
+        if state == 'COMPLETED':
+            self.progress = 1.0
+        if state != 'RUNNING':
+            self.end_time = now
+        self.save()
+        return self
+
+    @property
+    def slurm_key(self):
+        """
+        squeue, sacct가 출력하는 job id, job array의 task는 <array job id>_<task id>
+        """
+        if self.array_task_id is not None:
+            return '%d_%d' % (self.array_job_id, self.array_task_id)
+        return '%d' % self.job_id
+
+    @property
+    def active(self):
+        return self.state in self.ACTIVE_STATES
+
+    @property
+    def failed(self):
+        return self.state in self.FAILED_STATES
+
+    @property
+    def elapsed(self):
+        """
+        squeue %M 과 같은 형식의 실행 시간, 시작 전이면 0:00
+        """
+        if not self.start_time:
+            return format_elapsed(0)
+        end_time = self.end_time or timezone.now()
+        return format_elapsed((end_time - self.start_time).total_seconds())
+
+
+def _aware(value):
+    """
+    Slurm이 출력한 (서버 local time) naive datetime을 USE_TZ 설정에 맞게 변환
+    """
+    if value is None or not settings.USE_TZ:
+        return value
+    return timezone.make_aware(value)
+
+
+SUBMISSION_HANDLERS = dict()
+
+
+def submission_handler(action):
+    """
+    Submission.action을 처리하는 함수를 등록하는 데코레이터
+    등록된 함수는 Submission을 인자로 받아 {'run': bool, ...} 형식의 결과를 반환함
+    """
+    def decorator(func):
+        SUBMISSION_HANDLERS[action] = func
+        return func
+    return decorator
+
+
+class Submission(models.Model):
+    """
+    작업 제출 대기열
+    HTTP 요청에서는 Submission을 만들고 바로 응답하며 (202), process_submissions 명령이
+    queued 상태의 Submission을 하나씩 가져와 (select_for_update skip_locked) 등록된 handler로 처리함
+    """
+    STATES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('submitted', 'Submitted'),
+        ('failed', 'Failed'),
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    action = models.CharField(max_length=50)
+    work_id = models.IntegerField()
+    params = JSONField(default=dict, blank=True)
+    state = models.CharField(max_length=20, choices=STATES, default='queued')
+    result = JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.IntegerField(default=0)
+
+    @classmethod
+    def claim(cls):
+        """
+        가장 오래된 queued Submission을 running 상태로 바꾸어 가져옴
+        다른 worker가 처리중인 row는 건너뜀
+
+        :return: Submission 또는 대기중인 것이 없으면 None
+        """
+        with transaction.atomic():
+            submission = cls.objects.select_for_update(skip_locked=True) \
+                .filter(state='queued').order_by('id').first()
+            if submission is None:
+                return None
+            submission.state = 'running'
+            submission.attempts += 1
+            submission.save()
+        return submission
+
+    def process(self):
+        """
+        등록된 handler로 Submission을 처리하고 결과를 기록함
+        """
+        try:
+            self.result = SUBMISSION_HANDLERS[self.action](self)
+            self.state = 'submitted' if self.result.get('run') else 'failed'
+            self.error = '' if self.result.get('run') else 'sbatch did not return a job id'
+        except Exception as e:  # pylint: disable=broad-except
+            self.state = 'failed'
+            self.error = '%s: %s' % (type(e).__name__, e)
+        self.save()
+        return self
+
+    @property
+    def pending(self):
+        return self.state in ('queued', 'running')
+
+    def error_for(self, work_id):
+        """
+        work_id의 Work를 제출하지 못한 이유, 제출되었거나 처리 전이면 빈 문자열
+        """
+        error = self.result.get('errors', dict()).get('%d' % work_id) if self.result else None
+        if error:
+            return error
+        return self.error if self.state == 'failed' else ''
+
+    @property
+    def handle(self):
+        """
+        Submission을 조회할 수 있는 job handle
+        """
+        return {
+            'submission_id': self.id,
+            'url': '/api/submissions/%d/' % self.id,
+            'action': self.action,
+            'work_id': self.work_id,
+            'work_ids': self.params.get('work_ids', [self.work_id]),
+            'state': self.state,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+@submission_handler('sfe.create')
+def _submit_sfe_work(submission):
+    work = Work.objects.get(id=submission.work_id)
+    with transaction.atomic():
+        work.prepare(**submission.params)
+    return work.run()
+
+
+@submission_handler('sfe.batch')
+def _submit_sfe_batch(submission):
+    params = dict(submission.params)
+    items = params.pop('items')
+    params.pop('work_ids')
+    works = Work.objects.in_bulk([item['work_id'] for item in items])
+    prepared, errors = [], dict()
+    for item in items:
+        work = works[item['work_id']]
+        try:
+            with transaction.atomic():
+                work.prepare(**dict(params, **item))
+            prepared.append(work)
+        except Exception as e:  # pylint: disable=broad-except
+            # 준비하지 못한 Work는 job array에서 제외하고 나머지는 제출함
+            errors['%d' % work.id] = '%s: %s' % (type(e).__name__, e)
+    if not prepared:
+        return {'run': False, 'slurm_job_id': -1, 'work_ids': [], 'errors': errors}
+
+    result = Work.run_array(prepared, params['mode'])
+    result['errors'] = errors
+    return result
+
+
+class FileChecksum(models.Model):
+    """
+    work directory 파일의 SHA-256 (prowave.utils.manifest)
+    파일을 쓰거나 업로드를 commit할 때, 또는 update_checksums command가 저장하며,
+    manifest는 파일의 크기와 수정 시간 (ns) 이 저장된 값과 같은 경우에만 사용함
+    path는 절대 경로
+    """
+    path = models.CharField(max_length=1024, unique=True)
+    size = models.BigIntegerField()
+    mtime_ns = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
 class WorkHistory(models.Model, GeoIPMixin):
     """
     Work History
@@ -0,0 +1,5 @@
+"""
+prowave.scripts
+
+compute script가 공용으로 사용하는 모듈 (Django 없이 import 가능해야 함)
+"""
@@ -0,0 +1,59 @@
+"""
+prowave.scripts.jobs
+
+compute script (webmd/scripts, sfe/scripts) 가 controller에 job event (start, progress, success, failure) 를 보내는 함수
+controller 주소는 모든 script가 PROWAVE_API_HOST 환경 변수로 지정하며,
+controller가 job 환경 변수로 넘겨준 PROWAVE_JOB_EVENT_TOKEN을 X-Prowave-Job-Token header로 보냄
+"""
+import os
+import signal
+import socket
+from functools import wraps
+
+import requests
+
+API_HOST = os.environ.get('PROWAVE_API_HOST', 'slurmctld:8000')
+JOB_EVENT_TOKEN = os.environ.get('PROWAVE_JOB_EVENT_TOKEN', '')
+
+
+def job_event(event, **data):
+    """
+    controller에 job event (start, progress, success, failure) 를 보냄
+    Slurm 밖에서 실행되어 SLURM_JOB_ID가 없으면 보내지 않으며, 전송 실패는 계산에 영향을 주지 않음
+    job array의 task이면 array job id와 task id를 함께 보냄
+    """
+    job_id = os.environ.get('SLURM_JOB_ID')
+    if not job_id:
+        return
+    data.update(event=event, node=socket.gethostname())
+    if os.environ.get('SLURM_ARRAY_JOB_ID'):
+        data.update(array_job_id=os.environ['SLURM_ARRAY_JOB_ID'],
+                    array_task_id=os.environ['SLURM_ARRAY_TASK_ID'])
+    try:
+        requests.post('http://%s/api/jobs/%s/events/' % (API_HOST, job_id), data=data,
+                      headers={'X-Prowave-Job-Token': JOB_EVENT_TOKEN}, timeout=10)
+    except requests.RequestException:
+        pass
+
+
+def _terminate(signum, _frame):
+    raise SystemExit('terminated by signal %d' % signum)
+
+
+def report_job(func):
+    """
+    Decorated 함수의 시작, 성공, 실패를 job event로 보내는 데코레이터
+    scancel 등으로 SIGTERM을 받은 경우에도 failure를 보냄
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        signal.signal(signal.SIGTERM, _terminate)
+        job_event('start')
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            job_event('failure', message='%s: %s' % (type(e).__name__, e))
+            raise
+        job_event('success')
+        return result
+    return wrapper
@@ -0,0 +1,381 @@
+"""
+prowave.scripts.transfer
+
+compute script (webmd/scripts, sfe/scripts) 가 controller와 파일을 주고받는 HTTP client
+sbatch는 script를 spool directory로 복사하여 실행하므로 script 옆의 모듈을 import할 수 없음
+backend가 job의 PYTHONPATH에 settings.COMPUTE_PYTHONPATH를 추가하므로 이 모듈은
+`from prowave.scripts.transfer import TransferClient` 로 import 하며, compute 환경에는 Django가 없으므로 requests만 사용함
+"""
+import errno
+import hashlib
+import os
+import shutil
+import socket
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 작업 directory가 compute node에 mount되어 있으면 HTTP 대신 직접 읽고 씀 (auto, shared, http)
+STAGING = os.environ.get('PROWAVE_STAGING', 'auto')
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# node-local input cache, PROWAVE_INPUT_CACHE_DIR를 빈 문자열로 지정하면 사용하지 않음
+INPUT_CACHE_DIR = os.environ.get('PROWAVE_INPUT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'prowave-input-cache'))
+INPUT_CACHE_SIZE = int(os.environ.get('PROWAVE_INPUT_CACHE_SIZE', 10 * 1024 ** 3))
+
+
+def shared_work_dir(data_dir, work_id, marker):
+    """
+    controller의 work directory가 이 node에 mount되어 있으면 그 경로, 아니면 None (HTTP로 전송)
+    work directory에 marker 파일이 보이고 쓸 수 있으면 mount된 것으로 판단하며,
+    PROWAVE_STAGING=http 이면 항상 HTTP를, PROWAVE_STAGING=shared 이면 항상 mount된 경로를 사용함
+    """
+    if STAGING == 'http':
+        return None
+    work_dir = os.path.join(data_dir, '%s' % work_id)
+    if os.path.exists(os.path.join(work_dir, marker)) and os.access(work_dir, os.W_OK):
+        return work_dir
+    if STAGING == 'shared':
+        raise RuntimeError('%s is not mounted on %s' % (work_dir, socket.gethostname()))
+    return None
+
+
+def store_file(work_dir, file_path, remote_path=None):
+    """
+    file_path를 mount된 work directory에 복사
+    같은 directory의 임시 파일에 쓴 뒤 rename 하므로 controller에는 완성된 파일만 보임
+    """
+    target = os.path.join(work_dir, remote_path or file_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.%s.' % os.path.basename(target),
+                                     suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as stream, open(file_path, 'rb') as source:
+            shutil.copyfileobj(source, stream, 1024 * 1024)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, target)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def file_sha256(file_path):
+    """
+    파일의 SHA-256 (hex)
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def link_or_copy(source, target):
+    """
+    source를 target에 hardlink, 다른 filesystem이면 복사함
+    """
+    try:
+        os.link(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copyfile(source, target)
+
+
+class InputCache:
+    """
+    compute node의 content-addressed 입력 파일 cache
+    <cache_dir>/<sha256 앞 2자리>/<sha256> 에 저장하고 작업 directory에는 hardlink를 만들며,
+    전체 크기가 max_size를 넘으면 가장 오래 사용하지 않은 (mtime) 파일부터 지움
+    같은 node의 여러 job이 동시에 사용하므로 파일은 rename으로만 추가하고, 지워진 파일은 cache miss로 처리함
+    cache의 파일은 hardlink로 공유되므로 읽기 전용 (0444) 으로 저장함
+    """
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    @classmethod
+    def from_environ(cls):
+        """
+        PROWAVE_INPUT_CACHE_DIR, PROWAVE_INPUT_CACHE_SIZE의 cache 또는 사용하지 않으면 None
+        """
+        if not INPUT_CACHE_DIR or INPUT_CACHE_SIZE <= 0:
+            return None
+        return cls(INPUT_CACHE_DIR, INPUT_CACHE_SIZE)
+
+    def path(self, sha256):
+        return os.path.join(self.cache_dir, sha256[:2], sha256)
+
+    def link(self, sha256, file_path):
+        """
+        cache에 sha256의 파일이 있으면 file_path에 link하고 사용 시간을 갱신함
+        file_path가 이미 있으면 (같은 work directory에서 다시 실행하거나 requeue된 job 등) 교체함
+
+        :return: cache hit 여부
+        """
+        source = self.path(sha256)
+        temp_path = '%s.%s.%d.part' % (file_path, socket.gethostname(), os.getpid())
+        try:
+            os.utime(source)
+            link_or_copy(source, temp_path)
+            os.replace(temp_path, file_path)
+        except FileNotFoundError:
+            return False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return True
+
+    def add(self, file_path, sha256):
+        """
+        내용의 SHA-256이 sha256과 같은 경우에만 file_path를 cache에 추가하고 max_size를 넘는 파일을 지움
+
+        :return: 추가 여부
+        """
+        if file_sha256(file_path) != sha256:
+            return False
+        target = self.path(sha256)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not os.path.exists(target):
+            temp_path = '%s.%s.%d.part' % (target, socket.gethostname(), os.getpid())
+            try:
+                link_or_copy(file_path, temp_path)
+                os.chmod(temp_path, 0o444)
+                os.replace(temp_path, target)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        self.evict()
+        return True
+
+    def entries(self):
+        """
+        cache 파일의 (마지막 사용 시간, 크기, 경로) 의 list
+        """
+        entries = []
+        for directory, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith('.part'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """
+        전체 크기가 max_size 이하가 될 때까지 가장 오래 사용하지 않은 파일부터 지움
+        hardlink로 사용중인 job의 파일은 그대로 남음
+
+        :return: 지운 파일 경로의 list
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                removed.append(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
+
+
+class TransferClient:
+    """
+    keep-alive 연결을 재사용하고, 연결 오류와 5xx 응답은 backoff 후 다시 보내는 HTTP client
+    다운로드는 메모리에 모두 읽지 않고 파일에 스트림하며, 여러 파일은 max_workers 개의 thread에서 동시에 받음
+    """
+    def __init__(self, max_workers=4, retries=5, backoff=1.0, timeout=(10, 300), chunk_size=CHUNK_SIZE, cache=None):
+        """
+        :param max_workers: 동시에 받을 파일 수 (connection pool 크기)
+        :param retries: 요청을 보낼 최대 횟수
+        :param backoff: 첫 번째 재시도까지 기다리는 시간 (초), 재시도마다 두 배가 됨
+        :param timeout: requests timeout (connect, read)
+        :param chunk_size: 다운로드, 업로드 chunk 크기 (bytes)
+        :param cache: fetch에서 사용할 InputCache
+        """
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def retry(self, func):
+        """
+        func를 실행하고 연결 오류나 5xx 응답으로 실패하면 backoff 후 다시 실행함
+        4xx 응답 (HTTPError) 은 다시 보내도 같으므로 바로 발생시킴
+        """
+        for attempt in range(self.retries):
+            try:
+                return func()
+            except requests.RequestException as e:
+                response = getattr(e, 'response', None)
+                if attempt == self.retries - 1 or (response is not None and response.status_code < 500):
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def request(self, method, url, accept=(), **kwargs):
+        """
+        재시도하는 HTTP 요청
+
+        :param accept: 오류로 처리하지 않을 4xx status code
+        """
+        kwargs.setdefault('timeout', self.timeout)
+
+        def send():
+            response = self.session.request(method, url, **kwargs)
+            if response.status_code not in accept:
+                response.raise_for_status()
+            return response
+        return self.retry(send)
+
+    def download(self, url, file_path):
+        """
+        url을 file_path에 스트림으로 저장
+        <file_path>.part 에 받은 뒤 rename 하며, 전송이 끊기면 받은 부분부터 Range (If-Range: ETag) 로 이어 받음
+        """
+        base_dir = os.path.dirname(file_path)
+        if base_dir:
+            os.makedirs(base_dir, exist_ok=True)
+        part_path = file_path + '.part'
+        etag = None
+
+        def receive():
+            nonlocal etag
+            offset = os.path.getsize(part_path) if etag and os.path.exists(part_path) else 0
+            headers = {'Range': 'bytes=%d-' % offset, 'If-Range': etag} if offset else {}
+            with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                if offset and response.status_code == 416:
+                    # 끊기기 전에 이미 모두 받은 경우
+                    return
+                response.raise_for_status()
+                etag = response.headers.get('ETag')
+                with open(part_path, 'ab' if response.status_code == 206 else 'wb') as stream:
+                    for chunk in response.iter_content(self.chunk_size):
+                        stream.write(chunk)
+        self.retry(receive)
+        os.replace(part_path, file_path)
+        return file_path
+
+    def download_all(self, items):
+        """
+        여러 파일을 동시에 다운로드
+
+        :param items: (url, file_path) 의 list
+        :return: file_path 의 list
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda item: self.download(*item), items))
+
+    def manifest(self, manifest_url, file_paths):
+        """
+        controller가 알려주는 파일의 SHA-256
+
+        :return: {file_path: sha256}, manifest를 읽을 수 없으면 빈 dict
+        """
+        try:
+            response = self.request('GET', manifest_url, params={'path': list(file_paths)})
+            return {item['path']: item['sha256'] for item in response.json()['files']}
+        except (requests.RequestException, ValueError, KeyError):
+            return dict()
+
+    def fetch(self, base_url, file_paths, work_dir=None, copy=False, manifest_url=None, cached=()):
+        """
+        work directory의 파일들을 현재 directory의 같은 상대 경로에 준비
+        work_dir (mount된 work directory) 가 있으면 다운로드하지 않고 symbolic link로 직접 읽으며,
+        script가 다시 쓰는 파일은 copy=True로 복사본을 만듦
+        cached에 포함된 파일은 manifest_url의 SHA-256으로 input cache에서 먼저 찾고, 받은 뒤 cache에 추가함
+        """
+        for file_path in file_paths:
+            base_dir = os.path.dirname(file_path)
+            if base_dir:
+                os.makedirs(base_dir, exist_ok=True)
+
+        if work_dir:
+            for file_path in file_paths:
+                source = os.path.join(work_dir, file_path)
+                if copy:
+                    shutil.copyfile(source, file_path)
+                else:
+                    os.symlink(source, file_path)
+            return list(file_paths)
+
+        cached = [file_path for file_path in file_paths if file_path in cached]
+        hashes = self.manifest(manifest_url, cached) if self.cache and manifest_url and cached else dict()
+        downloads = [file_path for file_path in file_paths
+                     if not (file_path in hashes and self.cache.link(hashes[file_path], file_path))]
+        self.download_all([('%s/%s' % (base_url, file_path), file_path) for file_path in downloads])
+        for file_path in downloads:
+            if file_path in hashes:
+                self.cache.add(file_path, hashes[file_path])
+        return list(file_paths)
+
+    def upload(self, url, file_path):
+        """
+        resumable upload (prowave.utils.uploads) 로 file_path를 chunk_size 단위로 업로드
+        전송이 끊기면 controller가 받은 offset부터 다시 보내고, checksum이 맞지 않으면 처음부터 다시 보냄
+        """
+        size = os.path.getsize(file_path)
+        sha256 = file_sha256(file_path)
+        for _ in range(self.retries):
+            offset = self.request('POST', url, data={'action': 'init'}).json()['offset']
+            with open(file_path, 'rb') as stream:
+                while offset < size:
+                    stream.seek(offset)
+                    # 받지 않은 구간을 건너뛴 경우 (409) controller가 받은 offset부터 다시 보냄
+                    response = self.request('PUT', url, accept=(409,), params={'offset': offset},
+                                            data=stream.read(self.chunk_size))
+                    offset = response.json()['offset']
+            response = self.request('POST', url, accept=(400,),
+                                    data={'action': 'commit', 'sha256': sha256, 'size': size})
+            if response.status_code != 400:
+                return
+        raise RuntimeError('failed to upload %s: checksum mismatch' % file_path)
+
+    def post_file(self, url, file_path, remote_name=None):
+        """
+        multipart/form-data 로 file_path를 한 번에 업로드
+        """
+        def send():
+            with open(file_path, 'rb') as stream:
+                response = self.session.post(url, data={'file': remote_name or file_path},
+                                             files={'file': (remote_name or file_path, stream)},
+                                             timeout=self.timeout)
+            response.raise_for_status()
+            return response
+        return self.retry(send)
+
+    def store(self, upload_url, file_path, remote_path=None, work_dir=None):
+        """
+        결과 파일을 work directory에 저장
+        work_dir (mount된 work directory) 가 있으면 store_file로 복사하고, 아니면 upload로 업로드함
+        """
+        if work_dir:
+            store_file(work_dir, file_path, remote_path)
+        else:
+            self.upload('%s/%s' % (upload_url, remote_path or file_path), file_path)
@@ -168,8 +168,34 @@ REST_FRAMEWORK = {
 
 # in-house settings
 PDB_SOURCES_DIR = os.environ.get('PDB_SOURCES_DIR', '/data/pdb_sources')
+PDB_CACHE_DIR = os.environ.get('PDB_CACHE_DIR', '/data/pdb_cache')
+PDB_CACHE_MAX_SIZE = int(os.environ.get('PDB_CACHE_MAX_SIZE', 512 * 1024 * 1024))
 PROWAVE_DATA_DIR = os.environ.get('PROWAVE_DATA_DIR', '/data/prowave_data')
 WEBMD_DATA_DIR = os.environ.get('WEBMD_DATA_DIR', '/data/webmd_data')
 SLURM_HOME = os.environ.get('SLURM_HOME', '/opt/apps/slurm')
+SBATCH_EXE = os.environ.get('SBATCH_EXE', os.path.join(SLURM_HOME, 'bin/sbatch'))
+SBATCH_WORKING_DIR = os.environ.get('SBATCH_WORKING_DIR', '/home/nbcc')
+SBATCH_MAX_WORKERS = int(os.environ.get('SBATCH_MAX_WORKERS', 4))
+SCANCEL_EXE = os.environ.get('SCANCEL_EXE', os.path.join(SLURM_HOME, 'bin/scancel'))
+# prowave.utils.backends.SlurmBackend 또는 prowave.utils.backends.LocalBackend (Slurm 없이 ProcessPoolExecutor에서 실행)
+EXECUTION_BACKEND = os.environ.get('EXECUTION_BACKEND', 'prowave.utils.backends.SlurmBackend')
+LOCAL_BACKEND_MAX_WORKERS = int(os.environ.get('LOCAL_BACKEND_MAX_WORKERS', 2))
+LOCAL_BACKEND_INTERPRETER = os.environ.get('LOCAL_BACKEND_INTERPRETER', '')
+# compute script가 prowave.scripts 모듈을 import할 수 있도록 job의 PYTHONPATH에 추가하는 경로 (compute node 기준)
+COMPUTE_PYTHONPATH = os.environ.get('COMPUTE_PYTHONPATH', BASE_DIR)
+SQUEUE_EXE = os.environ.get('SQUEUE_EXE', 'squeue')
+SACCT_EXE = os.environ.get('SACCT_EXE', 'sacct')
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 10))
+SUBMISSION_POLL_INTERVAL = float(os.environ.get('SUBMISSION_POLL_INTERVAL', 1))
+CHECKSUM_UPDATE_INTERVAL = float(os.environ.get('CHECKSUM_UPDATE_INTERVAL', 60))
+# compute script가 job event의 X-Prowave-Job-Token header로 보내는 값, 지정하지 않으면 SECRET_KEY로부터 만듦
+JOB_EVENT_TOKEN = os.environ.get('JOB_EVENT_TOKEN', '')
+# Slurm MaxArraySize 기본값 (1001) 보다 작아야 함
+SFE_BATCH_MAX_SIZE = int(os.environ.get('SFE_BATCH_MAX_SIZE', 1000))
+FILE_RESPONSE_CHUNK_SIZE = int(os.environ.get('FILE_RESPONSE_CHUNK_SIZE', 1024 * 1024))
+# 'X-Accel-Redirect' (nginx) 또는 'X-Sendfile' (apache), 지정하지 않으면 Django가 파일을 스트림함
+SENDFILE_HEADER = os.environ.get('SENDFILE_HEADER', '')
+SENDFILE_ROOT = os.environ.get('SENDFILE_ROOT', '/data')
+SENDFILE_URL_ROOT = os.environ.get('SENDFILE_URL_ROOT', '/protected/')
 AMBERHOME = os.environ.get('AMBERHOME', '/home/nbcc/anaconda3/envs/ambertools')
 OPENMM_HOME = os.environ.get('OPENMM_HOME', '/home/nbcc/anaconda3/envs/prowave_compute')
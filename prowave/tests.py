@@ -1,10 +1,1389 @@
 """
 prowave.tests
 """
-from django.test import TestCase
+import bz2
+import glob
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.management import call_command
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from prowave.models import FileChecksum, JobState, Work, WorkHistory, WorkJob
+from prowave.utils import download_pdb_form_rcsb
+from prowave.scripts.jobs import report_job
+from prowave.scripts.transfer import InputCache, TransferClient, shared_work_dir
+from prowave.utils.pdbcache import TopologyCache
+from prowave.utils.pdbcolumnar import ColumnarModel, CompactModel
+from prowave.utils.pdbutil import Model, NeighborSearch, ResidueIndex, Topology, open_structure
+from prowave.utils.backends import (
+    ExecutionBackend, LocalBackend, execution_backend, script_environment
+)
+from prowave.utils.fileresponse import file_response, parse_range
+from prowave.utils.manifest import record_checksum, update_checksums, work_manifest
+from prowave.utils.slurm import SlurmSubmitter, format_elapsed, slurm_submitter, squeue_jobs
+from prowave.utils.uploads import file_sha256
+
+
+ARTIFACTS_DIR = os.path.join(settings.BASE_DIR, 'prowave/utils/_artifacts_')
+FAKE_SQUEUE = """#!/bin/sh
+echo called >> "$(dirname "$0")/squeue.log"
+echo '101|prowave|SFE|nbcc|R|1:23|1|node01|RUNNING|2019-03-22T11:06:00'
+echo '102|prowave|SFE|nbcc|PD|0:00|1|(Priority)|PENDING|N/A'
+echo '103_1|prowave|WEBMD|nbcc|R|10:00|1|node02|RUNNING|2019-03-22T10:57:23'
+"""
+FAKE_SACCT = """#!/bin/sh
+echo '104|COMPLETED|node03|2019-03-22T09:00:00|2019-03-22T10:00:00'
+echo '105|CANCELLED by 1000|node01|2019-03-22T09:30:00|2019-03-22T09:45:00'
+echo '106|OUT_OF_MEMORY|node04|2019-03-22T09:00:00|2019-03-22T09:10:00'
+echo '107|NODE_FAIL|node05|2019-03-22T09:00:00|2019-03-22T09:20:00'
+"""
+# 실행중인 sbatch 수를 running.* 파일로 세어 기록하고, 실행된 working directory와 함께 출력함
+FAKE_SBATCH = """#!/bin/sh
+LOG_DIR="$(dirname "$0")"
+touch "$LOG_DIR/running.$$"
+echo "$(ls "$LOG_DIR" | grep -c '^running\\.') $(pwd) $*" >> "$LOG_DIR/sbatch.log"
+sleep 0.2
+rm -f "$LOG_DIR/running.$$"
+echo "Submitted batch job $$"
+"""
+CIF_CONTENT = """data_TEST
+#
+loop_
+_pdbx_poly_seq_scheme.asym_id
+_pdbx_poly_seq_scheme.seq_id
+_pdbx_poly_seq_scheme.mon_id
+_pdbx_poly_seq_scheme.pdb_strand_id
+A 1 CYS A
+A 2 GLY A
+B 1 CYS B
+#
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.type_symbol
+_atom_site.label_atom_id
+_atom_site.label_alt_id
+_atom_site.label_comp_id
+_atom_site.label_asym_id
+_atom_site.label_seq_id
+_atom_site.pdbx_PDB_ins_code
+_atom_site.Cartn_x
+_atom_site.Cartn_y
+_atom_site.Cartn_z
+_atom_site.occupancy
+_atom_site.B_iso_or_equiv
+_atom_site.auth_seq_id
+_atom_site.auth_comp_id
+_atom_site.auth_asym_id
+_atom_site.auth_atom_id
+_atom_site.pdbx_PDB_model_num
+ATOM   1 S SG  . CYS A 1 ? 10.000 10.000 10.000 1.00 0.00 10  CYS A SG  1
+ATOM   2 C CA  . GLY A 2 ? 11.000 10.000 10.000 1.00 0.00 11  GLY A CA  1
+ATOM   3 S SG  . CYS B 1 ? 12.000 10.000 10.000 1.00 0.00 20  CYS B SG  1
+HETATM 4 O O   . HOH C . ? 30.000 10.000 10.000 1.00 0.00 101 HOH B O   1
+ATOM   1 S SG  . CYS A 1 ? 10.000 10.000 10.000 1.00 0.00 10  CYS A SG  2
+ATOM   2 C CA  . GLY A 2 ? 11.000 10.000 10.000 1.00 0.00 11  GLY A CA  2
+ATOM   3 S SG  . CYS B 1 ? 15.000 10.000 10.000 1.00 0.00 20  CYS B SG  2
+#
+"""
+
 
 # Create your tests here.
 class ProwaveTestCase(TestCase):
     """
     ProWaVE Test Case
     """
+
+
+class PdbUtilTestCase(TestCase):
+    """
+    prowave.utils.pdbutil Test Case
+    """
+    def setUp(self):
+        """
+        set up
+        """
+        self.pdb_files = sorted(glob.glob(os.path.join(ARTIFACTS_DIR, '*.pdb')))
+
+    @staticmethod
+    def load(pdb_file, model_class=Model):
+        """
+        PDB 파일을 지정한 model_class로 읽어들임
+        """
+        with open(pdb_file, 'r') as stream:
+            return Topology(stream, model_class=model_class)
+
+    def test_columnar_model_analyze(self):
+        """
+        ColumnarModel의 분석 결과가 Model과 같은지 확인
+        """
+        for pdb_file in self.pdb_files:
+            topo = self.load(pdb_file)
+            columnar_topo = self.load(pdb_file, ColumnarModel)
+            self.assertEqual(sorted(topo.models[0].residues), sorted(columnar_topo.models[0].residues))
+            self.assertEqual(sorted(topo.models[0].chains), sorted(columnar_topo.models[0].chains))
+            self.assertEqual(topo.non_standards, columnar_topo.non_standards)
+            self.assertEqual(topo.protonation_states, columnar_topo.protonation_states)
+            self.assertEqual(topo.solvent_ions, columnar_topo.solvent_ions)
+
+            candidates = sorted(topo.disulfide_bond_candidates)
+            columnar_candidates = sorted(columnar_topo.disulfide_bond_candidates)
+            self.assertEqual([c[:2] for c in candidates], [c[:2] for c in columnar_candidates])
+            for candidate, columnar_candidate in zip(candidates, columnar_candidates):
+                self.assertAlmostEqual(candidate[2], columnar_candidate[2], places=4)
+
+    def test_columnar_model_cleanup(self):
+        """
+        ColumnarModel로 cleanup 및 create_model을 수행한 결과가 Model과 같은지 확인
+        """
+        for pdb_file in self.pdb_files:
+            topo = self.load(pdb_file)
+            columnar_topo = self.load(pdb_file, ColumnarModel)
+            solvent_ions = [list(ion) for ion in topo.solvent_ions[:1]]
+            self.assertEqual(topo.cleanup(solvent_ions=solvent_ions).deserialize(),
+                             columnar_topo.cleanup(solvent_ions=solvent_ions).deserialize())
+            self.assertEqual(topo.create_model().deserialize(),
+                             columnar_topo.create_model().deserialize())
+
+    def test_compact_model(self):
+        """
+        CompactModel의 분석, cleanup 및 create_model 결과가 Model과 같고 atom에 __dict__가 없는지 확인
+        """
+        for pdb_file in self.pdb_files:
+            topo = self.load(pdb_file)
+            compact_topo = self.load(pdb_file, CompactModel)
+            self.assertFalse(hasattr(compact_topo.models[0].atoms[0], '__dict__'))
+            self.assertEqual(topo.analyze(), compact_topo.analyze())
+            solvent_ions = [list(ion) for ion in topo.solvent_ions[:1]]
+            self.assertEqual(topo.cleanup(solvent_ions=solvent_ions).create_model().deserialize(),
+                             compact_topo.cleanup(solvent_ions=solvent_ions).create_model().deserialize())
+
+    def test_residue_index(self):
+        """
+        Model.index의 chain → residue → atom 구간이 atoms와 일치하고, analyze는 atom을 한 번만 훑으며,
+        atoms를 바꾸거나 residue name을 바꾸면 index가 갱신되는지 확인
+        """
+        topo = self.load(os.path.join(ARTIFACTS_DIR, '1AVD.pdb'))
+        model = topo.models[0]
+        with mock.patch('prowave.utils.pdbutil.ResidueIndex', wraps=ResidueIndex) as index_class:
+            topo.analyze()
+        self.assertEqual(index_class.call_count, 1)
+
+        for chain, residues in model.index.chains.items():
+            for (chain_id, resnum, resname), slices in residues.items():
+                self.assertEqual(chain_id, chain)
+                for atom in [atom for _slice in slices for atom in model.atoms[_slice]]:
+                    self.assertEqual((atom.chain, atom.resnum, atom.resname), (chain_id, resnum, resname))
+        self.assertEqual(sum(stop - start for start, stop, _ in model.index.spans), len(model))
+
+        topo.select_chains(['A'])
+        self.assertEqual(model.chains, ['A'])
+        model.atoms = model.atoms[:10]
+        self.assertEqual(sum(stop - start for start, stop, _ in model.index.spans), 10)
+        model.process_protonation_states({'A-%s' % model.atoms[0].resnum: 'HIE'})
+        self.assertEqual(model.residues[0][2], 'HIE')
+
+    def test_load_selected_model(self):
+        """
+        Topology.load가 선택한 model만 읽어들이면서 전체 model 수를 기록하는지 확인
+        """
+        pdb_file = os.path.join(ARTIFACTS_DIR, '1IYT.pdb')
+        full_topo = self.load(pdb_file)
+        with open(pdb_file, 'r') as stream:
+            topo = Topology.load(stream, model_index=3, chain_ids=['A'])
+        self.assertEqual(len(topo.models), 1)
+        self.assertEqual(topo.analyze()['models'], list(range(len(full_topo.models))))
+        self.assertEqual(topo.cleanup(3, ['A']).deserialize(),
+                         full_topo.cleanup(3, ['A']).deserialize())
+
+    def test_write_matches_atom_deserialize(self):
+        """
+        Topology.write/deserialize의 결과가 Atom.deserialize로 한 줄씩 만든 결과와 byte 단위로 같은지 확인
+        """
+        sample_dir = os.path.join(settings.BASE_DIR, '_artifacts_/sample_trajectory')
+        pdb_files = glob.glob(os.path.join(sample_dir, '*.pdb')) + glob.glob(os.path.join(sample_dir, '*/*.pdb'))
+        self.assertTrue(pdb_files)
+        for pdb_file in sorted(pdb_files):
+            topo = self.load(pdb_file)
+            topo.select_model(0)
+            seqres = topo.deserialize().split('\n')[:-len(topo.models[0].atoms)]
+            expected = '\n'.join(seqres + [atom.deserialize() for atom in topo.models[0].atoms])
+
+            columnar_topo = self.load(pdb_file, ColumnarModel)
+            columnar_topo.select_model(0)
+            self.assertEqual(columnar_topo.deserialize(), expected)
+            with tempfile.TemporaryFile('w+') as stream:
+                columnar_topo.write(stream, chunk_size=4096)
+                stream.seek(0)
+                self.assertEqual(stream.read(), expected)
+
+    def test_write_keeps_coordinate_text(self):
+        """
+        소수점 아래 3자리가 아니거나 float32로 정확히 나타낼 수 없는 좌표도 ColumnarModel이 Model과 byte 단위로 같게 쓰는지 확인
+        """
+        atom_format = 'ATOM  %5d  %-3s ALA A   1    %8s%8s%8s  1.00  0.00           %s'
+        pdb_content = '\n'.join([
+            atom_format % (1, 'N', '1.2346', '-2.5', '3.10', 'N'),
+            atom_format % (2, 'CA', '9999.999', '1234.567', '-123.456', 'C'),
+            atom_format % (3, 'C', '-0.0', '16777.22', '.5', 'C'),
+            'TER       4      ALA A   1',
+        ]) + '\n'
+        fd, pdb_file = tempfile.mkstemp(suffix='.pdb')
+        try:
+            with os.fdopen(fd, 'w') as stream:
+                stream.write(pdb_content)
+            expected = StringIO()
+            self.load(pdb_file).write(expected)
+
+            topos = [self.load(pdb_file, ColumnarModel), Topology.from_mmap(pdb_file)]
+            stream = BytesIO()
+            topos[1].save(stream)
+            stream.seek(0)
+            topos.append(Topology.from_npz(stream))
+            for topo in topos:
+                actual = StringIO()
+                topo.write(actual)
+                self.assertEqual(actual.getvalue().encode('latin-1'), expected.getvalue().encode('latin-1'))
+                self.assertEqual(topo.models[0]._format_rows(0, 4), topo.models[0].format_atoms())
+            self.assertIn('  1.2346    -2.5    3.10', expected.getvalue())
+        finally:
+            os.remove(pdb_file)
+
+    def test_columnar_model_hybrid36(self):
+        """
+        hybrid-36 형식이나 '*****' 로 쓰인 atom serial, residue 번호를 ColumnarModel이 Model과 같이 읽고 쓰는지 확인
+        """
+        atom_format = 'ATOM  %5s  %-3s %3s A%4s    %8.3f%8.3f%8.3f  1.00  0.00           %s'
+        pdb_content = '\n'.join([
+            atom_format % ('99999', 'SG', 'CYS', '9999', 10.0, 10.0, 10.0, 'S'),
+            atom_format % ('A0000', 'SG', 'CYS', 'A000', 12.0, 10.0, 10.0, 'S'),
+            atom_format % ('a0000', 'CA', 'HIS', 'zzzz', 20.0, 10.0, 10.0, 'C'),
+            atom_format % ('*****', 'CA', 'GLY', '****', 30.0, 10.0, 10.0, 'C'),
+            'TER   A0003      GLY A****',
+        ]) + '\n'
+        fd, pdb_file = tempfile.mkstemp(suffix='.pdb')
+        try:
+            with os.fdopen(fd, 'w') as stream:
+                stream.write(pdb_content)
+            topo = self.load(pdb_file)
+            for columnar_topo in (self.load(pdb_file, ColumnarModel), Topology.from_mmap(pdb_file)):
+                model = columnar_topo.models[0]
+                self.assertEqual(model.serial[:3].tolist(), [99999, 100000, 100000 + 26 * 36 ** 4])
+                self.assertEqual(model.resnum[:2].tolist(), [9999, 10000])
+                self.assertEqual(sorted(model.residues), sorted(topo.models[0].residues))
+                self.assertEqual(columnar_topo.protonation_states, topo.protonation_states)
+                self.assertEqual([c[:2] for c in columnar_topo.disulfide_bond_candidates],
+                                 [c[:2] for c in topo.disulfide_bond_candidates])
+                self.assertEqual(columnar_topo.deserialize(), topo.deserialize())
+        finally:
+            os.remove(pdb_file)
+
+    def test_from_mmap(self):
+        """
+        Topology.from_mmap의 결과가 Topology.load와 같은지 확인
+        """
+        sample_dir = os.path.join(settings.BASE_DIR, '_artifacts_/sample_trajectory')
+        pdb_files = self.pdb_files + [os.path.join(sample_dir, 'model_solv.pdb'), os.path.join(sample_dir, 'md/md1.pdb')]
+        for pdb_file in pdb_files:
+            with open(pdb_file, 'r') as stream:
+                expected = Topology.load(stream, model_class=ColumnarModel)
+            topo = Topology.from_mmap(pdb_file)
+            self.assertEqual(topo.n_models, expected.n_models)
+            self.assertEqual(topo.seqres, expected.seqres)
+            self.assertEqual(topo.deserialize(), expected.deserialize())
+
+        pdb_file = os.path.join(ARTIFACTS_DIR, '1IYT.pdb')
+        with open(pdb_file, 'r') as stream:
+            expected = Topology.load(stream, model_index=3, chain_ids=['A'], model_class=ColumnarModel)
+        topo = Topology.from_mmap(pdb_file, model_index=3, chain_ids=['A'])
+        self.assertEqual(topo.deserialize(), expected.deserialize())
+        self.assertEqual(topo.analyze(), expected.analyze())
+        with self.assertRaises(IndexError):
+            Topology.from_mmap(pdb_file, model_index=topo.n_models)
+
+    def test_from_mmap_short_lines(self):
+        """
+        CR LF 줄바꿈, 80자보다 짧은 줄, 마지막 줄바꿈이 없는 파일도 Topology.load와 같이 읽는지 확인
+        """
+        pdb_content = '\r\n'.join([
+            'SEQRES   1 A    1  ALA',
+            'ATOM      1  N   ALA A   1       1.000   2.000   3.000  1.00  0.00',
+            'TER',
+            'ATOM      2  CA  ALA A   1      -1.000   2.500   3.000',
+            'HETATM    3  O   HOH     2       5.000   2.500   3.000',
+            'HETATM    4  O   HOH     3       7.000   2.500   3.000',
+            'END',
+        ])
+        fd, pdb_file = tempfile.mkstemp(suffix='.pdb')
+        try:
+            with os.fdopen(fd, 'w', newline='') as stream:
+                stream.write(pdb_content)
+            with open(pdb_file, 'r') as stream:
+                expected = Topology.load(stream, model_class=ColumnarModel)
+            topo = Topology.from_mmap(pdb_file)
+            self.assertEqual(topo.seqres, {'A': ['ALA']})
+            self.assertEqual(topo.deserialize(), expected.deserialize())
+
+            # 빈 chain ID는 chain 열이 공백인 atom을 선택함
+            with open(pdb_file, 'r') as stream:
+                expected = Topology.load(stream, chain_ids=[''], model_class=ColumnarModel)
+            topo = Topology.from_mmap(pdb_file, chain_ids=[''])
+            self.assertEqual(len(topo.models[0]), 2)
+            self.assertEqual(topo.deserialize(), expected.deserialize())
+        finally:
+            os.remove(pdb_file)
+
+    def test_interchain_disulfide_bond_candidates(self):
+        """
+        chain 사이의 disulfide bond 후보도 찾는지 확인
+        """
+        pdb_content = '\n'.join([
+            'ATOM      1  SG  CYS A  10      10.000  10.000  10.000  1.00  0.00           S',
+            'ATOM      2  SG  CYS B  20      12.000  10.000  10.000  1.00  0.00           S',
+            'ATOM      3  SG  CYS B  30      20.000  10.000  10.000  1.00  0.00           S',
+        ])
+        for model_class in (Model, ColumnarModel):
+            topo = Topology(StringIO(pdb_content), model_class=model_class)
+            candidates = topo.disulfide_bond_candidates
+            self.assertEqual(len(candidates), 1)
+            record_i, record_j, distance, chains = candidates[0]
+            self.assertEqual(record_i, ('1', 'A', '10', 'CYS'))
+            self.assertEqual(record_j, ('2', 'B', '20', 'CYS'))
+            self.assertAlmostEqual(distance, 2.0)
+            self.assertEqual(chains, ('A', 'B'))
+
+            topo.create_model()
+            self.assertEqual(sorted(topo.models[0].residues),
+                             [('A', '10', 'CYX'), ('B', '20', 'CYX'), ('B', '30', 'CYS')])
+
+    def test_neighbor_search_query(self):
+        """
+        NeighborSearch.query로 다른 좌표 집합 주변의 atom을 찾는지 확인
+        """
+        search = NeighborSearch([[0.0, 0.0, 0.0], [3.0, 0.0, 0.0], [10.0, 0.0, 0.0]])
+        contacts = search.query([[1.0, 0.0, 0.0]], 2.5)
+        self.assertEqual([(i, j) for i, j, _ in contacts], [(0, 0), (1, 0)])
+        self.assertEqual([round(d, 3) for _, _, d in contacts], [1.0, 2.0])
+
+    def test_open_compressed_structure(self):
+        """
+        gzip, bzip2로 압축된 PDB 파일을 읽은 결과가 압축하지 않은 파일과 같은지 확인
+        """
+        pdb_file = os.path.join(ARTIFACTS_DIR, '1AVD.pdb')
+        expected = self.load(pdb_file, ColumnarModel).deserialize()
+        with open(pdb_file, 'rb') as stream:
+            content = stream.read()
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for ext, compress in (('.gz', gzip.compress), ('.bz2', bz2.compress)):
+                compressed_file = os.path.join(temp_dir, '1AVD.pdb' + ext)
+                with open(compressed_file, 'wb') as stream:
+                    stream.write(compress(content))
+                with open_structure(compressed_file) as stream:
+                    topo = Topology.load(stream, model_class=ColumnarModel)
+                self.assertEqual(topo.deserialize(), expected)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_open_cif_structure(self):
+        """
+        mmCIF 파일 (.cif, .cif.gz) 의 SEQRES, model, chain, TER를 PDB와 같이 읽어들이는지 확인
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cif_file = os.path.join(temp_dir, 'TEST.cif')
+            with open(cif_file, 'w') as stream:
+                stream.write(CIF_CONTENT)
+            with gzip.open(cif_file + '.gz', 'wt') as stream:
+                stream.write(CIF_CONTENT)
+
+            for file_path in (cif_file, cif_file + '.gz'):
+                with open_structure(file_path) as stream:
+                    topo = Topology(stream, model_class=ColumnarModel)
+                self.assertEqual(topo.seqres, {'A': ['CYS', 'GLY'], 'B': ['CYS']})
+                self.assertEqual(topo.n_models, 2)
+                self.assertEqual(topo.solvent_ions, [('B', 'HOH')])
+                self.assertEqual(len(topo.disulfide_bond_candidates), 1)
+
+                with open_structure(file_path) as stream:
+                    topo = Topology.load(stream, model_index=1, model_class=ColumnarModel)
+                self.assertEqual(topo.disulfide_bond_candidates, [])
+                lines = topo.deserialize().split('\n')
+                self.assertEqual([line[:6] for line in lines],
+                                 ['SEQRES', 'SEQRES', 'ATOM  ', 'ATOM  ', 'TER   ', 'ATOM  ', 'TER   '])
+                self.assertEqual(lines[5][12:26], 'SG   CYS B  20')
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_open_cif_multi_character_chains(self):
+        """
+        2글자 이상의 mmCIF chain ID를 사용하지 않는 1글자 chain ID로 바꾸고 chain_map에 기록하는지 확인
+        """
+        content = CIF_CONTENT.replace('CYS B\n', 'CYS BB\n').replace(' CYS B ', ' CYS BB ').replace(' HOH B ', ' HOH BB ')
+        temp_dir = tempfile.mkdtemp()
+        try:
+            cif_file = os.path.join(temp_dir, 'TEST.cif')
+            with open(cif_file, 'w') as stream:
+                stream.write(content)
+            with open_structure(cif_file) as stream:
+                topo = Topology(stream, model_class=ColumnarModel)
+            self.assertEqual(topo.seqres, {'A': ['CYS', 'GLY'], 'a': ['CYS']})
+            self.assertEqual(topo.chain_map, {'a': 'BB'})
+            self.assertEqual(topo.solvent_ions, [('a', 'HOH')])
+            self.assertEqual(len(topo.disulfide_bond_candidates), 1)
+
+            with open_structure(cif_file) as stream:
+                topo = Topology.load(stream, chain_ids=['a'], model_class=ColumnarModel)
+            stream = BytesIO()
+            topo.save(stream)
+            stream.seek(0)
+            self.assertEqual(Topology.from_npz(stream).chain_map, {'a': 'BB'})
+
+            # 1글자 chain ID가 모자라면 ValueError
+            chains = ''.join('X%d 1 CYS X%d\n' % (i, i) for i in range(63))
+            with open(cif_file, 'w') as stream:
+                stream.write(CIF_CONTENT.replace('B 1 CYS B\n', 'B 1 CYS B\n' + chains))
+            with self.assertRaises(ValueError):
+                with open_structure(cif_file) as stream:
+                    Topology(stream, model_class=ColumnarModel)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_download_failure_removes_temp_file(self):
+        """
+        RCSB 다운로드가 중간에 실패하면 임시 파일을 남기지 않고, 디스크 오류는 그대로 발생시키는지 확인
+        """
+        response = mock.MagicMock(status_code=200)
+        response.__enter__.return_value = response
+        response.iter_content.side_effect = requests.exceptions.ConnectionError()
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(PDB_SOURCES_DIR=temp_dir), \
+                    mock.patch('prowave.utils.requests.get', return_value=response):
+                with self.assertRaises(AttributeError):
+                    download_pdb_form_rcsb('1avd')
+            self.assertEqual(os.listdir(os.path.join(temp_dir, '1A')), [])
+
+            # 디스크 오류는 잘못된 PDB ID (AttributeError) 로 바꾸지 않음
+            response.iter_content.side_effect = None
+            response.iter_content.return_value = [b'HEADER']
+            with override_settings(PDB_SOURCES_DIR=temp_dir), \
+                    mock.patch('prowave.utils.requests.get', return_value=response), \
+                    mock.patch('prowave.utils.os.replace', side_effect=PermissionError()):
+                with self.assertRaises(PermissionError):
+                    download_pdb_form_rcsb('1avd')
+            self.assertEqual(os.listdir(os.path.join(temp_dir, '1A')), [])
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class TopologyCacheTestCase(TestCase):
+    """
+    prowave.utils.pdbcache Test Case
+    """
+    def setUp(self):
+        """
+        set up
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = TopologyCache(os.path.join(self.temp_dir, 'cache'), 64 * 1024 * 1024)
+        self.pdb_file = os.path.join(self.temp_dir, '1AVD.pdb')
+        shutil.copy2(os.path.join(ARTIFACTS_DIR, '1AVD.pdb'), self.pdb_file)
+
+    def tearDown(self):
+        """
+        tear down
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_from_cache(self):
+        """
+        캐시에서 읽은 Topology가 PDB를 직접 읽은 것과 같은지 확인
+        """
+        with open(self.pdb_file, 'r') as stream:
+            expected = Topology.load(stream, model_class=ColumnarModel)
+        self.cache.load(self.pdb_file)
+        self.assertEqual(len(os.listdir(self.cache.cache_dir)), 1)
+
+        topo = self.cache.load(self.pdb_file)
+        self.assertEqual(topo.deserialize(), expected.deserialize())
+        self.assertEqual(topo.analyze(), expected.analyze())
+
+    def test_invalidate(self):
+        """
+        PDB 파일을 다시 쓰기 전에 invalidate 하면 캐시 항목이 삭제되는지 확인
+        """
+        topo = self.cache.load(self.pdb_file)
+        self.cache.invalidate(self.pdb_file)
+        self.assertEqual(os.listdir(self.cache.cache_dir), [])
+
+        topo.cleanup(chain_ids=['A'])
+        with open(self.pdb_file, 'w') as stream:
+            topo.write(stream)
+        self.assertEqual(self.cache.load(self.pdb_file).chains, ['A'])
+
+    def test_evict(self):
+        """
+        캐시 크기가 max_size를 넘으면 가장 오래 사용하지 않은 항목부터 삭제되는지 확인
+        """
+        self.cache.load(self.pdb_file, chain_ids=['A'])
+        self.cache.load(self.pdb_file, chain_ids=['B'])
+        entry_a = self.cache.entry_path(file_sha256(self.pdb_file), chain_ids=['A'])
+        os.utime(entry_a, (0, 0))
+        self.cache.max_size = os.path.getsize(entry_a) + 1
+        self.cache.evict()
+        self.assertFalse(os.path.exists(entry_a))
+        self.assertEqual(len(os.listdir(self.cache.cache_dir)), 1)
+
+
+def write_fake_squeue(directory):
+    """
+    호출될 때마다 squeue.log에 한 줄씩 기록하고 고정된 job 목록을 출력하는 squeue 대용 script
+    """
+    squeue_exe = os.path.join(directory, 'squeue')
+    with open(squeue_exe, 'w') as stream:
+        stream.write(FAKE_SQUEUE)
+    os.chmod(squeue_exe, 0o755)
+    return squeue_exe
+
+
+def write_fake_sacct(directory):
+    """
+    queue에서 빠진 job 104 (COMPLETED), 105 (CANCELLED), 106 (OUT_OF_MEMORY), 107 (NODE_FAIL) 의 기록을 출력하는 sacct 대용 script
+    """
+    sacct_exe = os.path.join(directory, 'sacct')
+    with open(sacct_exe, 'w') as stream:
+        stream.write(FAKE_SACCT)
+    os.chmod(sacct_exe, 0o755)
+    return sacct_exe
+
+
+def write_fake_sbatch(directory):
+    """
+    동시에 실행중인 sbatch 수와 working directory를 sbatch.log에 기록하고 pid를 job id로 출력하는 sbatch 대용 script
+    """
+    sbatch_exe = os.path.join(directory, 'sbatch')
+    with open(sbatch_exe, 'w') as stream:
+        stream.write(FAKE_SBATCH)
+    os.chmod(sbatch_exe, 0o755)
+    return sbatch_exe
+
+
+def sbatch_calls(directory):
+    """
+    write_fake_sbatch로 만든 sbatch의 호출 기록 (동시 실행 수, working directory, 인자) 의 list
+    """
+    log_file = os.path.join(directory, 'sbatch.log')
+    if not os.path.exists(log_file):
+        return []
+    with open(log_file, 'r') as stream:
+        return [line.split(' ', 2) for line in stream.read().splitlines()]
+
+
+def squeue_calls(directory):
+    """
+    write_fake_squeue로 만든 squeue가 호출된 횟수
+    """
+    log_file = os.path.join(directory, 'squeue.log')
+    if not os.path.exists(log_file):
+        return 0
+    with open(log_file, 'r') as stream:
+        return len(stream.readlines())
+
+
+class SlurmTestCase(TestCase):
+    """
+    prowave.utils.slurm Test Case
+    """
+    def setUp(self):
+        """
+        set up
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.squeue_exe = write_fake_squeue(self.temp_dir)
+
+    def tearDown(self):
+        """
+        tear down
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def test_squeue_jobs(self):
+        """
+        squeue 출력을 job id로 찾는지 확인
+        """
+        jobs = squeue_jobs(self.squeue_exe)
+        self.assertEqual(jobs['101'].nodelist, 'node01')
+        self.assertEqual(jobs['102'].state, 'PD')
+        self.assertEqual(jobs['103_1'].time, '10:00')
+        self.assertNotIn('104', jobs)
+        self.assertEqual(squeue_calls(self.temp_dir), 1)
+
+    def test_format_elapsed(self):
+        """
+        squeue %M 형식의 경과 시간
+        """
+        self.assertEqual(format_elapsed(83), '1:23')
+        self.assertEqual(format_elapsed(3723), '1:02:03')
+        self.assertEqual(format_elapsed(90061), '1-01:01:01')
+
+
+class JobStateTestCase(TestCase):
+    """
+    prowave.models.JobState Test Case
+    """
+    def setUp(self):
+        """
+        set up
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            PROWAVE_DATA_DIR=os.path.join(self.temp_dir, 'prowave_data'),
+            SQUEUE_EXE=write_fake_squeue(self.temp_dir),
+            SACCT_EXE=write_fake_sacct(self.temp_dir),
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        """
+        tear down
+        """
+        self.settings_override.disable()
+        shutil.rmtree(self.temp_dir)
+
+    def test_poll(self):
+        """
+        queue에 있는 job은 squeue로, 빠진 job은 sacct로 갱신하고 어디에도 없으면 UNKNOWN으로 기록하는지 확인
+        """
+        for job_id in (101, 102, 103, 104, 105, 999):
+            JobState.submitted(job_id)
+        call_command('poll_slurm_jobs', '--once', stdout=StringIO())
+
+        states = {job.job_id: job for job in JobState.objects.all()}
+        self.assertEqual((states[101].state, states[101].node), ('RUNNING', 'node01'))
+        self.assertEqual(timezone.localtime(states[101].start_time).isoformat(), '2019-03-22T11:06:00+09:00')
+        self.assertEqual((states[102].state, states[102].node, states[102].start_time), ('PENDING', '(Priority)', None))
+        self.assertEqual((states[103].state, states[103].node), ('RUNNING', 'node02'))
+        self.assertEqual((states[104].state, states[104].elapsed), ('COMPLETED', '1:00:00'))
+        self.assertEqual(states[105].state, 'CANCELLED')
+        self.assertEqual(states[999].state, 'UNKNOWN')
+        self.assertIsNotNone(states[999].end_time)
+        self.assertTrue(JobState.is_active(102))
+        self.assertFalse(JobState.is_active(104))
+
+        # 끝난 job은 다시 조회하지 않음
+        self.assertEqual([job.job_id for job in JobState.poll()], [])
+        self.assertEqual(squeue_calls(self.temp_dir), 2)
+
+    def test_poll_without_sacct(self):
+        """
+        accounting이 설정되지 않아 sacct를 실행할 수 없어도 queue에서 빠진 job을 UNKNOWN으로 기록하는지 확인
+        """
+        JobState.submitted(104)
+        with override_settings(SACCT_EXE=os.path.join(self.temp_dir, 'missing-sacct')):
+            JobState.poll()
+        self.assertEqual(JobState.objects.get(job_id=104).state, 'UNKNOWN')
+
+    def test_job_events(self):
+        """
+        계산 script가 보낸 job event를 기록하고, event를 보낸 job은 queue에 있는 동안 squeue 상태로 덮어쓰지 않는지 확인
+        """
+        JobState.submitted(101)
+        url = '/api/jobs/101/events/'
+        # compute script가 받은 token 없이 보낸 event는 기록하지 않음
+        self.assertEqual(self.client.post(url, {'event': 'success'}).status_code, 403)
+        response = self.client.post(url, {'event': 'success'}, HTTP_X_PROWAVE_JOB_TOKEN='guess')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(JobState.objects.get(job_id=101).state, 'PENDING')
+
+        token = script_environment()['PROWAVE_JOB_EVENT_TOKEN']
+        self.client.defaults['HTTP_X_PROWAVE_JOB_TOKEN'] = token
+        response = self.client.post(url, {'event': 'start', 'node': 'node05'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['state'], 'RUNNING')
+        self.client.post(url, {'event': 'progress', 'progress': '0.5', 'message': 'running md'})
+
+        job = JobState.objects.get(job_id=101)
+        self.assertEqual((job.node, job.progress, job.message, job.tracked), ('node05', 0.5, 'running md', True))
+        self.assertIsNotNone(job.start_time)
+        self.assertEqual(JobState.poll(), [])
+        self.assertEqual(JobState.objects.get(job_id=101).node, 'node05')
+
+        self.client.post(url, {'event': 'success'})
+        self.client.post(url, {'event': 'progress', 'progress': '0.9'})
+        job = JobState.objects.get(job_id=101)
+        self.assertEqual((job.state, job.progress), ('COMPLETED', 1.0))
+        self.assertIsNotNone(job.end_time)
+
+        self.assertEqual(self.client.post(url, {'event': 'unknown'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'event': 'progress', 'progress': 'half'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/jobs/999/events/', {'event': 'start'}).status_code, 404)
+
+    def test_report_job(self):
+        """
+        compute script의 report_job이 PROWAVE_API_HOST로 start, failure event를 보내는지 확인
+        """
+        @report_job
+        def fail():
+            raise RuntimeError('rism3d.py failed')
+
+        environ = {'SLURM_JOB_ID': '124', 'SLURM_ARRAY_JOB_ID': '123', 'SLURM_ARRAY_TASK_ID': '1'}
+        with mock.patch.dict(os.environ, environ), mock.patch('prowave.scripts.jobs.requests.post') as post, \
+                mock.patch('prowave.scripts.jobs.API_HOST', 'controller:8000'), \
+                mock.patch('prowave.scripts.jobs.JOB_EVENT_TOKEN', 'secret'), \
+                mock.patch('prowave.scripts.jobs.signal.signal'):
+            with self.assertRaises(RuntimeError):
+                fail()
+        urls = [call[0][0] for call in post.call_args_list]
+        self.assertEqual(urls, ['http://controller:8000/api/jobs/124/events/'] * 2)
+        events = [call[1]['data'] for call in post.call_args_list]
+        self.assertEqual([(x['event'], x['array_job_id'], x['array_task_id']) for x in events],
+                         [('start', '123', '1'), ('failure', '123', '1')])
+        self.assertEqual(events[1]['message'], 'RuntimeError: rism3d.py failed')
+        self.assertEqual(post.call_args[1]['headers'], {'X-Prowave-Job-Token': 'secret'})
+
+    def test_poll_killed_tracked_job(self):
+        """
+        event를 보낸 뒤 failure event 없이 queue에서 빠진 job (OOM kill, node 장애) 을 sacct로 끝내는지 확인
+        """
+        for job_id in (106, 107, 998):
+            JobState.submitted(job_id).record_event('start', node='node05')
+        updated = JobState.poll()
+
+        states = {job.job_id: job for job in JobState.objects.all()}
+        self.assertEqual(sorted(job.job_id for job in updated), [106, 107, 998])
+        self.assertEqual((states[106].state, states[106].node, states[106].elapsed), ('OUT_OF_MEMORY', 'node04', '10:00'))
+        self.assertEqual((states[107].state, states[107].node), ('NODE_FAIL', 'node05'))
+        self.assertEqual(states[998].state, 'UNKNOWN')
+        self.assertTrue(all(job.failed or job.state == 'UNKNOWN' for job in states.values()))
+        self.assertFalse(any(JobState.is_active(job_id) for job_id in (106, 107, 998)))
+
+        # 끝난 뒤 늦게 도착한 progress event는 무시함
+        JobState.objects.get(job_id=106).record_event('progress', progress=0.5)
+        self.assertEqual(JobState.objects.get(job_id=106).state, 'OUT_OF_MEMORY')
+
+    def test_work_status_failed(self):
+        """
+        failure event를 받은 Work.status는 오류 메시지를 반환하는지 확인
+        """
+        work = Work.objects.create(email='prowave@example.com')
+        os.makedirs(work.work_dir)
+        with open(os.path.join(work.work_dir, 'slurm_job_id'), 'w') as stream:
+            stream.write('101')
+        JobState.submitted(101).record_event('failure', message='CalledProcessError: rism3d.py')
+        self.assertEqual(work.status, {'done': False, 'found': False, 'failed': True,
+                                       'message': 'CalledProcessError: rism3d.py'})
+
+    def test_work_status(self):
+        """
+        Work.status는 squeue를 실행하지 않고 JobState만 읽는지 확인
+        """
+        statuses = []
+        for slurm_job_id in (101, 102, 104, 999, None):
+            work = Work.objects.create(email='prowave@example.com')
+            os.makedirs(work.work_dir)
+            if slurm_job_id:
+                with open(os.path.join(work.work_dir, 'slurm_job_id'), 'w') as stream:
+                    stream.write('%d' % slurm_job_id)
+                if slurm_job_id != 999:
+                    JobState.submitted(slurm_job_id)
+        JobState.poll()
+        JobState.objects.filter(job_id=101).update(start_time=timezone.now() - timedelta(seconds=83))
+
+        for work in Work.objects.order_by('id'):
+            statuses.append(work.status)
+        self.assertEqual(statuses[0], {'done': False, 'found': True, 'message': 'Job is Running on node node01 (1:23)'})
+        self.assertEqual(statuses[1], {'done': False, 'found': True, 'message': 'Job is Running on node (Priority) (0:00)'})
+        self.assertEqual(statuses[2], {'done': False, 'found': False})
+        self.assertEqual(statuses[3], {'done': False, 'found': False})
+        self.assertEqual(statuses[4], {'done': False, 'found': False})
+        self.assertEqual(squeue_calls(self.temp_dir), 1)
+
+
+class SlurmSubmitterTestCase(TestCase):
+    """
+    prowave.utils.slurm.SlurmSubmitter Test Case
+    """
+    def setUp(self):
+        """
+        set up
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.work_dir = os.path.join(self.temp_dir, 'home')
+        os.makedirs(self.work_dir)
+        self.settings_override = override_settings(
+            PROWAVE_DATA_DIR=os.path.join(self.temp_dir, 'prowave_data'),
+            SBATCH_EXE=write_fake_sbatch(self.temp_dir),
+            SBATCH_WORKING_DIR=self.work_dir,
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        """
+        tear down
+        """
+        self.settings_override.disable()
+        shutil.rmtree(self.temp_dir)
+
+    def test_concurrent_submit(self):
+        """
+        여러 sbatch를 max_workers 개까지 동시에 실행하고, 프로세스의 working directory는 바꾸지 않는지 확인
+        """
+        cwd = os.getcwd()
+        submitter = SlurmSubmitter(max_workers=3)
+        futures = [submitter.submit(['run.py', '%d' % i], 'TEST', partition='prowave') for i in range(9)]
+        self.assertEqual(os.getcwd(), cwd)
+        job_ids = [future.result() for future in futures]
+        submitter.shutdown()
+
+        self.assertEqual(len(set(job_ids)), 9)
+        self.assertTrue(all(job_id > 0 for job_id in job_ids))
+        calls = sbatch_calls(self.temp_dir)
+        self.assertEqual(len(calls), 9)
+        self.assertLessEqual(max(int(running) for running, _, _ in calls), 3)
+        self.assertGreater(max(int(running) for running, _, _ in calls), 1)
+        self.assertEqual({path for _, path, _ in calls}, {os.path.realpath(self.work_dir)})
+        self.assertEqual(sorted(args for _, _, args in calls),
+                         ['--job-name TEST --partition prowave run.py %d' % i for i in range(9)])
+
+    def test_shared_submitter(self):
+        """
+        SBATCH_MAX_WORKERS가 바뀌면 이전 submitter의 thread pool을 종료하고 새로 만드는지 확인
+        """
+        submitter = slurm_submitter()
+        self.assertIs(slurm_submitter(), submitter)
+        with override_settings(SBATCH_MAX_WORKERS=submitter.max_workers + 1), \
+                mock.patch.object(submitter, 'shutdown', wraps=submitter.shutdown) as shutdown:
+            replaced = slurm_submitter()
+        shutdown.assert_called_once_with(wait=False)
+        self.assertIsNot(replaced, submitter)
+        self.assertEqual(replaced.max_workers, submitter.max_workers + 1)
+        with self.assertRaises(RuntimeError):
+            submitter.submit(['run.py'], 'TEST')
+        self.assertIsNot(slurm_submitter(), replaced)
+
+    def test_work_run(self):
+        """
+        Work.run이 공용 SlurmSubmitter로 제출하고 job id를 기록하는지 확인
+        """
+        work = Work.objects.create(email='prowave@example.com')
+        os.makedirs(work.work_dir)
+        WorkHistory.objects.create(work_id=work.id, ip_addr='127.0.0.1', mode='m')
+
+        result = work.run()
+        self.assertTrue(result['run'])
+        self.assertEqual(work.slurm_job_id, result['slurm_job_id'])
+        self.assertTrue(WorkJob.objects.filter(job_id=result['slurm_job_id'], work_id=work.id).exists())
+        self.assertTrue(JobState.is_active(result['slurm_job_id']))
+        _, path, args = sbatch_calls(self.temp_dir)[0]
+        self.assertEqual(path, os.path.realpath(self.work_dir))
+        self.assertTrue(args.startswith('--job-name SFE --partition prowave --gres gpu:1 '))
+        self.assertTrue(args.endswith('sfe/scripts/run.py %d m' % work.id))
+
+
+class LocalBackendTestCase(TestCase):
+    """
+    prowave.utils.backends.LocalBackend Test Case
+    """
+    def setUp(self):
+        """
+        set up
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.backend = LocalBackend(max_workers=2, work_dir=self.temp_dir)
+
+    def tearDown(self):
+        """
+        tear down
+        """
+        self.backend.shutdown()
+        shutil.rmtree(self.temp_dir)
+
+    def write_script(self, name, body):
+        """
+        sh script 작성
+        """
+        script = os.path.join(self.temp_dir, name)
+        with open(script, 'w') as stream:
+            stream.write('#!/bin/sh\n' + body)
+        os.chmod(script, 0o755)
+        return script
+
+    def test_submit(self):
+        """
+        script를 실행하고 Slurm과 같은 환경 변수, 출력 파일, JobState를 기록하는지 확인
+        """
+        script = self.write_script('echo.sh', 'echo "$SLURM_JOB_ID $SLURM_JOB_NAME $1"\n')
+        job_id = self.backend.submit([script, 'hello'], 'ECHO', partition='prowave', gres='gpu:1')
+        self.assertTrue(self.backend.is_active(job_id) or self.backend.job_state(job_id).state == 'COMPLETED')
+        self.assertEqual(self.backend.wait(job_id, timeout=10), 'COMPLETED')
+
+        job = self.backend.job_state(job_id)
+        self.assertEqual((job.state, job.node), ('COMPLETED', 'localhost'))
+        self.assertIsNotNone(job.end_time)
+        with open(os.path.join(self.temp_dir, 'slurm-%d.out' % job_id), 'r') as stream:
+            self.assertEqual(stream.read(), '%d ECHO hello\n' % job_id)
+
+    def test_script_pythonpath(self):
+        """
+        script가 prowave.scripts를 import할 수 있도록 PYTHONPATH에 COMPUTE_PYTHONPATH를 추가하는지 확인
+        """
+        script = self.write_script('path.sh', 'echo "$PYTHONPATH"\n')
+        with override_settings(COMPUTE_PYTHONPATH='/opt/prowave'), mock.patch.dict(os.environ, PYTHONPATH='/opt/lib'):
+            job_id = self.backend.submit([script], 'PATH')
+        self.assertEqual(self.backend.wait(job_id, timeout=10), 'COMPLETED')
+        with open(os.path.join(self.temp_dir, 'slurm-%d.out' % job_id), 'r') as stream:
+            self.assertEqual(stream.read(), '/opt/prowave:/opt/lib\n')
+
+    def test_dependency_and_cancel(self):
+        """
+        afterok dependency는 선행 job이 성공해야 실행되고 실패하면 취소되며, 실행중인 job을 취소할 수 있는지 확인
+        """
+        failing = self.write_script('fail.sh', 'exit 1\n')
+        sleeping = self.write_script('sleep.sh', 'sleep 30\n')
+        ok = self.write_script('ok.sh', 'touch "$SLURM_JOB_ID.done"\n')
+
+        failed_id = self.backend.submit([failing], 'FAIL')
+        dependent_id = self.backend.submit([ok], 'OK', dependency='afterok:%d' % failed_id)
+        self.assertEqual(self.backend.wait(failed_id, timeout=10), 'FAILED')
+        self.assertEqual(self.backend.wait(dependent_id, timeout=10), 'CANCELLED')
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, '%d.done' % dependent_id)))
+
+        sleeping_id = self.backend.submit([sleeping], 'SLEEP')
+        chained_id = self.backend.submit([ok], 'OK', dependency='afterok:%d' % sleeping_id)
+        while not os.path.exists(os.path.join(self.temp_dir, '.prowave-local-%d.pid' % sleeping_id)):
+            time.sleep(0.05)
+        self.assertEqual(self.backend.job_state(sleeping_id).state, 'RUNNING')
+        self.backend.cancel(sleeping_id)
+        self.assertEqual(self.backend.wait(sleeping_id, timeout=10), 'CANCELLED')
+        self.assertEqual(self.backend.wait(chained_id, timeout=10), 'CANCELLED')
+
+    def test_abstract_backend(self):
+        """
+        submit, cancel을 구현하지 않은 backend는 만들 수 없는지 확인
+        """
+        class IncompleteBackend(ExecutionBackend):
+            def submit(self, script_args, job_name, **kwargs):
+                return -1
+
+        with self.assertRaises(TypeError):
+            IncompleteBackend()
+
+    def test_cancel_unknown_job(self):
+        """
+        이 프로세스가 제출하지 않은 job은 JobState만 CANCELLED로 기록하는지 확인
+        """
+        JobState.objects.create(job_id=900, state='RUNNING')
+        JobState.objects.create(job_id=901, array_job_id=900, array_task_id=0, state='PENDING')
+        JobState.objects.create(job_id=902, state='COMPLETED')
+        self.backend.cancel(900)
+        self.backend.cancel(902)
+        states = JobState.objects.filter(job_id__in=[900, 901, 902]).order_by('job_id')
+        self.assertEqual([job.state for job in states], ['CANCELLED', 'CANCELLED', 'COMPLETED'])
+        self.assertIsNotNone(JobState.objects.get(job_id=900).end_time)
+        self.backend.cancel(903)
+
+    def test_array(self):
+        """
+        job array의 각 task가 SLURM_ARRAY_TASK_ID와 함께 실행되고, task의 JobState가 기록되는지 확인
+        """
+        script = self.write_script('task.sh', 'touch "task$SLURM_ARRAY_TASK_ID.$SLURM_ARRAY_JOB_ID"\n')
+        job_id = self.backend.submit([script], 'ARRAY', array='0-2')
+        self.assertEqual(self.backend.wait(job_id, timeout=10), 'COMPLETED')
+        for task_id in range(3):
+            self.assertTrue(os.path.exists(os.path.join(self.temp_dir, 'task%d.%d' % (task_id, job_id))))
+            task = self.backend.job_state(job_id, task_id)
+            self.assertEqual((task.array_job_id, task.array_task_id, task.state), (job_id, task_id, 'COMPLETED'))
+
+    def test_state_written_on_refresh(self):
+        """
+        완료 callback은 DB에 쓰지 않고 상태만 바꾸며, 끝난 상태는 refresh에서 JobState에 기록되는지 확인
+        """
+        script = self.write_script('fail.sh', 'exit 3\n')
+        job_id = self.backend.submit([script], 'FAIL')
+        array_id = self.backend.submit([script], 'FAIL', array='0-1')
+
+        task_ids = [task.job_id for task in self.backend._jobs[array_id].tasks]
+        deadline = time.monotonic() + 10
+        while not all(self.backend._jobs[x].done for x in [job_id] + task_ids):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        with self.backend._lock:
+            self.assertEqual(self.backend._jobs[array_id].state, 'FAILED')
+        # 완료 callback은 JobState에 쓰지 않음
+        failed = JobState.objects.filter(job_id__in=[job_id, array_id], state='FAILED')
+        self.assertFalse(failed.exists())
+
+        self.assertEqual(sorted(job.job_id for job in self.backend.refresh()),
+                         sorted([job_id, array_id] + task_ids))
+        job = JobState.objects.get(job_id=job_id)
+        self.assertEqual((job.state, job.node), ('FAILED', 'localhost'))
+        self.assertIsNotNone(job.end_time)
+        self.assertEqual(JobState.objects.get(job_id=array_id).state, 'FAILED')
+        self.assertEqual(self.backend.refresh(), [])
+
+    def test_allocate_job_id(self):
+        """
+        job id를 DB 시퀀스에서 받고, 이미 JobState에 있는 번호는 건너뛰는지 확인
+        """
+        first = LocalBackend._allocate_job_id()
+        JobState.objects.create(job_id=first + 2)
+        self.assertEqual(LocalBackend._allocate_job_id(), first + 1)
+        self.assertEqual(LocalBackend._allocate_job_id(), first + 3)
+        self.assertEqual(JobState.objects.get(job_id=first + 3).state, 'PENDING')
+
+    def test_work_run(self):
+        """
+        EXECUTION_BACKEND 설정으로 Work.run, Work.status가 LocalBackend를 사용하는지 확인
+        """
+        with override_settings(EXECUTION_BACKEND='prowave.utils.backends.LocalBackend',
+                               PROWAVE_DATA_DIR=os.path.join(self.temp_dir, 'prowave_data'),
+                               SBATCH_WORKING_DIR=self.temp_dir, BASE_DIR=self.temp_dir,
+                               LOCAL_BACKEND_INTERPRETER='/bin/sh'):
+            os.makedirs(os.path.join(self.temp_dir, 'sfe/scripts'))
+            with open(os.path.join(self.temp_dir, 'sfe/scripts/run.py'), 'w') as stream:
+                stream.write('echo \'{}\' > "%s/$1/result.json"\n' % settings.PROWAVE_DATA_DIR)
+            work = Work.objects.create(email='prowave@example.com')
+            os.makedirs(work.work_dir)
+            WorkHistory.objects.create(work_id=work.id, ip_addr='127.0.0.1', mode='m')
+
+            result = work.run()
+            self.assertTrue(result['run'])
+            self.assertEqual(execution_backend().wait(result['slurm_job_id'], timeout=10), 'COMPLETED')
+            self.assertEqual(work.status, {'done': True})
+            self.assertEqual(JobState.objects.get(job_id=result['slurm_job_id']).state, 'COMPLETED')
+            execution_backend().shutdown()
+
+
+class FileResponseTestCase(TestCase):
+    """
+    prowave.utils.fileresponse Test Case
+    """
+    def setUp(self):
+        """
+        set up
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, 'md1.dcd')
+        self.data = bytes(range(256)) * 40
+        with open(self.file_path, 'wb') as stream:
+            stream.write(self.data)
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        """
+        tear down
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def get(self, **headers):
+        return file_response(self.factory.get('/', **headers), self.file_path)
+
+    def test_parse_range(self):
+        """
+        Range header의 구간, 무시할 header는 None, 파일을 벗어난 구간은 ValueError
+        """
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=990-2000', 1000), (990, 999))
+        self.assertEqual(parse_range('bytes=-2000', 1000), (0, 999))
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertIsNone(parse_range('bytes=0-1,5-9', 1000))
+        self.assertIsNone(parse_range('bytes=10-5', 1000))
+        self.assertIsNone(parse_range('items=0-9', 1000))
+        with self.assertRaises(ValueError):
+            parse_range('bytes=1000-', 1000)
+        with self.assertRaises(ValueError):
+            parse_range('bytes=-0', 1000)
+
+    def test_range(self):
+        """
+        Range 요청은 206과 Content-Range로 구간만 보내고, 파일을 벗어나면 416
+        """
+        response = self.get(HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1999/10240')
+        self.assertEqual(response['Content-Length'], '1000')
+        self.assertEqual(b''.join(response.streaming_content), self.data[1000:2000])
+
+        with override_settings(FILE_RESPONSE_CHUNK_SIZE=300):
+            response = self.get(HTTP_RANGE='bytes=-1000')
+            chunks = list(response.streaming_content)
+        self.assertEqual([len(chunk) for chunk in chunks], [300, 300, 300, 100])
+        self.assertEqual(b''.join(chunks), self.data[-1000:])
+
+        response = self.get(HTTP_RANGE='bytes=10240-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10240')
+
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+
+    def test_conditional(self):
+        """
+        ETag, Last-Modified가 같으면 304, 파일이 바뀌면 If-Range가 맞지 않아 전체 파일을 보내는지 확인
+        """
+        response = self.get()
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag)['ETag'], etag)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+
+        with open(self.file_path, 'ab') as stream:
+            stream.write(b'appended')
+        stat = os.stat(self.file_path)
+        os.utime(self.file_path, (stat.st_atime, stat.st_mtime + 10))
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data + b'appended')
+
+        # 저장된 checksum으로 만든 ETag
+        response = file_response(self.factory.get('/', HTTP_IF_NONE_MATCH='"sha256"'), self.file_path,
+                                 etag='"sha256"')
+        self.assertEqual(response.status_code, 304)
+
+
+class WorkManifestTestCase(TestCase):
+    """
+    prowave.utils.manifest Test Case
+    """
+    def setUp(self):
+        """
+        set up
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.work_dir = os.path.join(self.temp_dir, '3')
+        os.makedirs(os.path.join(self.work_dir, 'md'))
+        for name, data in (('model.prmtop', b'prmtop'), ('md/md1.dcd', b'dcd'), ('md/md2.dcd.part', b'partial')):
+            self.write(name, data)
+
+    def tearDown(self):
+        """
+        tear down
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, data):
+        with open(os.path.join(self.work_dir, name), 'wb') as stream:
+            stream.write(data)
+
+    def test_manifest(self):
+        """
+        update_checksums로 저장한 SHA-256만 반환하고, 바뀐 파일의 SHA-256만 다시 계산하는지 확인
+        """
+        with mock.patch('prowave.utils.manifest.file_sha256') as sha256:
+            self.assertEqual(work_manifest(self.work_dir), [])
+        sha256.assert_not_called()
+
+        with mock.patch('prowave.utils.manifest.file_sha256', wraps=file_sha256) as sha256:
+            update_checksums(self.work_dir)
+        self.assertEqual(sha256.call_count, 2)
+        self.assertEqual(FileChecksum.objects.count(), 2)
+        manifest = work_manifest(self.work_dir)
+        self.assertEqual([(item['path'], item['size']) for item in manifest], [('md/md1.dcd', 3), ('model.prmtop', 6)])
+        self.assertEqual(manifest[0]['sha256'], hashlib.sha256(b'dcd').hexdigest())
+
+        # 바뀐 파일은 다시 계산할 때까지 manifest에서 제외함
+        self.write('md/md1.dcd', b'changed')
+        os.utime(os.path.join(self.work_dir, 'md/md1.dcd'), ns=(0, 10 ** 9))
+        self.assertEqual([item['path'] for item in work_manifest(self.work_dir)], ['model.prmtop'])
+        with mock.patch('prowave.utils.manifest.file_sha256', wraps=file_sha256) as sha256:
+            self.assertEqual(update_checksums(self.work_dir), [os.path.join(self.work_dir, 'md/md1.dcd')])
+        sha256.assert_called_once_with(os.path.join(self.work_dir, 'md/md1.dcd'))
+        self.assertEqual(work_manifest(self.work_dir)[0]['sha256'], hashlib.sha256(b'changed').hexdigest())
+        self.assertEqual(FileChecksum.objects.get(path=os.path.join(self.work_dir, 'md/md1.dcd')).size, 7)
+
+        self.assertEqual([item['path'] for item in work_manifest(self.work_dir, ['md/md1.dcd', '../3/x', 'md'])],
+                         ['md/md1.dcd'])
+
+        os.remove(os.path.join(self.work_dir, 'model.prmtop'))
+        self.assertEqual(len(work_manifest(self.work_dir)), 1)
+        update_checksums(self.work_dir)
+        self.assertEqual(FileChecksum.objects.count(), 1)
+
+    def test_record_checksum(self):
+        """
+        이미 계산한 SHA-256은 파일을 다시 읽지 않고 저장하는지 확인
+        """
+        file_path = os.path.join(self.work_dir, 'model.prmtop')
+        with mock.patch('prowave.utils.manifest.file_sha256') as sha256:
+            record_checksum(file_path, hashlib.sha256(b'prmtop').hexdigest().upper())
+        sha256.assert_not_called()
+        self.assertEqual(work_manifest(self.work_dir, ['model.prmtop'])[0]['sha256'],
+                         hashlib.sha256(b'prmtop').hexdigest())
+
+        with override_settings(WEBMD_DATA_DIR=self.temp_dir, PROWAVE_DATA_DIR=os.path.join(self.temp_dir, 'none')):
+            stdout = StringIO()
+            call_command('update_checksums', '--once', stdout=stdout)
+        self.assertEqual(stdout.getvalue().split(), [os.path.join(self.work_dir, 'md/md1.dcd')])
+
+
+class TransferClientTestCase(LiveServerTestCase):
+    """
+    prowave.scripts.transfer Test Case
+    """
+    def setUp(self):
+        """
+        set up
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.temp_dir, 'webmd_data')
+        self.settings_override = override_settings(WEBMD_DATA_DIR=self.data_dir)
+        self.settings_override.enable()
+        os.makedirs(os.path.join(self.data_dir, '3/md'))
+        self.data = os.urandom(300000)
+        for name, data in (('model.prmtop', b'prmtop'), ('md/md1.dcd', self.data)):
+            with open(os.path.join(self.data_dir, '3', name), 'wb') as stream:
+                stream.write(data)
+        self.client = TransferClient(max_workers=2, backoff=0, chunk_size=65536)
+        self.files_url = '%s/api/webmd/files/3' % self.live_server_url
+        self.upload_url = '%s/api/webmd/uploads/3' % self.live_server_url
+        self.cwd = os.getcwd()
+        os.makedirs(os.path.join(self.temp_dir, 'node'))
+        os.chdir(os.path.join(self.temp_dir, 'node'))
+
+    def tearDown(self):
+        """
+        tear down
+        """
+        os.chdir(self.cwd)
+        self.client.close()
+        self.settings_override.disable()
+        shutil.rmtree(self.temp_dir)
+
+    def test_fetch_and_store(self):
+        """
+        여러 파일을 동시에 받아 같은 상대 경로에 저장하고, 결과를 chunk 단위로 업로드하는지 확인
+        """
+        self.assertEqual(self.client.fetch(self.files_url, ['model.prmtop', 'md/md1.dcd']),
+                         ['model.prmtop', 'md/md1.dcd'])
+        with open('md/md1.dcd', 'rb') as stream:
+            self.assertEqual(stream.read(), self.data)
+        self.assertFalse(os.path.exists('md/md1.dcd.part'))
+
+        self.client.store(self.upload_url, 'md/md1.dcd', 'md/md2.dcd')
+        with open(os.path.join(self.data_dir, '3/md/md2.dcd'), 'rb') as stream:
+            self.assertEqual(stream.read(), self.data)
+
+        with self.assertRaises(requests.HTTPError):
+            self.client.download('%s/missing.pdb' % self.files_url, 'missing.pdb')
+
+    def test_retry(self):
+        """
+        연결 오류는 다시 보내고 4xx 응답은 다시 보내지 않는지 확인
+        """
+        send = self.client.session.request
+        calls = []
+
+        def flaky(*args, **kwargs):
+            calls.append(args)
+            if len(calls) < 3:
+                raise requests.ConnectionError()
+            return send(*args, **kwargs)
+
+        with mock.patch.object(self.client.session, 'request', side_effect=flaky):
+            response = self.client.request('POST', '%s/model.prmtop' % self.upload_url, data={'action': 'init'})
+        self.assertEqual((len(calls), response.json()), (3, {'offset': 0}))
+
+        with mock.patch.object(self.client.session, 'request', wraps=send) as request:
+            with self.assertRaises(requests.HTTPError):
+                self.client.request('PUT', '%s/model.prmtop' % self.upload_url)
+        self.assertEqual(request.call_count, 1)
+
+    def test_shared_work_dir(self):
+        """
+        work directory가 mount되어 있으면 HTTP 대신 link로 읽고 rename으로 쓰는지 확인
+        """
+        work_dir = shared_work_dir(self.data_dir, 3, 'model.prmtop')
+        self.assertEqual(work_dir, os.path.join(self.data_dir, '3'))
+        self.assertIsNone(shared_work_dir(self.data_dir, 4, 'model.prmtop'))
+
+        self.client.fetch(self.files_url, ['md/md1.dcd'], work_dir)
+        self.assertEqual(os.readlink('md/md1.dcd'), os.path.join(work_dir, 'md/md1.dcd'))
+        with open('result.out', 'w') as stream:
+            stream.write('result')
+        self.client.store(self.upload_url, 'result.out', 'analyses/rmsd1.out', work_dir)
+        self.assertEqual(os.listdir(os.path.join(work_dir, 'analyses')), ['rmsd1.out'])
+
+    def test_input_cache(self):
+        """
+        manifest의 SHA-256으로 cache에서 hardlink하고, 다시 받지 않는지 확인
+        """
+        cache = InputCache(os.path.join(self.temp_dir, 'cache'), 10 * 1024 ** 2)
+        self.client.cache = cache
+        manifest_url = '%s/api/webmd/manifest/3' % self.live_server_url
+        update_checksums(os.path.join(self.data_dir, '3'))
+        hashes = self.client.manifest(manifest_url, ['model.prmtop', 'md/md1.dcd', 'missing.pdb'])
+        self.assertEqual(hashes['md/md1.dcd'], hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(sorted(hashes), ['md/md1.dcd', 'model.prmtop'])
+
+        self.client.fetch(self.files_url, ['model.prmtop', 'md/md1.dcd'], manifest_url=manifest_url,
+                          cached=['md/md1.dcd'])
+        cached_path = cache.path(hashes['md/md1.dcd'])
+        self.assertTrue(os.path.samefile(cached_path, 'md/md1.dcd'))
+        self.assertFalse(os.path.exists(cache.path(hashes['model.prmtop'])))
+
+        shutil.rmtree('md')
+        with mock.patch.object(self.client, 'download', wraps=self.client.download) as download:
+            self.client.fetch(self.files_url, ['md/md1.dcd'], manifest_url=manifest_url, cached=['md/md1.dcd'])
+        self.assertEqual(download.call_count, 0)
+        with open('md/md1.dcd', 'rb') as stream:
+            self.assertEqual(stream.read(), self.data)
+
+        # 이전 실행의 파일이 남아 있으면 cache의 파일로 교체함
+        os.remove('md/md1.dcd')
+        with open('md/md1.dcd', 'wb') as stream:
+            stream.write(b'stale')
+        self.client.fetch(self.files_url, ['md/md1.dcd'], manifest_url=manifest_url,
+                          cached=['md/md1.dcd'])
+        self.assertTrue(os.path.samefile(cached_path, 'md/md1.dcd'))
+        self.assertEqual(os.listdir('md'), ['md1.dcd'])
+
+        # manifest와 내용이 다른 파일은 cache에 추가하지 않음
+        with open('other.dcd', 'wb') as stream:
+            stream.write(b'other')
+        self.assertFalse(cache.add('other.dcd', hashes['model.prmtop']))
+
+    def test_input_cache_evict(self):
+        """
+        전체 크기가 max_size를 넘으면 가장 오래 사용하지 않은 파일부터 지우는지 확인
+        """
+        cache = InputCache(os.path.join(self.temp_dir, 'cache'), 250)
+        hashes = []
+        for index in range(3):
+            data = bytes([index]) * 100
+            with open('input%d' % index, 'wb') as stream:
+                stream.write(data)
+            hashes.append(hashlib.sha256(data).hexdigest())
+            self.assertTrue(cache.add('input%d' % index, hashes[index]))
+            os.utime(cache.path(hashes[index]), (index * 10, index * 10))
+            if index == 1:
+                # 먼저 추가한 파일을 다시 사용하면 나중에 지워짐
+                self.assertTrue(cache.link(hashes[0], 'linked0'))
+
+        self.assertTrue(os.path.exists(cache.path(hashes[0])))
+        self.assertFalse(os.path.exists(cache.path(hashes[1])))
+        self.assertTrue(os.path.exists(cache.path(hashes[2])))
+        self.assertFalse(cache.link(hashes[1], 'linked1'))
+        with open('input1', 'rb') as stream:
+            self.assertEqual(stream.read(), bytes([1]) * 100)
@@ -17,6 +17,7 @@ from django.contrib import admin
 from django.urls import path, re_path, include
 # from auth import apis as auth_apis
 from auth import viewsets as auth_viewsets
+from prowave import viewsets as prowave_viewsets
 from sfe import viewsets as sfe_viewsets
 from webmd import views as webmd_views
 from webmd import viewsets as webmd_viewsets
@@ -35,8 +36,13 @@ urlpatterns = [  # pylint: disable=invalid-name
     # re_path(r^api/solvation-free-energy/files/(?P<work_id>\S+)/(?P<filename>\S+)$', sfe_views.files),
     path('api/solvation-free-energy/', include(sfe_viewsets.router.urls)),
 
+    # slurm job events
+    path('api/', include(prowave_viewsets.router.urls)),
+
     # webmd
     re_path(r'^api/webmd/files/(?P<traj_id>\S+)/(?P<filename>\S+)$', webmd_views.files),
+    re_path(r'^api/webmd/uploads/(?P<traj_id>\d+)/(?P<filename>\S+)$', webmd_views.uploads),
+    re_path(r'^api/webmd/manifest/(?P<traj_id>\d+)$', webmd_views.manifest),
     path('api/webmd/', include(webmd_viewsets.router.urls)),
 
     # admin
@@ -3,48 +3,77 @@ prowave.utils
 """
 import glob
 import os
+import shutil
 import subprocess
+import tempfile
 import requests
 from django.conf import settings
 
 
+RCSB_DOWNLOAD_URL = 'https://files.rcsb.org/download/%s'
+# 미러에 저장하는 형식의 우선순위, 큰 구조는 PDB 형식 없이 mmCIF로만 제공됨
+PDB_SOURCE_FORMATS = ('pdb.gz', 'cif.gz')
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
 def download_pdb_form_rcsb(pdb_id):
     """
     RCSB로부터 4자리 PDB ID에 해당하는 PDB파일 다운로드
-    pdb_sources_dir에 해당 PDB가 존재하면 단순 복사 존재하지 않으면 원격지 사이트로부터 다운로드하여 pdb_sources_dir에 저장
+    pdb_sources_dir에 해당 PDB가 존재하면 그 경로를 반환하고, 존재하지 않으면 원격지 사이트로부터
+    gzip으로 압축된 파일 (.pdb.gz, 없으면 .cif.gz) 을 압축된 그대로 pdb_sources_dir에 저장
+    이전에 압축하지 않고 저장한 .pdb 파일도 그대로 사용함
 
     :param pdb_id:
-    :return: pdb content in binary
+    :return: pdb_sources_dir에 저장된 파일 경로
     """
     source_file_dir = os.path.join(settings.PDB_SOURCES_DIR, '%s' % pdb_id.upper()[:2])
-    source_file_path = os.path.join(source_file_dir, '%s.pdb' % pdb_id.upper())
-    if os.path.exists(source_file_path):
-        with open(source_file_path, 'rb') as stream:
-            return stream.read()
-    try:
-        response = requests.get("https://file.rcsb.org/download/%s.pdb" % pdb_id.lower())
-        os.makedirs(os.path.dirname(source_file_path), exist_ok=True)
-        with open(source_file_path, 'wb+') as stream:
-            stream.write(response.content)
-        return response.content
-    except requests.exceptions.RequestException:
-        raise AttributeError("Invalid PDB ID")
+    for ext in ('pdb',) + PDB_SOURCE_FORMATS:
+        source_file_path = os.path.join(source_file_dir, '%s.%s' % (pdb_id.upper(), ext))
+        if os.path.exists(source_file_path):
+            return source_file_path
+
+    os.makedirs(source_file_dir, exist_ok=True)
+    for ext in PDB_SOURCE_FORMATS:
+        source_file_path = os.path.join(source_file_dir, '%s.%s' % (pdb_id.upper(), ext))
+        url = RCSB_DOWNLOAD_URL % ('%s.%s' % (pdb_id.lower(), ext))
+        try:
+            with requests.get(url, stream=True) as response:
+                if response.status_code == 404:
+                    continue
+                response.raise_for_status()
+                # 다운로드 중인 파일을 다른 요청이 읽지 않도록 임시 파일에 쓴 뒤 rename 함
+                fd, temp_path = tempfile.mkstemp(dir=source_file_dir, suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'wb') as stream:
+                        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                            stream.write(chunk)
+                    os.replace(temp_path, source_file_path)
+                except BaseException:
+                    # 다운로드에 실패하면 임시 파일을 남기지 않음
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+                return source_file_path
+        except requests.exceptions.RequestException as e:
+            # 디스크 오류 (OSError) 는 잘못된 PDB ID가 아니므로 그대로 발생시킴
+            raise AttributeError("Invalid PDB ID") from e
+    raise AttributeError("Invalid PDB ID")
 
 
 def get_rcsb_pdb(pdb_id, target_dir):
     """
     RCSB로부터 4자리 PDB ID에 해당하는 PDB파일 다운로드
     pdb_sources_dir에 해당 PDB가 존재하면 단순 복사 존재하지 않으면 원격지 사이트로부터 다운로드하여 pdb_sources_dir에 저장
+    압축된 파일은 압축된 그대로 복사하며, 읽을 때는 pdbutil.open_structure를 사용함
 
     :param pdb_id:
     :param target_dir:
     :return: full_file_path
     """
-    pdb_content = download_pdb_form_rcsb(pdb_id)
-    full_file_path = os.path.join(target_dir, '%s.pdb' % pdb_id.upper())
+    source_file_path = download_pdb_form_rcsb(pdb_id)
+    full_file_path = os.path.join(target_dir, os.path.basename(source_file_path))
     os.makedirs(target_dir, exist_ok=True)
-    with open(full_file_path, 'wb') as stream:
-        stream.write(pdb_content)
+    shutil.copyfile(source_file_path, full_file_path)
     return full_file_path
 
 
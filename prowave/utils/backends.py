@@ -0,0 +1,406 @@
+"""
+prowave.utils.backends
+
+작업 실행 backend
+settings.EXECUTION_BACKEND에 지정된 backend로 scripts/*.py를 제출, 취소하고 상태 (prowave.models.JobState) 를 읽음
+
+- SlurmBackend: sbatch로 제출하고 poll_slurm_jobs 명령이 squeue/sacct로 상태를 갱신함
+- LocalBackend: 같은 script를 이 프로세스의 ProcessPoolExecutor에서 실행함 (Slurm이 없는 workstation, CI 용)
+"""
+import hashlib
+import hmac
+import os
+import signal
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from prowave.utils.slurm import sbatch
+
+
+# LocalBackend의 job id를 할당하는 DB 시퀀스 (migration 0009)
+LOCAL_JOB_ID_SEQUENCE = 'prowave_local_job_id_seq'
+
+
+def job_event_token():
+    """
+    job event endpoint (prowave.viewsets.JobStateViewSet) 가 확인하는 token
+    settings.JOB_EVENT_TOKEN을 지정하지 않으면 SECRET_KEY로부터 만듦
+    """
+    if settings.JOB_EVENT_TOKEN:
+        return settings.JOB_EVENT_TOKEN
+    return hmac.new(settings.SECRET_KEY.encode(), b'prowave job events', hashlib.sha256).hexdigest()
+
+
+def script_environment(**env):
+    """
+    compute script를 실행할 환경 변수 (os.environ에 env를 더함)
+    sbatch는 script를 spool directory로 복사하여 실행하므로, script가 공용 모듈 (prowave.scripts) 을
+    import할 수 있도록 PYTHONPATH 앞에 settings.COMPUTE_PYTHONPATH를 추가함
+    script가 job event를 보낼 수 있도록 PROWAVE_JOB_EVENT_TOKEN에 job_event_token을 넣음
+    """
+    env = dict(os.environ, PROWAVE_JOB_EVENT_TOKEN=job_event_token(), **env)
+    if settings.COMPUTE_PYTHONPATH:
+        env['PYTHONPATH'] = os.pathsep.join(
+            path for path in (settings.COMPUTE_PYTHONPATH, env.get('PYTHONPATH')) if path)
+    return env
+
+
+class ExecutionBackend(ABC):
+    """
+    작업 실행 backend 기본 클래스, submit과 cancel은 모든 backend가 구현해야 함
+    모든 backend는 제출한 job의 상태를 JobState에 기록하며, Work.status, Trajectory.running 등은 job_state, is_active로 읽음
+    """
+    @abstractmethod
+    def submit(self, script_args, job_name, partition=None, dependency=None, gres=None, array=None):
+        """
+        script 실행을 제출
+
+        :param script_args: script 경로와 인자의 list
+        :param job_name: job 이름
+        :param partition: Slurm partition (LocalBackend는 사용하지 않음)
+        :param dependency: afterok:<job id>[:<job id>...]
+        :param gres: Slurm gres (LocalBackend는 사용하지 않음)
+        :param array: job array task id 범위 (예: 0-9)
+        :return: job id 또는 제출에 실패하면 -1
+        """
+
+    @abstractmethod
+    def cancel(self, job_id):
+        """
+        job 취소
+        """
+
+    def poll(self):
+        """
+        job 상태를 JobState에 갱신
+
+        :return: 상태가 갱신된 JobState 의 list
+        """
+        return []
+
+    def refresh(self):
+        """
+        상태를 읽기 전에 호출됨, 상태를 바로 알 수 있는 backend는 JobState를 갱신함
+        """
+
+    def job_state(self, job_id, array_task_id=None):
+        """
+        job의 JobState
+        job array의 task는 task의 JobState가 생기기 전까지 array 전체의 JobState를 사용함
+        """
+        from prowave.models import JobState
+        self.refresh()
+        if array_task_id is not None:
+            job = JobState.objects.filter(array_job_id=job_id, array_task_id=array_task_id).first()
+            if job:
+                return job
+        return JobState.objects.filter(job_id=job_id).first()
+
+    def is_active(self, job_id):
+        """
+        job이 실행 대기중이거나 실행중인지 체크
+        """
+        from prowave.models import JobState
+        self.refresh()
+        return JobState.is_active(job_id)
+
+
+class SlurmBackend(ExecutionBackend):
+    """
+    Slurm workload manager backend
+    """
+    def submit(self, script_args, job_name, partition=None, dependency=None, gres=None, array=None):
+        from prowave.models import JobState
+        job_id = sbatch(script_args, job_name, env=script_environment(),
+                        partition=partition, dependency=dependency, gres=gres, array=array)
+        if job_id > 0:
+            JobState.submitted(job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        from prowave.models import JobState
+        subprocess.check_call([settings.SCANCEL_EXE, '%d' % job_id])
+        JobState.objects.filter(job_id=job_id, state__in=JobState.ACTIVE_STATES) \
+            .update(state='CANCELLED', end_time=timezone.now())
+
+    def poll(self):
+        from prowave.models import JobState
+        return JobState.poll()
+
+
+def _run_local_job(cmd, cwd, env, output_file, pid_file):
+    """
+    LocalBackend의 worker 프로세스에서 script를 실행하고 종료 코드를 반환함
+    취소할 때 process group 전체에 signal을 보낼 수 있도록 새 session에서 실행하고 pid를 pid_file에 기록함
+    """
+    with open(output_file, 'ab') as output:
+        process = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=output, stderr=subprocess.STDOUT,
+                                   start_new_session=True)
+        with open(pid_file, 'w') as stream:
+            stream.write('%d' % process.pid)
+        return process.wait()
+
+
+class LocalJob:
+    """
+    LocalBackend에 제출된 job
+    """
+    def __init__(self, job_id, cmd, env, dependencies=(), array_job_id=None, array_task_id=None):
+        self.job_id = job_id
+        self.cmd = cmd
+        self.env = env
+        self.dependencies = list(dependencies)
+        self.array_job_id = array_job_id
+        self.array_task_id = array_task_id
+        self.tasks = []
+        self.future = None
+        self.state = 'PENDING'
+        self.start_time = None
+        self.end_time = None
+        self.cancelled = False
+        self.changed = True
+
+    @property
+    def done(self):
+        return self.state in ('COMPLETED', 'FAILED', 'CANCELLED')
+
+
+class LocalBackend(ExecutionBackend):
+    """
+    scripts/*.py를 ProcessPoolExecutor에서 실행하는 backend
+    job id, 상태, dependency (afterok), job array, 취소를 Slurm과 같은 방식으로 지원하며
+    script에는 SLURM_JOB_ID 등의 환경 변수를 Slurm과 같이 설정하므로 job event도 그대로 보냄
+    완료 callback은 ProcessPoolExecutor의 thread에서 실행되므로 DB에 쓰지 않고 상태만 바꾸며,
+    바뀐 상태는 refresh (job_state, is_active, poll, wait) 에서 JobState에 기록함
+    실행 시작과 종료는 script가 보내는 job event로도 기록되므로 다른 프로세스 (웹 서버) 에서도 읽을 수 있음
+    """
+    def __init__(self, max_workers=2, work_dir=None):
+        """
+        :param max_workers: 동시에 실행할 script 수
+        :param work_dir: script를 실행할 경로 (slurm-<job id>.out 기록), 기본값 settings.SBATCH_WORKING_DIR
+        """
+        self.max_workers = max_workers
+        self.work_dir = work_dir
+        self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        self._jobs = dict()
+        self._lock = threading.RLock()
+
+    def submit(self, script_args, job_name, partition=None, dependency=None, gres=None, array=None):
+        dependencies = [int(x) for x in dependency.split(':')[1:]] if dependency else []
+        job = self._create_job(script_args, job_name, dependencies)
+        if array:
+            first, last = [int(x) for x in array.split('-')] if '-' in array else (int(array), int(array))
+            for task_id in range(first, last + 1):
+                task = self._create_job(script_args, job_name, dependencies, job.job_id, task_id)
+                job.tasks.append(task)
+        with self._lock:
+            self._start_ready()
+        return job.job_id
+
+    def cancel(self, job_id):
+        """
+        job 취소
+        이 프로세스가 제출하지 않은 job (재시작 전이나 다른 worker 프로세스에서 제출한 job) 은
+        실행중인 script에 signal을 보낼 수 없으므로 JobState만 CANCELLED로 기록함
+        """
+        from prowave.models import JobState
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._cancel(job)
+        if job is None:
+            now = timezone.now()
+            JobState.objects.filter(Q(job_id=job_id) | Q(array_job_id=job_id),
+                                    state__in=JobState.ACTIVE_STATES) \
+                .update(state='CANCELLED', end_time=now, updated_at=now)
+        else:
+            self.refresh()
+
+    def _cancel(self, job):
+        """
+        실행 전인 job (job array는 task) 은 바로 취소하고, 실행중인 job은 process group에 SIGTERM을 보냄
+        """
+        for target in job.tasks or [job]:
+            if target.done:
+                continue
+            target.cancelled = True
+            if target.future is None or target.future.cancel():
+                self._finish(target, 'CANCELLED')
+            elif os.path.exists(self._pid_file(target)):
+                with open(self._pid_file(target), 'r') as stream:
+                    os.killpg(int(stream.read()), signal.SIGTERM)
+        self._start_ready()
+
+    def poll(self):
+        return self.refresh()
+
+    def refresh(self):
+        """
+        실행 상태가 바뀐 job을 JobState에 기록
+        """
+        from prowave.models import JobState
+        with self._lock:
+            for job in self._jobs.values():
+                if job.state == 'PENDING' and job.future is not None and job.future.running():
+                    job.state, job.start_time, job.changed = 'RUNNING', timezone.now(), True
+                if job.tasks:
+                    self._update_array(job)
+            changed = [job for job in self._jobs.values() if job.changed]
+            for job in changed:
+                job.changed = False
+        updated = []
+        for job in changed:
+            saved = JobState.objects.filter(job_id=job.job_id).update(
+                state=job.state, node='localhost', start_time=job.start_time, end_time=job.end_time,
+                updated_at=timezone.now())
+            if saved:
+                updated.append(JobState.objects.get(job_id=job.job_id))
+            else:
+                # 다른 연결에서 아직 commit하지 않은 JobState 등은 다음 refresh에서 다시 기록함
+                job.changed = True
+        return updated
+
+    def wait(self, job_id, timeout=None):
+        """
+        job이 끝날 때까지 기다림
+
+        :return: 마지막 상태
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        job = self._jobs[job_id]
+        while True:
+            with self._lock:
+                if job.tasks:
+                    self._update_array(job)
+                if job.done:
+                    break
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        self.refresh()
+        return job.state
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _create_job(self, script_args, job_name, dependencies, array_job_id=None, array_task_id=None):
+        from prowave.models import JobState
+        job_id = self._allocate_job_id()
+        env = script_environment(SLURM_JOB_ID='%d' % job_id, SLURM_JOB_NAME=job_name)
+        if array_job_id is not None:
+            env.update(SLURM_ARRAY_JOB_ID='%d' % array_job_id, SLURM_ARRAY_TASK_ID='%d' % array_task_id)
+            JobState.objects.filter(job_id=job_id).update(array_job_id=array_job_id, array_task_id=array_task_id)
+        cmd = list(script_args)
+        if settings.LOCAL_BACKEND_INTERPRETER:
+            cmd.insert(0, settings.LOCAL_BACKEND_INTERPRETER)
+        job = LocalJob(job_id, cmd, env, dependencies, array_job_id, array_task_id)
+        with self._lock:
+            self._jobs[job_id] = job
+        return job
+
+    @staticmethod
+    def _allocate_job_id():
+        """
+        LOCAL_JOB_ID_SEQUENCE의 다음 번호를 job id로 사용하여 PENDING 상태로 기록함
+        시퀀스는 여러 프로세스에서 동시에 호출해도 같은 번호를 주지 않으며,
+        이미 JobState에 있는 번호 (Slurm job 등) 이면 다음 번호로 다시 시도함
+        """
+        from prowave.models import JobState
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT nextval(%s)', [LOCAL_JOB_ID_SEQUENCE])
+                job_id = cursor.fetchone()[0]
+            try:
+                with transaction.atomic():
+                    JobState.objects.create(job_id=job_id)
+                return job_id
+            except IntegrityError:
+                continue
+
+    def _start_ready(self):
+        """
+        dependency가 모두 성공한 PENDING job을 실행하고, 실패한 dependency가 있으면 취소함
+        """
+        for job in list(self._jobs.values()):
+            if job.tasks or job.future is not None or job.done:
+                continue
+            dependencies = [self._jobs[x] for x in job.dependencies if x in self._jobs]
+            if any(x.done and x.state != 'COMPLETED' for x in dependencies):
+                # sbatch --kill-on-invalid-dep=yes 와 같이 선행 job이 실패하면 취소함
+                self._finish(job, 'CANCELLED')
+            elif all(x.state == 'COMPLETED' for x in dependencies):
+                job.future = self._executor.submit(
+                    _run_local_job, job.cmd, self.work_dir or settings.SBATCH_WORKING_DIR, job.env,
+                    self._output_file(job), self._pid_file(job))
+                job.future.add_done_callback(lambda future, job=job: self._on_done(job, future))
+
+    def _on_done(self, job, future):
+        """
+        ProcessPoolExecutor의 완료 callback, job과 job array의 끝난 상태를 기록함
+        callback thread에서는 DB 연결을 열지 않도록 JobState는 refresh에서 기록함
+        """
+        with self._lock:
+            if job.cancelled or future.cancelled():
+                state = 'CANCELLED'
+            elif future.exception() is None and future.result() == 0:
+                state = 'COMPLETED'
+            else:
+                state = 'FAILED'
+            self._finish(job, state)
+            if job.array_job_id is not None:
+                self._update_array(self._jobs[job.array_job_id])
+            self._start_ready()
+
+    def _update_array(self, job):
+        """
+        job array의 상태는 task의 상태로 정함
+        """
+        states = [task.state for task in job.tasks]
+        if all(task.done for task in job.tasks):
+            state = 'COMPLETED' if all(x == 'COMPLETED' for x in states) else \
+                'CANCELLED' if all(x == 'CANCELLED' for x in states) else 'FAILED'
+            if not job.done:
+                self._finish(job, state)
+        elif 'RUNNING' in states and job.state != 'RUNNING':
+            job.state, job.start_time, job.changed = 'RUNNING', timezone.now(), True
+
+    def _finish(self, job, state):
+        now = timezone.now()
+        job.state = state
+        job.start_time = job.start_time or now
+        job.end_time = now
+        job.changed = True
+
+    def _output_file(self, job):
+        return os.path.join(self.work_dir or settings.SBATCH_WORKING_DIR, 'slurm-%d.out' % job.job_id)
+
+    def _pid_file(self, job):
+        return os.path.join(self.work_dir or settings.SBATCH_WORKING_DIR, '.prowave-local-%d.pid' % job.job_id)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def execution_backend():
+    """
+    settings.EXECUTION_BACKEND에 지정된 프로세스 공용 backend
+    """
+    global _backend
+    with _backend_lock:
+        backend_class = import_string(settings.EXECUTION_BACKEND)
+        if type(_backend) is not backend_class:
+            if issubclass(backend_class, LocalBackend):
+                _backend = backend_class(settings.LOCAL_BACKEND_MAX_WORKERS)
+            else:
+                _backend = backend_class()
+        return _backend
@@ -0,0 +1,200 @@
+"""
+cifutil.py
+
+mmCIF 파일의 _atom_site, _pdbx_poly_seq_scheme 항목을 읽어
+pdbutil.Topology가 읽을 수 있는 PDB 형식의 줄 (SEQRES, ATOM/HETATM, TER, ENDMDL) 로 변환함
+PDB 형식에 맞지 않는 2글자 이상의 chain ID는 사용하지 않는 1글자 chain ID로 바꾸고 CHAIN_MAP_REMARK 줄로 기록함
+"""
+import re
+import string
+
+
+TOKEN_PATTERN = re.compile(r"'(?:[^']|'(?!\s|$))*'|\"(?:[^\"]|\"(?!\s|$))*\"|\S+")
+MISSING_VALUES = ('.', '?')
+ATOM_LINE_FORMAT = '%-6s%5d %-4s%1s%3s %1s%4s%1s   %8.3f%8.3f%8.3f%6.2f%6.2f          %2s%2s'
+# 바꾼 chain ID를 기록하는 줄 (REMARK 999 CHAIN <PDB chain ID> <mmCIF chain ID>), pdbutil.Topology.chain_map으로 읽음
+CHAIN_MAP_REMARK = 'REMARK 999 CHAIN '
+# 2글자 이상의 chain ID에 할당할 1글자 chain ID, 큰 구조는 대문자를 먼저 사용하므로 소문자, 숫자부터 할당함
+CHAIN_ID_CHARACTERS = string.ascii_lowercase + string.digits + string.ascii_uppercase
+
+
+def _tokens(line):
+    tokens = []
+    for token in TOKEN_PATTERN.findall(line):
+        if len(token) > 1 and token[0] == token[-1] and token[0] in ('"', "'"):
+            token = token[1:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _value(row, key, default=''):
+    value = row.get(key, default)
+    return default if value in MISSING_VALUES else value
+
+
+def _atom_name(name, element):
+    """
+    PDB 형식의 atom name 열 (13-16) 정렬
+    1글자 원소기호인 atom은 14열부터 씀
+    """
+    if len(name) < 4 and len(element) == 1:
+        return ' ' + name
+    return name
+
+
+class ChainIdMap:
+    """
+    mmCIF chain ID를 PDB 형식의 1글자 chain ID로 바꾸는 표
+    1글자 chain ID는 그대로 쓰고, 2글자 이상이거나 이미 다른 chain에 할당된 chain ID는
+    CHAIN_ID_CHARACTERS 중 사용하지 않은 글자로 바꿈
+    """
+    def __init__(self):
+        self.pdb_ids = dict()
+        self.remapped = dict()
+
+    def reserve(self, chains):
+        """
+        _pdbx_poly_seq_scheme에서 읽은 chain을 먼저 할당하여, 1글자 chain ID가 다른 chain에 할당되지 않도록 함
+        """
+        for chain in sorted(chains, key=len):
+            self.get(chain)
+
+    def get(self, chain):
+        """
+        :return: (PDB chain ID, 새로 바꾼 chain ID이면 True)
+        사용할 수 있는 1글자 chain ID가 없으면 ValueError를 발생시킴
+        """
+        if chain in self.pdb_ids:
+            return self.pdb_ids[chain], False
+        used = set(self.pdb_ids.values())
+        if len(chain) <= 1 and chain not in used:
+            self.pdb_ids[chain] = chain
+            return chain, False
+        for candidate in CHAIN_ID_CHARACTERS:
+            if candidate not in used:
+                self.pdb_ids[chain] = candidate
+                self.remapped[candidate] = chain
+                return candidate, True
+        raise ValueError('Structure has more than %d chains and cannot be converted to PDB format'
+                         % len(CHAIN_ID_CHARACTERS))
+
+
+def read_loops(stream, categories):
+    """
+    mmCIF 스트림에서 지정한 category의 loop_ 항목을 읽어 row (dict) 를 category별로 돌려줌
+    파일 전체를 메모리에 올리지 않고 한 줄씩 읽음
+
+    :param stream: mmCIF 파일의 텍스트 스트림
+    :param categories: 읽어들일 category 이름 (예: '_atom_site') 의 tuple
+    :return: (category, row) 의 generator
+    """
+    category, keys, values, in_header = None, [], [], False
+    for line in stream:
+        if line.startswith(';'):
+            # 여러 줄로 된 text field는 필요한 category에 없으므로 건너뜀
+            if category and not in_header:
+                values.append(line[1:].strip())
+            continue
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            if stripped.startswith('#'):
+                category, keys, values, in_header = None, [], [], False
+            continue
+
+        if stripped == 'loop_':
+            category, keys, values, in_header = None, [], [], True
+            continue
+
+        if in_header and stripped.startswith('_'):
+            name = stripped.split()[0]
+            prefix, _, key = name.partition('.')
+            if prefix in categories:
+                category = prefix
+            keys.append(key)
+            continue
+
+        in_header = False
+        if category is None or stripped.startswith('_') or stripped.startswith('data_'):
+            category, keys, values = None, [], []
+            continue
+
+        values.extend(_tokens(stripped))
+        while len(values) >= len(keys):
+            yield category, dict(zip(keys, values[:len(keys)]))
+            values = values[len(keys):]
+
+
+def cif_to_pdb_lines(stream):
+    """
+    mmCIF 스트림을 PDB 형식의 줄로 변환하는 generator
+
+    SEQRES는 _pdbx_poly_seq_scheme, 좌표는 _atom_site에서 읽으며
+    chain이 바뀌거나 polymer (ATOM) 가 끝나는 곳에 TER, model이 바뀌는 곳에 ENDMDL을 넣음
+    2글자 이상의 chain ID는 ChainIdMap으로 1글자 chain ID로 바꾸고, 처음 쓰기 전에 CHAIN_MAP_REMARK 줄을 넣음
+    1글자 chain ID가 모자라면 (62개 초과) ValueError를 발생시킴
+    atom serial 은 PDB 형식의 5자리에 맞도록 100000으로 나눈 나머지를 씀
+    """
+    seqres = dict()
+    chain_ids = ChainIdMap()
+    previous = None
+    model = None
+    for category, row in read_loops(stream, ('_pdbx_poly_seq_scheme', '_atom_site')):
+        if category == '_pdbx_poly_seq_scheme':
+            chain = _value(row, 'pdb_strand_id') or _value(row, 'asym_id')
+            seqres.setdefault(chain, []).append(row['mon_id'])
+            continue
+
+        if seqres:
+            chain_ids.reserve(seqres)
+            for chain, pdb_chain in sorted(chain_ids.remapped.items()):
+                yield '%s%s %s\n' % (CHAIN_MAP_REMARK, chain, pdb_chain)
+            for chain, residues in seqres.items():
+                for i in range(0, len(residues), 13):
+                    yield 'SEQRES %3d %s %4d  %s\n' % (
+                        i // 13 + 1, chain_ids.get(chain)[0], len(residues), ' '.join(residues[i:i + 13]))
+            seqres = dict()
+
+        chain, remapped = chain_ids.get(_value(row, 'auth_asym_id') or _value(row, 'label_asym_id'))
+        if remapped:
+            yield '%s%s %s\n' % (CHAIN_MAP_REMARK, chain, chain_ids.remapped[chain])
+
+        model_num = _value(row, 'pdbx_PDB_model_num', '1')
+        if model is not None and model_num != model:
+            if previous and previous[0] == 'ATOM':
+                yield _ter_line(previous)
+            yield 'ENDMDL\n'
+            previous = None
+        model = model_num
+
+        record = row['group_PDB']
+        resname = _value(row, 'auth_comp_id') or row['label_comp_id']
+        resnum = _value(row, 'auth_seq_id') or _value(row, 'label_seq_id')
+        icode = _value(row, 'pdbx_PDB_ins_code')
+        if previous and previous[0] == 'ATOM' and (previous[2] != chain or record != 'ATOM'):
+            yield _ter_line(previous)
+
+        element = _value(row, 'type_symbol')
+        charge = _value(row, 'pdbx_formal_charge')
+        if charge and charge not in ('0', '+0', '-0'):
+            charge = '%s%s' % (charge.lstrip('+-'), '-' if charge.startswith('-') else '+')
+        else:
+            charge = ''
+        serial = int(row['id']) % 100000
+        yield ATOM_LINE_FORMAT % (
+            record, serial, _atom_name(_value(row, 'auth_atom_id') or row['label_atom_id'], element),
+            _value(row, 'label_alt_id'), resname, chain, resnum, icode,
+            float(row['Cartn_x']), float(row['Cartn_y']), float(row['Cartn_z']),
+            float(_value(row, 'occupancy', '1.0')), float(_value(row, 'B_iso_or_equiv', '0.0')),
+            element, charge
+        ) + '\n'
+        previous = (record, serial, chain, resname, resnum, icode)
+
+    if previous and previous[0] == 'ATOM':
+        yield _ter_line(previous)
+    if model is not None:
+        yield 'ENDMDL\n'
+
+
+def _ter_line(previous):
+    _, serial, chain, resname, resnum, icode = previous
+    return 'TER   %5d      %3s %1s%4s%1s\n' % ((serial + 1) % 100000, resname, chain, resnum, icode)
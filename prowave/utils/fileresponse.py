@@ -0,0 +1,141 @@
+"""
+prowave.utils.fileresponse
+
+work directory의 파일을 다운로드하는 응답
+파일을 메모리에 모두 읽지 않고 FILE_RESPONSE_CHUNK_SIZE 단위로 스트림하거나,
+SENDFILE_HEADER가 지정되어 있으면 front proxy (nginx X-Accel-Redirect, apache X-Sendfile) 가 파일을 보내도록 함
+
+ETag / Last-Modified로 conditional GET (304) 에 응답하고, 하나의 구간을 요청하는 Range 요청에는 206으로 응답함
+"""
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$', re.IGNORECASE)
+
+
+def sendfile_path(file_path):
+    """
+    SENDFILE_HEADER에 넣을 경로
+    X-Accel-Redirect는 SENDFILE_ROOT 아래의 경로를 SENDFILE_URL_ROOT (nginx internal location) 아래의 URL로 바꾸고,
+    X-Sendfile은 절대 경로를 그대로 사용함
+
+    :return: 경로 또는 SENDFILE_ROOT 밖의 파일이면 None
+    """
+    file_path = os.path.abspath(file_path)
+    if settings.SENDFILE_HEADER.lower() != 'x-accel-redirect':
+        return file_path
+    root = os.path.abspath(settings.SENDFILE_ROOT)
+    if os.path.commonpath([root, file_path]) != root:
+        return None
+    return settings.SENDFILE_URL_ROOT.rstrip('/') + '/' + os.path.relpath(file_path, root).replace(os.sep, '/')
+
+
+def file_etag(stat):
+    """
+    파일 크기와 수정 시간으로 만든 ETag (nginx와 같은 형식)
+    """
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def parse_range(header, size):
+    """
+    Range header (bytes=start-end, bytes=start-, bytes=-suffix) 의 구간
+
+    :return: (start, end) (end 포함), 형식이 잘못되었거나 여러 구간을 요청한 경우 None (전체 파일로 응답),
+             파일 크기를 벗어난 구간이면 ValueError
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        if int(end) == 0 or size == 0:
+            raise ValueError('unsatisfiable range: %s' % header)
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise ValueError('unsatisfiable range: %s' % header)
+    return start, min(int(end), size - 1) if end else size - 1
+
+
+def if_range_passes(request, etag, last_modified):
+    """
+    If-Range header가 없거나 현재 파일과 같은 경우에만 Range를 적용함
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+def _read_range(file_path, start, length, block_size):
+    with open(file_path, 'rb') as stream:
+        stream.seek(start)
+        while length > 0:
+            chunk = stream.read(min(block_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_response(request, file_path, content_type='application/octet-stream', filename=None, etag=None):
+    """
+    파일 다운로드 응답 (Content-Disposition: attachment)
+
+    :param request: If-None-Match, If-Modified-Since, Range, If-Range header를 읽을 요청
+    :param file_path: 파일 경로
+    :param content_type: Content-Type
+    :param filename: 다운로드할 파일 이름, 기본값은 file_path의 이름
+    :param etag: 저장된 checksum 등으로 만든 ETag, 기본값은 파일 크기와 수정 시간으로 만든 ETag
+    """
+    stat = os.stat(file_path)
+    etag = etag or file_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, file_path, content_type, stat.st_size, etag, last_modified)
+        response['Content-Disposition'] = 'attachment; filename="%s"' % (filename or os.path.basename(file_path))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _file_response(request, file_path, content_type, size, etag, last_modified):
+    redirect = sendfile_path(file_path) if settings.SENDFILE_HEADER else None
+    if redirect:
+        # Range 요청은 front proxy가 처리함
+        response = HttpResponse(content_type=content_type)
+        response[settings.SENDFILE_HEADER] = redirect
+        return response
+
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size) \
+            if if_range_passes(request, etag, last_modified) else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % size
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+        response.block_size = settings.FILE_RESPONSE_CHUNK_SIZE
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(file_path, start, end - start + 1, settings.FILE_RESPONSE_CHUNK_SIZE),
+            content_type=content_type, status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+    response['Accept-Ranges'] = 'bytes'
+    return response
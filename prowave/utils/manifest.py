@@ -0,0 +1,120 @@
+"""
+prowave.utils.manifest
+
+work directory (WEBMD_DATA_DIR/<id>, PROWAVE_DATA_DIR/<id>) 의 파일 목록과 SHA-256
+SHA-256은 파일을 쓰거나 업로드를 commit할 때 (record_checksum), 또는 background에서 (update_checksums)
+prowave.models.FileChecksum에 저장하고, manifest는 저장된 값만 읽음
+client와 compute node는 manifest를 비교하여 바뀐 파일만 주고받을 수 있음
+"""
+import os
+import stat
+
+from prowave.utils.uploads import PART_SUFFIX, file_sha256
+
+
+def list_files(base_dir):
+    """
+    base_dir 아래 모든 파일의 상대 경로 (정렬됨), 받는 중인 파일 (.part) 은 제외함
+    base_dir이 없으면 빈 list
+    """
+    files = []
+    for directory, dirnames, names in os.walk(base_dir):
+        dirnames.sort()
+        for name in sorted(names):
+            if name.endswith(PART_SUFFIX):
+                continue
+            files.append(os.path.relpath(os.path.join(directory, name), base_dir))
+    return files
+
+
+def record_checksum(file_path, sha256=None):
+    """
+    file_path의 SHA-256을 FileChecksum에 저장
+    파일을 쓰거나 업로드를 commit한 곳에서 이미 계산한 sha256을 넘기면 다시 읽지 않음
+
+    :return: 저장한 sha256, 계산하는 동안 파일이 바뀌었으면 None
+    """
+    from prowave.models import FileChecksum
+    file_stat = os.stat(file_path)
+    version = (file_stat.st_size, file_stat.st_mtime_ns)
+    if sha256 is None:
+        sha256 = file_sha256(file_path)
+        # 계산하는 동안 파일이 바뀌었으면 저장하지 않고 다음 update_checksums에서 다시 계산함
+        current = os.stat(file_path)
+        if (current.st_size, current.st_mtime_ns) != version:
+            return None
+    FileChecksum.objects.update_or_create(path=os.path.abspath(file_path), defaults={
+        'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns, 'sha256': sha256.lower()})
+    return sha256.lower()
+
+
+def update_checksums(base_dir):
+    """
+    base_dir 아래 FileChecksum이 없거나 크기, 수정 시간이 바뀐 파일의 SHA-256을 계산하여 저장하고,
+    없어진 파일의 FileChecksum을 지움
+    compute node가 mount된 work directory에 직접 쓴 파일 (prowave.scripts.transfer.store_file) 은
+    update_checksums management command가 주기적으로 이 함수를 실행하여 계산함
+
+    :return: 새로 계산한 파일 경로의 list
+    """
+    from prowave.models import FileChecksum
+    root = os.path.join(os.path.abspath(base_dir), '')
+    stored = {checksum.path: (checksum.size, checksum.mtime_ns)
+              for checksum in FileChecksum.objects.filter(path__startswith=root)}
+
+    updated = []
+    for path in list_files(root):
+        file_path = os.path.join(root, path)
+        try:
+            file_stat = os.stat(file_path)
+        except FileNotFoundError:
+            continue
+        if not stat.S_ISREG(file_stat.st_mode):
+            continue
+        if stored.pop(file_path, None) == (file_stat.st_size, file_stat.st_mtime_ns):
+            continue
+        try:
+            if record_checksum(file_path) is not None:
+                updated.append(file_path)
+        except FileNotFoundError:
+            pass
+
+    if stored:
+        FileChecksum.objects.filter(path__in=list(stored)).delete()
+    return updated
+
+
+def work_manifest(base_dir, paths=None):
+    """
+    base_dir의 파일별 path (상대 경로), size, mtime, sha256
+    저장된 FileChecksum만 읽고 요청 중에는 SHA-256을 계산하지 않으므로,
+    FileChecksum이 없거나 크기, 수정 시간이 바뀐 파일은 update_checksums로 다시 계산할 때까지 제외함
+
+    :param paths: manifest에 포함할 상대 경로의 list, 기본값은 모든 파일
+    :return: dict의 list, 없는 파일이나 base_dir 밖을 가리키는 경로는 제외함
+    """
+    from prowave.models import FileChecksum
+    root = os.path.join(os.path.abspath(base_dir), '')
+    if paths is None:
+        stored = FileChecksum.objects.filter(path__startswith=root).order_by('path')
+    else:
+        file_paths = [os.path.normpath(os.path.join(root, path)) for path in paths]
+        stored = FileChecksum.objects.filter(path__in=[path for path in file_paths if path.startswith(root)])
+        stored = {checksum.path: checksum for checksum in stored}
+        stored = [stored[path] for path in file_paths if path in stored]
+
+    manifest = []
+    for checksum in stored:
+        try:
+            file_stat = os.stat(checksum.path)
+        except FileNotFoundError:
+            continue
+        if (file_stat.st_size, file_stat.st_mtime_ns) != (checksum.size, checksum.mtime_ns):
+            continue
+        manifest.append({
+            'path': os.path.relpath(checksum.path, root),
+            'size': file_stat.st_size,
+            'mtime': file_stat.st_mtime,
+            'sha256': checksum.sha256,
+        })
+    return manifest
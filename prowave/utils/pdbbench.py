@@ -0,0 +1,96 @@
+"""
+pdbbench.py
+
+pdbutil의 PDB 읽기 방식별 소요 시간 및 model 클래스별 atom 당 메모리 비교
+
+    python -m prowave.utils.pdbbench _artifacts_/sample_trajectory/model_solv.pdb _artifacts_/sample_trajectory/md/md1.pdb
+"""
+import argparse
+import gc
+import timeit
+import tracemalloc
+
+from prowave.utils.pdbcolumnar import ColumnarModel, CompactModel
+from prowave.utils.pdbutil import Model, Topology
+
+
+def parse_modes(pdb_file):
+    """
+    비교할 읽기 방식 (이름, 함수) 의 list
+    """
+    def constructor():
+        with open(pdb_file, 'r') as stream:
+            return Topology(stream)
+
+    def compact():
+        with open(pdb_file, 'r') as stream:
+            return Topology(stream, model_class=CompactModel)
+
+    def load():
+        with open(pdb_file, 'r') as stream:
+            return Topology.load(stream, model_class=ColumnarModel)
+
+    def from_mmap():
+        return Topology.from_mmap(pdb_file)
+
+    return [
+        ('Topology(stream)', constructor),
+        ('Topology(stream, CompactModel)', compact),
+        ('Topology.load(ColumnarModel)', load),
+        ('Topology.from_mmap', from_mmap),
+    ]
+
+
+def benchmark_parse(pdb_file, repeat=5):
+    """
+    각 읽기 방식으로 pdb_file을 repeat 번 읽었을 때의 최소 소요 시간 (초)
+
+    :return: (이름, 소요 시간) 의 list
+    """
+    return [(name, min(timeit.repeat(func, number=1, repeat=repeat))) for name, func in parse_modes(pdb_file)]
+
+
+def benchmark_memory(pdb_file, model_classes=(Model, CompactModel, ColumnarModel)):
+    """
+    pdb_file의 첫 번째 model을 각 model 클래스로 만들 때 할당되어 남아있는 메모리를 atom 수로 나눈 값 (bytes)
+    PDB 파일의 줄 (lines) 은 측정 전에 읽어두므로 포함되지 않음
+
+    :return: (model 클래스 이름, atom 당 bytes) 의 list
+    """
+    lines = []
+    with open(pdb_file, 'r') as stream:
+        for line in stream:
+            if line.startswith('ENDMDL'):
+                break
+            if line[0:6] in ('ATOM  ', 'HETATM', 'TER   '):
+                lines.append(line)
+
+    results = []
+    for model_class in model_classes:
+        gc.collect()
+        tracemalloc.start()
+        model = model_class(lines)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results.append((model_class.__name__, size / len(model)))
+        del model
+    return results
+
+
+def run(pdb_files, repeat=5):
+    for pdb_file in pdb_files:
+        print(pdb_file)
+        results = benchmark_parse(pdb_file, repeat)
+        baseline = results[0][1]
+        for name, elapsed in results:
+            print('  %-32s %8.1f ms  x%.1f' % (name, elapsed * 1000, baseline / elapsed))
+        for name, size in benchmark_memory(pdb_file):
+            print('  %-32s %8.1f bytes/atom' % (name, size))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pdb_files', nargs='+')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.pdb_files, args.repeat)
@@ -0,0 +1,132 @@
+"""
+prowave.utils.pdbcache
+
+PDB 파일 내용의 SHA-256 해시를 key로 Topology.load 결과를 .npz 파일로 보관하는 캐시
+캐시 디렉토리 전체 크기가 PDB_CACHE_MAX_SIZE를 넘으면 가장 오래 사용하지 않은 항목부터 삭제함
+"""
+import glob
+import os
+import tempfile
+import zipfile
+
+from django.conf import settings
+
+from prowave.utils.pdbutil import Topology
+from prowave.utils.uploads import file_sha256
+
+
+class TopologyCache:
+    """
+    Topology.load 결과를 파일 내용의 해시별로 보관하는 LRU 캐시
+    """
+    def __init__(self, cache_dir, max_size):
+        """
+        :param cache_dir: .npz 파일을 보관할 디렉토리
+        :param max_size: 캐시 디렉토리의 최대 크기 (bytes)
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def entry_path(self, digest, model_index=0, chain_ids=None):
+        """
+        파일 해시, model_index, chain_ids에 해당하는 캐시 파일 경로
+        """
+        name = '%s-m%d' % (digest, model_index)
+        if chain_ids:
+            name += '-c%s' % ''.join(sorted(chain_ids))
+        return os.path.join(self.cache_dir, '%s.npz' % name)
+
+    def load(self, file_path, model_index=0, chain_ids=None):
+        """
+        file_path의 PDB를 Topology.from_mmap으로 읽어들임
+        같은 내용의 파일을 읽은 적이 있으면 캐시된 .npz 파일을 읽음
+
+        :param file_path: PDB 또는 mmCIF 파일 경로 (gzip, bzip2 압축 포함)
+        :param model_index: 읽어들일 model의 index
+        :param chain_ids: 선택된 Chain ID (string) 를 담고있는 list
+        """
+        entry_path = self.entry_path(file_sha256(file_path), model_index, chain_ids)
+        try:
+            topo = Topology.from_npz(entry_path)
+            os.utime(entry_path)
+            return topo
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            pass
+
+        topo = Topology.from_mmap(file_path, model_index, chain_ids)
+        self.store(entry_path, topo)
+        return topo
+
+    def store(self, entry_path, topo):
+        """
+        topo를 entry_path에 저장한 뒤 캐시 크기를 max_size 이하로 줄임
+        다른 프로세스가 쓰는 중인 파일을 읽지 않도록 임시 파일에 쓴 뒤 rename 함
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                topo.save(stream)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self.evict()
+
+    def invalidate(self, file_path):
+        """
+        file_path의 현재 내용에 해당하는 캐시 항목을 모두 삭제함
+        cleanup, create_model 등에서 PDB 파일을 다시 쓰기 전에 호출함
+        """
+        if not os.path.exists(file_path):
+            return
+        digest = file_sha256(file_path)
+        for entry_path in glob.glob(os.path.join(self.cache_dir, '%s-*.npz' % digest)):
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """
+        마지막 사용 시각 (mtime) 이 오래된 항목부터 삭제하여 캐시 크기를 max_size 이하로 맞춤
+        """
+        entries = []
+        for entry_path in glob.glob(os.path.join(self.cache_dir, '*.npz')):
+            try:
+                stat = os.stat(entry_path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+
+def default_cache():
+    """
+    settings.PDB_CACHE_DIR, settings.PDB_CACHE_MAX_SIZE를 사용하는 TopologyCache
+    """
+    return TopologyCache(settings.PDB_CACHE_DIR, settings.PDB_CACHE_MAX_SIZE)
+
+
+def load_topology(file_path, model_index=0, chain_ids=None):
+    """
+    TopologyCache.load (기본 캐시 사용)
+    """
+    return default_cache().load(file_path, model_index, chain_ids)
+
+
+def invalidate_topology(file_path):
+    """
+    TopologyCache.invalidate (기본 캐시 사용)
+    """
+    default_cache().invalidate(file_path)
@@ -0,0 +1,531 @@
+"""
+prowave.utils.pdbcolumnar
+
+pdbutil.Model 대신 사용할 수 있는 메모리를 적게 쓰는 model 클래스
+- CompactModel: atom을 __slots__ 기반의 CompactAtom으로 보관함
+- ColumnarModel: atom 정보를 NumPy 배열 (column) 에 보관하고 고정폭 열을 배열 연산으로 읽고 씀
+"""
+from sys import intern
+
+import numpy as np
+
+from prowave.utils.pdbutil import (
+    AA_ATOMS, ATOM_FORMAT, NON_STANDARD, PROTONATION_STATES, RESNA, RESSOLV, Model,
+    find_disulfid_bond_candidate
+)
+
+
+# 비어있는 정수 필드 (TER 레코드의 residue 번호 등)를 나타내는 값
+BLANK_INT = np.iinfo(np.int32).min
+# 자릿수를 넘어 '*****' 처럼 별표로 채워진 정수 필드를 나타내는 값
+OVERFLOW_INT = BLANK_INT + 1
+# hybrid-36 형식 (큰 PDB 파일의 99999를 넘는 atom serial, 9999를 넘는 residue 번호) 의 자릿수
+HY36_DIGITS_UPPER = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+HY36_DIGITS_LOWER = HY36_DIGITS_UPPER.lower()
+# ATOM_FORMAT 한 줄의 길이
+ATOM_LINE_WIDTH = 81
+
+
+def _encode(values):
+    return [value.encode('latin-1') for value in values]
+
+
+def _hy36_decode(text, width):
+    """
+    hybrid-36 형식의 width 자리 정수 문자열을 정수로 변환
+    첫 글자가 대문자이면 10 ** width 부터, 소문자이면 대문자 범위 다음부터 36진법으로 셈
+    """
+    if len(text) == width and text[0] in HY36_DIGITS_UPPER[10:]:
+        return int(text, 36) - 10 * 36 ** (width - 1) + 10 ** width
+    if len(text) == width and text[0] in HY36_DIGITS_LOWER[10:]:
+        return int(text, 36) + 16 * 36 ** (width - 1) + 10 ** width
+    return int(text)
+
+
+def _hy36_encode(value, width):
+    """
+    _hy36_decode의 역변환, 10 ** width 보다 작은 값은 10진수 그대로 씀
+    """
+    if value < 10 ** width:
+        return '%d' % value
+    value -= 10 ** width
+    digits = HY36_DIGITS_UPPER
+    if value >= 26 * 36 ** (width - 1):
+        value -= 26 * 36 ** (width - 1)
+        digits = HY36_DIGITS_LOWER
+    value += 10 * 36 ** (width - 1)
+    text = ''
+    while value:
+        value, digit = divmod(value, 36)
+        text = digits[digit] + text
+    return text
+
+
+def _int_str(value, width):
+    """
+    _int_column으로 읽은 값을 Atom과 같은 (앞뒤 공백을 제거한) 문자열로 변환
+    """
+    if value == BLANK_INT:
+        return ''
+    if value == OVERFLOW_INT:
+        return '*' * width
+    return _hy36_encode(int(value), width)
+
+
+def _int_value(text, width):
+    if not text:
+        return BLANK_INT
+    if text == '*' * len(text):
+        return OVERFLOW_INT
+    return _hy36_decode(text, width)
+
+
+def _column(buf, start, end, strip=True):
+    """
+    (atom 수, 80) 크기의 byte 배열에서 start:end 열을 고정폭 byte 배열로 잘라냄
+    """
+    column = np.ascontiguousarray(buf[:, start:end]).view('S%d' % (end - start)).ravel()
+    return np.char.strip(column) if strip else column.copy()
+
+
+def _parse_fixed(buf, start, end):
+    """
+    start:end 열의 고정폭 숫자를 문자열로 바꾸지 않고 자릿수별로 계산함
+    공백, '-', 숫자, 같은 위치의 소수점으로만 이루어진 경우에만
+    (소수점을 뺀 절대값, 소수점 아래 자릿수, 음수 행 mask, blank 행 mask) 를 반환하고 그 외에는 None을 반환함
+    '-0.000' 과 같은 음의 0을 보존할 수 있도록 부호는 따로 반환함
+    """
+    # 행 방향의 reduce가 빠르도록 (열 폭, atom 수) 로 전치하여 계산함
+    raw = np.ascontiguousarray(buf[:, start:end].view(np.uint8).T)
+    digits = raw - np.uint8(ord('0'))
+    is_digit = digits <= 9
+    is_point = raw == ord('.')
+    is_minus = raw == ord('-')
+    if not (is_digit | is_point | is_minus | (raw == ord(' '))).all():
+        return None
+    blank = ~np.logical_or.reduce(is_digit)
+    points = np.flatnonzero(is_point.any(axis=1))
+    if len(points) > 1 or (len(points) and not (is_point[points[0]] | blank).all()):
+        return None
+
+    width = end - start
+    powers = width - 1 - np.arange(width)
+    decimals = 0
+    if len(points):
+        decimals = int(powers[points[0]])
+        powers[:points[0]] -= 1
+        powers[points[0]] = 0
+    values = (10 ** powers.astype(np.int64)).dot(np.where(is_digit, digits, 0).astype(np.int64))
+    return values, decimals, np.logical_or.reduce(is_minus), blank
+
+
+def _int_column(buf, start, end):
+    """
+    start:end 열의 정수를 int32 배열로 읽음
+    10진수가 아닌 값 (hybrid-36, '*****') 이 있으면 고유값마다 한 번씩 _int_value로 변환함
+    """
+    parsed = _parse_fixed(buf, start, end)
+    if parsed is not None and parsed[1] == 0:
+        values, _, negative, blank = parsed
+        values = np.where(negative, -values, values).astype(np.int32)
+        values[blank] = BLANK_INT
+        return values
+    uniques, inverse = np.unique(_column(buf, start, end), return_inverse=True)
+    decoded = [_int_value(value.decode('latin-1'), end - start) for value in uniques]
+    return np.array(decoded, dtype=np.int32)[inverse.ravel()]
+
+
+def _float_column(buf, start, end):
+    parsed = _parse_fixed(buf, start, end)
+    if parsed is not None:
+        values, decimals, negative, _ = parsed
+        values = values / 10 ** decimals
+        return np.where(negative, -values, values).astype(np.float32)
+    column = _column(buf, start, end)
+    return np.where(column == b'', b'0', column).astype(np.float32)
+
+
+def _justify(column, width, left=False):
+    """
+    byte 배열을 '%-{width}s' (left) 또는 '%{width}s' 와 같이 정렬한 (atom 수, width) 크기의 uint8 배열로 변환
+    width보다 긴 값이 있으면 None을 반환함
+    """
+    lengths = np.char.str_len(column)
+    if len(column) and lengths.max() > width:
+        return None
+    if not left and not ((lengths == 0) | (lengths == width)).all():
+        column = np.char.rjust(column, width)
+    # 고정폭 byte 배열의 남는 자리는 NUL로 채워지므로 공백으로 바꾸면 왼쪽 정렬이 됨
+    padded = column.astype('S%d' % width).view(np.uint8).reshape(len(column), width)
+    return np.where(padded == 0, ord(' '), padded).astype(np.uint8)
+
+
+def _format_number(values, width, decimals=0, blank=None):
+    """
+    정수 배열은 '%{width}d', 실수 배열은 '%{width}.{decimals}f' 와 같이 오른쪽 정렬한
+    (atom 수, width) 크기의 uint8 배열로 변환함. blank에 해당하는 행은 공백으로 채움
+    width보다 긴 값이 있으면 None을 반환함
+    """
+    # width 자리를 넘는 값은 10 ** width로 잘라 int32 범위 안에서 계산함 (이 경우 None을 반환하게 됨)
+    if decimals:
+        values = values.astype(np.float64)
+        negative = np.signbit(values)
+        scaled = np.minimum(np.abs(values) * 10 ** decimals, 10 ** width)
+        remaining = np.rint(scaled).astype(np.int32)
+    else:
+        values = values.astype(np.int64)
+        negative = values < 0
+        remaining = np.minimum(np.abs(values), 10 ** width).astype(np.int32)
+    if blank is not None:
+        negative &= ~blank
+        remaining[blank] = 0
+
+    # 자릿수 단위로 연속된 메모리에 채운 뒤 마지막에 전치함
+    out = np.full((width, len(values)), ord(' '), dtype=np.uint8)
+    column = width - 1
+    for _ in range(decimals):
+        out[column] = ord('0') + remaining % 10
+        remaining //= 10
+        column -= 1
+    if decimals:
+        out[column] = ord('.')
+        column -= 1
+
+    # 정수부는 최소 1자리를 쓰고, 남은 자릿수가 있는 행에만 다음 자리를 씀
+    sign_column = np.full(len(values), column - 1, dtype=np.int32)
+    out[column] = ord('0') + remaining % 10
+    remaining //= 10
+    for i in range(column - 1, -1, -1):
+        present = remaining > 0
+        out[i] = np.where(present, ord('0') + remaining % 10, ord(' '))
+        sign_column -= present
+        remaining //= 10
+
+    if remaining.any() or (sign_column[negative] < 0).any():
+        return None
+    out[sign_column[negative], np.flatnonzero(negative)] = ord('-')
+    if blank is not None:
+        out[:, blank] = ord(' ')
+    return out.T
+
+
+def _coord_str(value):
+    return '' if value is None else '%.3f' % value
+
+
+class CompactAtom:
+    """
+    __slots__ 를 사용하여 __dict__ 없이 Atom과 같은 속성을 제공하는 Atom
+    serial과 좌표는 읽을 때 한 번만 숫자로 변환하고, 반복되는 문자열 (record, atom name, resname,
+    chain, resnum, element 등) 은 intern 하여 같은 값의 atom들이 하나의 문자열을 공유함
+    좌표는 Atom.deserialize와 달리 '%8.3f' 형식으로 씀
+    """
+    __slots__ = ('record', 'serial', 'name', 'altloc', 'resname', 'chain', 'resnum', 'icode',
+                 'x', 'y', 'z', 'occ', 'temp', 'segid', 'elem', 'charge')
+
+    def __init__(self, line):
+        self.record = intern(line[0:6])
+        serial = line[6:11].strip()
+        try:
+            self.serial = int(serial) if serial else None
+        except ValueError:
+            self.serial = serial
+        self.name = intern(line[12:16].strip())
+        self.altloc = intern(line[16].strip())
+        self.resname = intern(line[17:20])
+        self.chain = intern(line[21].strip())
+        self.resnum = intern(line[22:26].strip())
+        self.icode = intern(line[26].strip())
+        x, y, z = line[30:38].strip(), line[38:46].strip(), line[46:54].strip()
+        self.x = float(x) if x else None
+        self.y = float(y) if y else None
+        self.z = float(z) if z else None
+        self.occ = intern(line[54:60].strip())
+        self.temp = intern(line[60:66].strip())
+        self.segid = intern(line[72:76].strip())
+        self.elem = intern(line[76:78].strip())
+        self.charge = intern(line[78:80].strip())
+
+    @property
+    def id(self):
+        return '' if self.serial is None else str(self.serial)
+
+    def serialize(self):
+        return {
+            "record": self.record,
+            "id": self.id,
+            "name": self.name,
+            "altloc": self.altloc,
+            "resname": self.resname,
+            "chain": self.chain,
+            "resnum": self.resnum,
+            "icode": self.icode,
+            "x": _coord_str(self.x),
+            "y": _coord_str(self.y),
+            "z": _coord_str(self.z),
+            "occ": self.occ,
+            "temp": self.temp,
+            "elem": self.elem,
+            "charge": self.charge
+        }
+
+    def deserialize(self):
+        return ATOM_FORMAT % (
+            self.record, self.id, self.name, self.altloc, self.resname, self.chain,
+            self.resnum, self.icode, _coord_str(self.x), _coord_str(self.y), _coord_str(self.z),
+            self.occ, self.temp, self.segid, self.elem, self.charge
+        )
+
+
+class CompactModel(Model):
+    """
+    atom을 CompactAtom으로 보관하는 Model
+    """
+    atom_class = CompactAtom
+
+
+class ColumnarModel:
+    """
+    Atom 객체 대신 NumPy 배열(column)에 atom 정보를 보관하는 Model
+
+    좌표는 float32, serial/residue 번호는 int32, 나머지 필드는 고정폭 byte 배열로 저장하며
+    Model과 동일한 property와 process_* 함수를 mask 연산으로 제공함
+    좌표는 거리 계산용 float32 배열 (xyz) 과 함께 읽은 그대로의 문자열 (coord_text) 도 보관하여,
+    소수점 아래 자릿수나 float32 정밀도와 관계없이 Model과 같은 좌표 문자열을 씀
+    """
+    COLUMNS = ('record', 'serial', 'name', 'altloc', 'resname', 'chain', 'resnum', 'icode',
+               'xyz', 'coord_text', 'occ', 'temp', 'segid', 'elem', 'charge')
+
+    def __init__(self, lines):
+        lines = [line.rstrip('\r\n').ljust(80)[:80] for line in lines]
+        buf = np.frombuffer(''.join(lines).encode('latin-1'), dtype='S1').reshape(len(lines), 80)
+        self._parse(buf)
+
+    @classmethod
+    def from_buffer(cls, buf):
+        """
+        (atom 수, 80) 크기의 byte 배열 (dtype S1) 로부터 ColumnarModel을 만듦
+        Topology.from_mmap에서 줄 단위의 문자열을 만들지 않고 사용함
+        """
+        instance = cls.__new__(cls)
+        instance._parse(buf)
+        return instance
+
+    def _parse(self, buf):
+        self.record = _column(buf, 0, 6, strip=False)
+        assert np.isin(self.record, (b'ATOM  ', b'HETATM', b'TER   ')).all()
+        self.serial = _int_column(buf, 6, 11)
+        self.name = _column(buf, 12, 16)
+        self.altloc = _column(buf, 16, 17)
+        self.resname = _column(buf, 17, 20, strip=False)
+        self.chain = _column(buf, 21, 22)
+        self.resnum = _int_column(buf, 22, 26)
+        self.icode = _column(buf, 26, 27)
+        self.xyz = np.stack([_float_column(buf, 30, 38),
+                             _float_column(buf, 38, 46),
+                             _float_column(buf, 46, 54)], axis=1)
+        self.coord_text = np.stack([_column(buf, 30, 38),
+                                    _column(buf, 38, 46),
+                                    _column(buf, 46, 54)], axis=1)
+        self.occ = _column(buf, 54, 60)
+        self.temp = _column(buf, 60, 66)
+        self.segid = _column(buf, 72, 76)
+        self.elem = _column(buf, 76, 78)
+        self.charge = _column(buf, 78, 80)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        to_arrays()로 꺼낸 column 배열들로부터 ColumnarModel을 만듦
+        """
+        instance = cls.__new__(cls)
+        for column in cls.COLUMNS:
+            setattr(instance, column, np.array(arrays[column]))
+        return instance
+
+    def to_arrays(self):
+        return {column: getattr(self, column) for column in self.COLUMNS}
+
+    def __len__(self):
+        return len(self.record)
+
+    def _take(self, mask):
+        for column in self.COLUMNS:
+            setattr(self, column, getattr(self, column)[mask])
+
+    def _residue_keys(self, mask=None):
+        keys = np.empty(len(self), dtype=[('chain', 'S1'), ('resnum', 'i4'), ('resname', 'S3')])
+        keys['chain'] = self.chain
+        keys['resnum'] = self.resnum
+        keys['resname'] = self.resname
+        return keys if mask is None else keys[mask]
+
+    @staticmethod
+    def _decode_residue(key):
+        return (key['chain'].decode('latin-1'), _int_str(key['resnum'], 4),
+                key['resname'].decode('latin-1'))
+
+    def _residues_in(self, resnames):
+        keys = np.unique(self._residue_keys(np.isin(self.resname, _encode(resnames))))
+        return {self._decode_residue(key) for key in keys}
+
+    def _apply(self, keys, predicate):
+        """
+        keys의 고유값마다 predicate를 한 번씩만 평가하여 atom 단위의 bool 배열로 펼침
+        """
+        uniques, inverse = np.unique(keys, return_inverse=True)
+        return np.array([bool(predicate(key)) for key in uniques], dtype=bool)[inverse.ravel()]
+
+    @property
+    def chains(self):
+        return [chain.decode('latin-1') for chain in np.unique(self.chain)]
+
+    @property
+    def residues(self):
+        return [self._decode_residue(key) for key in np.unique(self._residue_keys())]
+
+    @property
+    def non_standards(self):
+        return self._residues_in(NON_STANDARD)
+
+    @property
+    def disulfide_bond_candidates(self):
+        cysteines = np.isin(self.resname, (b'CYS', b'CYX', b'CYM'))
+        index = np.flatnonzero((self.name == b'SG') & cysteines)
+        records = [
+            (_int_str(self.serial[i], 5), self.chain[i].decode('latin-1'),
+             _int_str(self.resnum[i], 4), self.resname[i].decode('latin-1'))
+            for i in index
+        ]
+        return find_disulfid_bond_candidate(records, self.xyz[index])
+
+    @property
+    def protonation_states(self):
+        return self._residues_in(PROTONATION_STATES)
+
+    @property
+    def solvent_ions(self):
+        return {(_residue[0], _residue[2]) for _residue in self._residues_in(RESSOLV)}
+
+    @property
+    def nucleotides(self):
+        return self._residues_in(RESNA)
+
+    def select_chains(self, chain_ids):
+        self._take(np.isin(self.chain, _encode(chain_ids)))
+
+    def delete_hydrogen_atoms(self, protonation_states_only=False):
+        # protonation_states_only 인 경우도 아직 Model과 같이 수소원자를 모두 삭제함 (TODO)
+        self._take(~np.isin(self.elem, (b'H', b'D')))
+
+    def process_altloc(self):
+        self._take((self.altloc == b'') | (self.altloc == b'A'))
+
+    def process_icode(self):
+        _, first, inverse = np.unique(self.resnum, return_index=True, return_inverse=True)
+        self._take(self.icode == self.icode[first][inverse.ravel()])
+
+    def process_solvent_ions(self, solvent_ions):
+        solvent = np.isin(self.resname, _encode(RESSOLV))
+        keys = np.empty(len(self), dtype=[('chain', 'S1'), ('resname', 'S3')])
+        keys['chain'] = self.chain
+        keys['resname'] = self.resname
+        selected = self._apply(keys, lambda key: [key['chain'].decode('latin-1'),
+                                                  key['resname'].decode('latin-1')] in solvent_ions)
+        self._take(~solvent | selected)
+
+    def process_hetero(self, ligand_name=None):
+        keep = np.isin(self.resname, _encode(RESSOLV + tuple(NON_STANDARD)))
+        if ligand_name:
+            keep |= self.resname == ligand_name.encode('latin-1')
+        keep |= self.record != b'HETATM'
+        keep &= ~np.isin(self.resname, _encode(RESNA))
+        self._take(keep)
+
+    def process_non_standards(self):
+        keep = np.ones(len(self), dtype=bool)
+        for resname, standard in NON_STANDARD.items():
+            mask = self.resname == resname.encode('latin-1')
+            if not mask.any():
+                continue
+            self.resname[mask] = standard.encode('latin-1')
+            keep &= ~mask | np.isin(self.name, _encode(AA_ATOMS[standard]))
+        self._take(keep)
+
+    def process_disulfide_bonds(self, cyx_residues=None):
+        _cyx_residues = set()
+        for iatm, jatm, *_ in self.disulfide_bond_candidates:
+            _cyx_residues.add((iatm[1], iatm[2]))
+            _cyx_residues.add((jatm[1], jatm[2]))
+
+        _cyx_residues = cyx_residues if cyx_residues else [list(res) for res in _cyx_residues]
+        keys = np.empty(len(self), dtype=[('chain', 'S1'), ('resnum', 'i4')])
+        keys['chain'] = self.chain
+        keys['resnum'] = self.resnum
+        mask = self._apply(keys, lambda key: [key['chain'].decode('latin-1'),
+                                              _int_str(key['resnum'], 4)] in _cyx_residues)
+        self.resname[mask] = b'CYX'
+
+    def process_protonation_states(self, protonation_states=None):
+        if not protonation_states:
+            return
+        keys = np.empty(len(self), dtype=[('chain', 'S1'), ('resnum', 'i4')])
+        keys['chain'] = self.chain
+        keys['resnum'] = self.resnum
+        uniques, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        for i, key in enumerate(uniques):
+            key = '%s-%s' % (key['chain'].decode('latin-1'), _int_str(key['resnum'], 4))
+            if key in protonation_states:
+                self.resname[inverse == i] = protonation_states[key].encode('latin-1')
+
+    def _format_rows(self, start, stop):
+        lines = []
+        for i in range(start, min(stop, len(self))):
+            x, y, z = (v.decode('latin-1') for v in self.coord_text[i])
+            lines.append(ATOM_FORMAT % (
+                self.record[i].decode('latin-1'), _int_str(self.serial[i], 5),
+                self.name[i].decode('latin-1'), self.altloc[i].decode('latin-1'),
+                self.resname[i].decode('latin-1'), self.chain[i].decode('latin-1'),
+                _int_str(self.resnum[i], 4), self.icode[i].decode('latin-1'),
+                x, y, z, self.occ[i].decode('latin-1'), self.temp[i].decode('latin-1'),
+                self.segid[i].decode('latin-1'), self.elem[i].decode('latin-1'),
+                self.charge[i].decode('latin-1')
+            ))
+        return '\n'.join(lines)
+
+    def format_atoms(self, start=0, stop=None):
+        """
+        start:stop 범위의 atom을 미리 할당한 (atom 수, 82) 크기의 byte 버퍼에 열 단위로 채워
+        Model.format_atoms와 같은 문자열을 반환함
+        폭을 넘는 필드가 있으면 행 단위 포맷으로 대신함
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = min(start, stop)
+        rows = slice(start, stop)
+        fields = (
+            (0, _justify(self.record[rows], 6, left=True)),
+            (6, _format_number(self.serial[rows], 5, blank=self.serial[rows] == BLANK_INT)),
+            (12, _justify(self.name[rows], 4, left=True)),
+            (16, _justify(self.altloc[rows], 1)),
+            (17, _justify(self.resname[rows], 3)),
+            (21, _justify(self.chain[rows], 1)),
+            (22, _format_number(self.resnum[rows], 4, blank=self.resnum[rows] == BLANK_INT)),
+            (26, _justify(self.icode[rows], 1)),
+            (30, _justify(self.coord_text[rows, 0], 8)),
+            (38, _justify(self.coord_text[rows, 1], 8)),
+            (46, _justify(self.coord_text[rows, 2], 8)),
+            (54, _justify(self.occ[rows], 6)),
+            (60, _justify(self.temp[rows], 6)),
+            (72, _justify(self.segid[rows], 4, left=True)),
+            (76, _justify(self.elem[rows], 2)),
+            (78, _justify(self.charge[rows], 3)),
+        )
+        if any(field is None for _, field in fields):
+            return self._format_rows(start, stop)
+
+        buf = np.full((stop - start, ATOM_LINE_WIDTH + 1), ord(' '), dtype=np.uint8)
+        for offset, field in fields:
+            buf[:, offset:offset + field.shape[1]] = field
+        buf[:, -1] = ord('\n')
+        return buf.tobytes()[:-1].decode('latin-1')
@@ -1,7 +1,20 @@
 """
 pdbutil.py
+
+NumPy 배열 기반의 ColumnarModel, CompactModel은 prowave.utils.pdbcolumnar에 있음
 """
 import argparse
+import bz2
+import gzip
+import io
+import json
+import mmap
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+from prowave.utils.cifutil import CHAIN_MAP_REMARK, cif_to_pdb_lines
 
 
 RESSOLV = (
@@ -92,9 +105,99 @@ AA_ATOMS = {
 }
 
 
-def find_disulfid_bond_candidate(atoms):
-    from scipy.spatial import distance
-    pass
+DISULFIDE_CUTOFF = 3.0
+ATOM_FORMAT = "%-6s%5s %-4s%1s%3s %1s%4s%1s   %8s%8s%8s%6s%6s      %-4s%2s%3s"
+# Topology.write가 한 번에 포맷하여 stream에 쓰는 atom 수
+WRITE_CHUNK_SIZE = 10000
+
+
+class NeighborSearch:
+    """
+    cKDTree를 이용한 atom 간 근접 탐색
+    disulfide bond 후보 외에 ion, ligand 주변 atom 탐색 등에도 사용함
+    """
+    def __init__(self, coords):
+        """
+        :param coords: (atom 수, 3) 크기의 좌표 배열
+        """
+        from scipy.spatial import cKDTree
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+        self.tree = cKDTree(self.coords)
+
+    def pairs(self, cutoff):
+        """
+        coords 안에서 거리가 cutoff 미만인 atom 쌍을 찾음
+
+        :param cutoff: 거리 기준 (Å)
+        :return: i < j 인 (i, j, distance) 의 list, (i, j) 순으로 정렬됨
+        """
+        if len(self.coords) < 2:
+            return []
+        pairs = self.tree.query_pairs(cutoff, output_type='ndarray')
+        return self._within(pairs[:, 0], pairs[:, 1], self.coords, cutoff)
+
+    def query(self, coords, cutoff):
+        """
+        coords (예: ion 또는 ligand atom의 좌표) 의 각 atom으로부터 거리가 cutoff 미만인 atom을 찾음
+
+        :param coords: (atom 수, 3) 크기의 좌표 배열
+        :param cutoff: 거리 기준 (Å)
+        :return: (self.coords의 index, coords의 index, distance) 의 list, index 순으로 정렬됨
+        """
+        from scipy.spatial import cKDTree
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+        if not len(self.coords) or not len(coords):
+            return []
+        matrix = self.tree.sparse_distance_matrix(cKDTree(coords), cutoff, output_type='ndarray')
+        return self._within(matrix['i'], matrix['j'], coords, cutoff)
+
+    def _within(self, index_i, index_j, coords, cutoff):
+        order = np.lexsort((index_j, index_i))
+        index_i, index_j = index_i[order], index_j[order]
+        distances = np.linalg.norm(self.coords[index_i] - coords[index_j], axis=1)
+        mask = distances < cutoff
+        return list(zip(index_i[mask].tolist(), index_j[mask].tolist(), distances[mask].tolist()))
+
+
+def find_disulfid_bond_candidate(records, coords, cutoff=DISULFIDE_CUTOFF):
+    """
+    SG atom들 중 거리가 cutoff 미만인 쌍을 chain 구분 없이 모델 전체에서 한 번에 찾음
+
+    :param records: SG atom의 (id, chain, resnum, resname) 의 list
+    :param coords: records와 같은 순서의 SG atom 좌표
+    :param cutoff: 거리 기준 (Å)
+    :return: (record_i, record_j, distance, (chain_i, chain_j)) 의 list
+    """
+    if not records:
+        return []
+    return [
+        (records[i], records[j], d, (records[i][1], records[j][1]))
+        for i, j, d in NeighborSearch(coords).pairs(cutoff)
+    ]
+
+
+def _gather(data, starts, lengths, start, end, fill):
+    """
+    줄의 시작 위치 (starts) 와 길이 (lengths) 로부터 start:end 열을 (줄 수, end - start) 크기의 uint8 배열로 모음
+    줄 길이를 넘는 열은 fill로 채움
+    """
+    width = end - start
+    offsets = starts + start
+    columns = np.arange(start, end)
+    if len(data) >= width:
+        # data의 모든 위치에서 시작하는 width 폭의 byte 문자열 배열을 복사 없이 만든 뒤 필요한 것만 복사함
+        items = np.ndarray((len(data) - width + 1,), dtype='S%d' % width, buffer=data, strides=(1,))
+        values = items[np.minimum(offsets, len(data) - width)].view(np.uint8).reshape(len(starts), width)
+        short = np.flatnonzero(lengths < end)
+        values[short] = np.where(columns < lengths[short, None], values[short], fill)
+    else:
+        values = np.full((len(starts), width), fill, dtype=np.uint8)
+    # 파일 끝에 걸리는 줄은 한 byte씩 모음
+    tail = np.flatnonzero(offsets > len(data) - width)
+    if len(tail):
+        index = np.minimum(starts[tail, None] + columns, max(len(data) - 1, 0))
+        values[tail] = np.where(columns < lengths[tail, None], data[index], fill)
+    return values
 
 
 class Atom:
@@ -136,34 +239,152 @@ class Atom:
         }
 
     def deserialize(self):
-        return "%-6s%5s %-4s%1s%3s %1s%4s%1s   %8s%8s%8s%6s%6s      %-4s%2s%3s" % (
+        return ATOM_FORMAT % (
             self.record, self.id, self.name, self.altloc, self.resname, self.chain,
             self.resnum, self.icode, self.x, self.y, self.z, self.occ, self.temp,
             self.segid, self.elem, self.charge
         )
 
 
+class ResidueIndex:
+    """
+    Model.atoms의 chain → residue → atom 구간 (slice) index
+    atom을 한 번만 훑어서 만들며, residue의 key는 (chain, resnum, resname) 임
+    같은 key의 atom이 떨어져 있으면 해당 residue의 구간은 여러 개가 됨
+    """
+    def __init__(self, atoms, spans=None):
+        """
+        :param atoms: Model.atoms
+        :param spans: 이미 알고 있는 (start, stop, key) 의 list, 지정하면 atom을 훑지 않음
+        """
+        self.atoms = atoms
+        # (start, stop, key) 를 atom 순서대로 담은 list
+        self.spans = spans if spans is not None else []
+        self._chains = None
+        self._resnums = None
+        if spans is not None:
+            return
+
+        key, start = None, 0
+        for i, atom in enumerate(atoms):
+            _key = (atom.chain, atom.resnum, atom.resname)
+            if _key != key:
+                if key is not None:
+                    self.spans.append((start, i, key))
+                key, start = _key, i
+        if key is not None:
+            self.spans.append((start, len(atoms), key))
+
+    @property
+    def chains(self):
+        """
+        chain → {key: [slice, ...]}
+        """
+        if self._chains is None:
+            self._chains = dict()
+            for start, stop, key in self.spans:
+                self._chains.setdefault(key[0], dict()).setdefault(key, []).append(slice(start, stop))
+        return self._chains
+
+    @property
+    def residues(self):
+        return [key for residues in self.chains.values() for key in residues]
+
+    @property
+    def resnums(self):
+        """
+        resnum → [처음 나온 atom의 icode, atom 수] (process_icode에서 사용)
+        """
+        if self._resnums is None:
+            self._resnums = dict()
+            for start, stop, key in self.spans:
+                if key[1] in self._resnums:
+                    self._resnums[key[1]][1] += stop - start
+                else:
+                    self._resnums[key[1]] = [self.atoms[start].icode, stop - start]
+        return self._resnums
+
+
 class Model:
+    atom_class = Atom
+
     def __init__(self, lines):
-        self.atoms = list()
+        atoms = list()
         for line in lines:
             record = line[0:6]
             assert record in ('ATOM  ', 'HETATM', 'TER   ')
-            self.atoms.append(Atom(line))
+            atoms.append(self.atom_class(line))
+        self.atoms = atoms
+
+    def __len__(self):
+        return len(self.atoms)
+
+    @property
+    def atoms(self):
+        return self._atoms
+
+    @atoms.setter
+    def atoms(self, atoms):
+        self._atoms = atoms
+        self._index = None
+
+    @property
+    def index(self):
+        """
+        처음 사용할 때 만드는 ResidueIndex
+        atoms를 새로 지정하면 다시 만들며, atoms를 직접 수정하거나 atom의 chain, resnum, resname을
+        바꾼 경우에는 invalidate_index를 호출해야 함
+        """
+        if self._index is None:
+            self._index = ResidueIndex(self._atoms)
+        return self._index
+
+    def invalidate_index(self):
+        self._index = None
+
+    def _residue_atoms(self, predicate):
+        """
+        predicate(key)가 참인 residue의 atom을 atom 순서대로 반환함
+        predicate는 residue마다 한 번씩만 평가함
+        """
+        _atoms = []
+        for start, stop, key in self.index.spans:
+            if predicate(key):
+                _atoms.extend(self._atoms[start:stop])
+        return _atoms
+
+    def _filter_atoms(self, atoms):
+        """
+        걸러낸 atoms로 바꿈. 삭제된 atom이 없으면 index를 그대로 사용함
+        """
+        if len(atoms) != len(self._atoms):
+            self.atoms = atoms
+
+    def _filter_residues(self, select):
+        """
+        select(key)가 참인 residue의 atom만 남김
+        새 index는 atom을 다시 훑지 않고 남은 residue 구간을 옮겨서 만듦
+        """
+        _atoms, spans = [], []
+        for start, stop, key in self.index.spans:
+            if not select(key):
+                continue
+            if spans and spans[-1][2] == key:
+                spans[-1] = (spans[-1][0], spans[-1][1] + stop - start, key)
+            else:
+                spans.append((len(_atoms), len(_atoms) + stop - start, key))
+            _atoms.extend(self._atoms[start:stop])
+        if len(_atoms) != len(self._atoms):
+            self.atoms = _atoms
+            self._index = ResidueIndex(_atoms, spans)
 
     @property
     def chains(self):
-        _chains = set()
-        for atom in self.atoms:
-            _chains.add(atom.chain)
-        return list(_chains)
+        return list(self.index.chains)
 
     @property
     def residues(self):
-        _residues = set()
-        for atom in self.atoms:
-            _residues.add((atom.chain, atom.resnum, atom.resname))
-        return list(_residues)
+        return self.index.residues
 
     @property
     def non_standards(self):
@@ -171,39 +392,11 @@ class Model:
 
     @property
     def disulfide_bond_candidates(self):
-        import numpy as np
-        from scipy.spatial import distance
-        cutoff = 3.0
-        _ret = []
-        for chain in self.chains:
-            _sg_atoms = []
-            for atom in self.atoms:
-                if atom.chain != chain:
-                    continue
-
-                if not atom.name == 'SG' or atom.resname not in ('CYS', 'CYX', 'CYM'):
-                    continue
-
-                _sg_atoms.append(atom)
-
-            if not _sg_atoms:
-                continue
-
-            coords = np.array([(a.x, a.y, a.z) for a in _sg_atoms])
-            dist = distance.pdist(coords, metric='euclidean')
-            idist = 0
-            for i, iatm in enumerate(_sg_atoms):
-                for j, jatm in enumerate(_sg_atoms):
-                    if i >= j:
-                        continue
-                    d = dist[idist]
-                    idist += 1
-                    if d >= cutoff:
-                        continue
-                    record_i = (iatm.id, chain, iatm.resnum, iatm.resname)
-                    record_j = (jatm.id, chain, jatm.resnum, jatm.resname)
-                    _ret.append((record_i, record_j, d))
-        return _ret
+        _sg_atoms = [atom for atom in self._residue_atoms(lambda key: key[2] in ('CYS', 'CYX', 'CYM'))
+                     if atom.name == 'SG']
+        records = [(atom.id, atom.chain, atom.resnum, atom.resname) for atom in _sg_atoms]
+        coords = [(float(atom.x), float(atom.y), float(atom.z)) for atom in _sg_atoms]
+        return find_disulfid_bond_candidate(records, coords)
 
     @property
     def protonation_states(self):
@@ -217,22 +410,267 @@ class Model:
     def nucleotides(self):
         return {_residue for _residue in self.residues if _residue[2] in RESNA}
 
+    def select_chains(self, chain_ids):
+        self._filter_residues(lambda key: key[0] in chain_ids)
+
+    def delete_hydrogen_atoms(self, protonation_states_only=False):
+        _atoms = []
+        for atom in self.atoms:
+            if atom.elem in ('H', 'D'):
+                if not protonation_states_only:
+                    continue
+                else:  # TODO
+                    # residue가 HIS인 경우
+                    # residue가 ASP인 경우
+                    # residue가 LYS인 경우
+                    # 기타등등 ...
+                    continue
+            _atoms.append(atom)
+        self._filter_atoms(_atoms)
+
+    def process_altloc(self):
+        self._filter_atoms([atom for atom in self.atoms if not atom.altloc or atom.altloc == 'A'])
+
+    def process_icode(self):
+        resnums = self.index.resnums
+        self._filter_atoms([atom for atom in self.atoms
+                            if resnums[atom.resnum][1] == 1 or atom.icode == resnums[atom.resnum][0]])
+
+    def process_solvent_ions(self, solvent_ions):
+        self._filter_residues(lambda key: key[2] not in RESSOLV or [key[0], key[2]] in solvent_ions)
+
+    def process_hetero(self, ligand_name=None):
+        _atoms = []
+        for atom in self.atoms:
+            if atom.resname in RESNA:
+                continue
+            if atom.record == 'HETATM':
+                if ligand_name and ligand_name == atom.resname:
+                    pass
+                elif atom.resname in RESSOLV:
+                    pass
+                elif atom.resname in NON_STANDARD:
+                    pass
+                else:
+                    continue
+            _atoms.append(atom)
+        self._filter_atoms(_atoms)
+
+    def _rename_residues(self, resname_of):
+        """
+        resname_of(key)가 None이 아닌 residue의 atom들의 resname을 그 값으로 바꾸고 index의 key도 바꿈
+        """
+        spans = []
+        for start, stop, key in self.index.spans:
+            resname = resname_of(key)
+            if resname is not None:
+                for atom in self._atoms[start:stop]:
+                    atom.resname = resname
+                key = (key[0], key[1], resname)
+            if spans and spans[-1][2] == key and spans[-1][1] == start:
+                spans[-1] = (spans[-1][0], stop, key)
+            else:
+                spans.append((start, stop, key))
+        self._index = ResidueIndex(self._atoms, spans)
+
+    def process_non_standards(self):
+        # 표준 아미노산에 없는 atom은 삭제한 뒤 residue name을 변경함
+        self._filter_atoms([atom for atom in self.atoms
+                            if atom.resname not in NON_STANDARD or atom.name in AA_ATOMS[NON_STANDARD[atom.resname]]])
+        self._rename_residues(lambda key: NON_STANDARD.get(key[2]))
+
+    def process_disulfide_bonds(self, cyx_residues=None):
+        _cyx_residues = set()
+        for iatm, jatm, *_ in self.disulfide_bond_candidates:
+            _cyx_residues.add((iatm[1], iatm[2]))
+            _cyx_residues.add((jatm[1], jatm[2]))
+
+        _cyx_residues = cyx_residues if cyx_residues else [list(res) for res in _cyx_residues]
+        self._rename_residues(lambda key: 'CYX' if [key[0], key[1]] in _cyx_residues else None)
+
+    def process_protonation_states(self, protonation_states=None):
+        if not protonation_states:
+            return
+        self._rename_residues(lambda key: protonation_states.get('%s-%s' % (key[0], key[1])))
+
+    def format_atoms(self, start=0, stop=None):
+        """
+        start:stop 범위의 atom을 포맷하여 줄바꿈으로 연결한 문자열을 반환함
+        """
+        return '\n'.join([atom.deserialize() for atom in self.atoms[start:stop]])
+
+
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+}
+CIF_EXTENSIONS = ('.cif', '.mmcif')
+
+
+@contextmanager
+def open_structure(file_path):
+    """
+    PDB 또는 mmCIF 파일 (gzip, bzip2 압축 포함) 을 열어 Topology가 읽을 수 있는 PDB 형식의 줄을 돌려줌
+    압축 파일은 메모리에 모두 풀지 않고 읽는 대로 해제하며, mmCIF는 cifutil.cif_to_pdb_lines로 변환함
+
+    :param file_path: .pdb, .ent, .cif, .mmcif 파일 경로 (.gz, .bz2 확장자 허용)
+    """
+    root, ext = os.path.splitext(file_path.lower())
+    opener = COMPRESSED_OPENERS.get(ext)
+    if opener is None:
+        opener, root = open, file_path.lower()
+    with opener(file_path, 'rt', encoding='latin-1') as stream:
+        if root.endswith(CIF_EXTENSIONS):
+            yield cif_to_pdb_lines(stream)
+        else:
+            yield stream
+
 
 class Topology:
-    def __init__(self, stream):
-        stream.seek(0)
+    def __init__(self, stream, model_class=Model):
+        """
+        :param stream: PDB 파일 스트림, StringIO 스트림 또는 open_structure가 돌려주는 PDB 형식의 줄
+        :param model_class: 각 model을 담을 클래스 (Model 또는 NumPy 배열 기반의 ColumnarModel)
+        """
         self.models = []
+        self.model_indices = []
+        self.n_models = 0
         self.seqres = dict()
+        self.chain_map = dict()
+        self._read(stream, model_class)
+
+    @classmethod
+    def load(cls, stream, model_index=0, chain_ids=None, model_class=Model):
+        """
+        PDB 파일을 한 번만 읽으면서 model_index에 해당하는 model만 생성함
+        나머지 model은 개수만 세어 n_models에 기록하며, chain_ids를 지정하면 해당 chain의 atom만 읽어들임
+
+        :param stream: PDB 파일 스트림 또는 StringIO 스트림
+        :param model_index: 읽어들일 model의 index, 0부터 시작하며 기본값은 0
+        :param chain_ids: 선택된 Chain ID (string) 를 담고있는 list
+        :param model_class: 각 model을 담을 클래스 (Model 또는 NumPy 배열 기반의 ColumnarModel)
+        """
+        instance = cls.__new__(cls)
+        instance.models = []
+        instance.model_indices = []
+        instance.n_models = 0
+        instance.seqres = dict()
+        instance.chain_map = dict()
+        instance._read(stream, model_class, model_index, chain_ids)
+        if not instance.models:
+            raise IndexError('model index out of range: %d' % model_index)
+        instance.select_chains(chain_ids)
+        return instance
+
+    @classmethod
+    def from_mmap(cls, file_path, model_index=0, chain_ids=None):
+        """
+        PDB 파일을 memory-map 하여 줄 단위의 문자열을 만들지 않고 고정폭 열을 바로 ColumnarModel의 배열로 읽어들임
+        model_solv.pdb, md/md1.pdb 처럼 큰 파일에서 Topology.load보다 빠르며 결과는 Topology.load와 같음
+        압축된 파일이나 mmCIF 파일은 memory-map 할 수 없으므로 open_structure와 Topology.load로 읽음
+
+        :param file_path: PDB 파일 경로
+        :param model_index: 읽어들일 model의 index, 0부터 시작하며 기본값은 0
+        :param chain_ids: 선택된 Chain ID (string) 를 담고있는 list
+        """
+        from prowave.utils.pdbcolumnar import ColumnarModel
+        if file_path.lower().endswith(tuple(COMPRESSED_OPENERS) + CIF_EXTENSIONS):
+            with open_structure(file_path) as stream:
+                return cls.load(stream, model_index, chain_ids, model_class=ColumnarModel)
+
+        instance = cls.__new__(cls)
+        instance.models = []
+        instance.model_indices = []
+        instance.n_models = 0
+        instance.seqres = dict()
+        instance.chain_map = dict()
+        with open(file_path, 'rb') as stream:
+            if os.fstat(stream.fileno()).st_size:
+                mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    instance._read_buffer(np.frombuffer(mapped, dtype=np.uint8), model_index, chain_ids)
+                finally:
+                    try:
+                        mapped.close()
+                    except BufferError:
+                        # 예외의 traceback이 buffer를 참조하는 동안에는 닫을 수 없으며, GC 될 때 닫힘
+                        pass
+        if not instance.models:
+            raise IndexError('model index out of range: %d' % model_index)
+        instance.select_chains(chain_ids)
+        return instance
+
+    def _read_buffer(self, data, model_index, chain_ids=None):
+        """
+        PDB 파일 내용의 uint8 배열에서 model_index에 해당하는 atom 줄만 골라 ColumnarModel을 만듦
+        _read와 같은 규칙으로 model을 나누고 seqres를 채움
+        """
+        from prowave.utils.pdbcolumnar import ColumnarModel
+        ends = np.flatnonzero(data == ord('\n'))
+        starts = np.concatenate(([0], ends + 1))
+        ends = np.concatenate((ends, [len(data)]))
+        if starts[-1] == len(data):
+            starts, ends = starts[:-1], ends[:-1]
+        # 텍스트 모드로 읽을 때와 같도록 CR LF의 CR은 줄에서 제외함
+        lengths = ends - starts
+        lengths -= (lengths > 0) & (data[np.maximum(ends - 1, 0)] == ord('\r'))
+
+        # 텍스트 모드의 line[0:6]과 같도록 짧은 줄의 나머지는 줄바꿈 문자로 채움
+        records = _gather(data, starts, lengths, 0, 6, ord('\n')).view('S6').ravel()
+        is_atom = np.isin(records, (b'ATOM  ', b'HETATM', b'TER   '))
+        is_endmdl = records == b'ENDMDL'
+        # 각 줄 앞에 나온 ENDMDL의 수가 그 줄이 속한 model의 index
+        model_of_line = np.cumsum(is_endmdl) - is_endmdl
+        atom_lines = np.flatnonzero(is_atom)
+
+        self.n_models = int(is_endmdl.sum())
+        if len(atom_lines) and model_of_line[atom_lines[-1]] == self.n_models:
+            self.n_models += 1
+
+        for i in np.flatnonzero(records == b'SEQRES'):
+            line = data[starts[i]:starts[i] + lengths[i]].tobytes().decode('latin-1')
+            self.seqres.setdefault(line[11], []).extend(line[19:].strip().split())
+
+        if model_index >= self.n_models:
+            return
+        rows = atom_lines[model_of_line[atom_lines] == model_index]
+        if chain_ids:
+            chains = _gather(data, starts[rows], lengths[rows], 21, 22, ord(' ')).ravel()
+            # _read와 같이 빈 chain ID ('') 는 공백인 chain 열과 일치함
+            rows = rows[np.isin(chains, [ord(chain or ' ') for chain in chain_ids if len(chain) <= 1])]
+        buf = _gather(data, starts[rows], lengths[rows], 0, 80, ord(' ')).view('S1')
+        self.models.append(ColumnarModel.from_buffer(buf))
+        self.model_indices.append(model_index)
+
+    def _read(self, stream, model_class, model_index=None, chain_ids=None):
+        """
+        PDB 스트림을 읽어 models와 seqres를 채움
+        model_index가 None이면 모든 model을 생성함
+        """
+        if hasattr(stream, 'seek'):
+            stream.seek(0)
         acc = []
+        pending = False
         for line in stream:
             record = line[0:6]
             if record in ('ATOM  ', 'HETATM', 'TER   '):
+                pending = True
+                if model_index is not None and self.n_models != model_index:
+                    continue
+                if chain_ids and line[21:22].strip() not in chain_ids:
+                    continue
                 acc.append(line)
                 continue
 
             if record == 'ENDMDL':
-                self.models.append(Model(acc))
+                self._append_model(model_class, acc, model_index)
                 acc = []
+                pending = False
+                continue
+
+            if line.startswith(CHAIN_MAP_REMARK):
+                chain, cif_chain = line[len(CHAIN_MAP_REMARK):].split()
+                self.chain_map[chain] = cif_chain
                 continue
 
             if record == 'SEQRES':
@@ -243,8 +681,14 @@ class Topology:
                 continue
 
         # 모델이 1개밖에 없는 경우에는 ENDMDL 이 나타나지 않기 때문에 아래가 필요함
-        if acc:
-            self.models.append(Model(acc))
+        if pending:
+            self._append_model(model_class, acc, model_index)
+
+    def _append_model(self, model_class, lines, model_index):
+        if model_index is None or self.n_models == model_index:
+            self.models.append(model_class(lines))
+            self.model_indices.append(self.n_models)
+        self.n_models += 1
 
     @property
     def chains(self):
@@ -286,7 +730,10 @@ class Topology:
 
         :param index: 추출하고자 하는 model의 index, 0부터 시작하며 기본값은 0
         """
-        self.models = [self.models[index]]
+        if index not in self.model_indices:
+            raise IndexError('model index out of range: %d' % index)
+        self.models = [self.models[self.model_indices.index(index)]]
+        self.model_indices = [index]
 
     def select_chains(self, chain_ids):
         """
@@ -299,8 +746,7 @@ class Topology:
         if not chain_ids:
             return
 
-        _atoms = [atom for atom in self.models[0].atoms if atom.chain in chain_ids]
-        self.models[0].atoms = _atoms
+        self.models[0].select_chains(chain_ids)
 
         _seqres = dict()
         for chain_id, residues in self.seqres.items():
@@ -319,55 +765,25 @@ class Topology:
         :param protonation_states_only: protonation state와 관련하여 추후 preparation 및 simulation 단계에서 에러를 유발할 수 있는 수소원자만 삭제할 것인지 여부 (아직 미구현)
         """
         assert len(self.models) == 1
-        _atoms = []
-        for atom in self.models[0].atoms:
-            if atom.elem in ('H', 'D'):
-                if not protonation_states_only:
-                    continue
-                else:  # TODO
-                    # residue가 HIS인 경우
-                    # residue가 ASP인 경우
-                    # residue가 LYS인 경우
-                    # 기타등등 ...
-                    continue
-            _atoms.append(atom)
-        self.models[0].atoms = _atoms
+        self.models[0].delete_hydrogen_atoms(protonation_states_only)
 
     def process_altloc(self):
         """
         PDB의 ATOM 중에 altloc이 있는 경우 A를 제외한 나머지 것을 삭제함
         """
         assert len(self.models) == 1
-        _atoms = [atom for atom in self.models[0].atoms if not atom.altloc or atom.altloc == 'A']
-        self.models[0].atoms = _atoms
+        self.models[0].process_altloc()
 
     def process_icode(self):
         """
         PDB의 ATOM 중에 insertion code가 있는 경우 첫 번째 것을 제외한 나머지 것을 삭제함
         """
         assert len(self.models) == 1
-        _icode_residues = dict()
-        for atom in self.models[0].atoms:
-            if atom.resnum not in _icode_residues:
-                _icode_residues[atom.resnum] = []
-            _icode_residues[atom.resnum].append(atom.icode)
-
-        _atoms = []
-        for atom in self.models[0].atoms:
-            assert len(_icode_residues[atom.resnum]) > 0
-            if len(_icode_residues[atom.resnum]) == 1 or atom.icode == _icode_residues[atom.resnum][0]:
-                _atoms.append(atom)
-
-        self.models[0].atoms = _atoms
+        self.models[0].process_icode()
 
     def process_solvent_ions(self, solvent_ions):
         assert len(self.models) == 1
-        _atoms = []
-        for atom in self.models[0].atoms:
-            if atom.resname in RESSOLV and [atom.chain, atom.resname] not in solvent_ions:
-                continue
-            _atoms.append(atom)
-        self.models[0].atoms = _atoms
+        self.models[0].process_solvent_ions(solvent_ions)
 
     def process_hetero(self, ligand_name=None):
         """
@@ -377,56 +793,31 @@ class Topology:
         :param ligand_name: 삭제하지 않고 남겨둘 ligand의 ligand_name (한 종류만 가능)
         """
         assert len(self.models) == 1
-        _atoms = []
-        for atom in self.models[0].atoms:
-            if atom.resname in RESNA:
-                continue
-            if atom.record == 'HETATM':
-                if ligand_name and ligand_name == atom.resname:
-                    pass
-                elif atom.resname in RESSOLV:
-                    pass
-                elif atom.resname in NON_STANDARD:
-                    pass
-                else:
-                    continue
-            _atoms.append(atom)
-        self.models[0].atoms = _atoms
+        self.models[0].process_hetero(ligand_name)
 
     def process_non_standards(self):
         """
         비표준 아미노산에 대하여 추후 preparation 단계에서 표준 아미노산으로 인식하도록 residue name을 변경
         """
         assert len(self.models) == 1
-        _atoms = []
-        for atom in self.models[0].atoms:
-            if atom.resname in NON_STANDARD:
-                atom.resname = NON_STANDARD[atom.resname]
-                if atom.name not in AA_ATOMS[atom.resname]:
-                    continue
-            _atoms.append(atom)
-        self.models[0].atoms = _atoms
+        self.models[0].process_non_standards()
 
     def process_disulfide_bonds(self, cyx_residues=None):
         assert len(self.models) == 1
-        _cyx_residues = set()
-        for iatm, jatm, _ in self.disulfide_bond_candidates:
-            _cyx_residues.add((iatm[1], iatm[2]))
-            _cyx_residues.add((jatm[1], jatm[2]))
-
-        _cyx_residues = cyx_residues if cyx_residues else [list(res) for res in _cyx_residues]
-        for atom in self.models[0].atoms:
-            if [atom.chain, atom.resnum] in _cyx_residues:
-                atom.resname = 'CYX'
+        self.models[0].process_disulfide_bonds(cyx_residues)
 
     def process_protonation_states(self, protonation_states=None):
         assert len(self.models) == 1
-        for atom in self.models[0].atoms:
-            key = '%s-%s' % (atom.chain, atom.resnum)
-            if protonation_states and key in protonation_states:
-                atom.resname = protonation_states[key]
+        self.models[0].process_protonation_states(protonation_states)
 
-    def deserialize(self):
+    def write(self, stream, chunk_size=WRITE_CHUNK_SIZE):
+        """
+        SEQRES 및 ATOM 레코드를 stream에 씀
+        atom은 chunk_size개씩 한 번에 포맷하므로 전체 내용을 메모리에 만들지 않음
+
+        :param stream: 쓰기 가능한 파일 스트림 또는 StringIO 스트림
+        :param chunk_size: 한 번에 포맷할 atom 수
+        """
         assert len(self.models) == 1
         lines = []
         for chain, residues in self.seqres.items():
@@ -436,18 +827,64 @@ class Topology:
                 else:
                     residues_line = ' '.join(residues[13 * i:])
                 lines.append('SEQRES %3d %s %4d  %s' % (i + 1, chain, len(residues), residues_line))
-        lines.extend([atom.deserialize() for atom in self.models[0].atoms])
-        return '\n'.join(lines)
+        stream.write('\n'.join(lines))
+
+        model = self.models[0]
+        for start in range(0, len(model), chunk_size):
+            if lines or start:
+                stream.write('\n')
+            stream.write(model.format_atoms(start, start + chunk_size))
+
+    def deserialize(self):
+        stream = io.StringIO()
+        self.write(stream)
+        return stream.getvalue()
+
+    def save(self, file):
+        """
+        ColumnarModel 1개로 이루어진 Topology를 .npz 형식으로 저장함
+
+        :param file: 파일 경로 또는 쓰기 가능한 binary 스트림
+        """
+        from prowave.utils.pdbcolumnar import ColumnarModel
+        assert len(self.models) == 1 and isinstance(self.models[0], ColumnarModel)
+        np.savez(
+            file,
+            seqres=np.array(json.dumps(self.seqres)),
+            chain_map=np.array(json.dumps(self.chain_map)),
+            n_models=np.array(self.n_models),
+            model_indices=np.array(self.model_indices),
+            **self.models[0].to_arrays()
+        )
+
+    @classmethod
+    def from_npz(cls, file):
+        """
+        Topology.save로 저장한 .npz 파일을 읽어들임
+
+        :param file: 파일 경로 또는 읽기 가능한 binary 스트림
+        """
+        from prowave.utils.pdbcolumnar import ColumnarModel
+        instance = cls.__new__(cls)
+        with np.load(file, allow_pickle=False) as arrays:
+            instance.seqres = json.loads(str(arrays['seqres']))
+            # chain_map이 추가되기 전에 저장된 캐시 파일에는 없음
+            instance.chain_map = json.loads(str(arrays['chain_map'])) if 'chain_map' in arrays else dict()
+            instance.n_models = int(arrays['n_models'])
+            instance.model_indices = arrays['model_indices'].tolist()
+            instance.models = [ColumnarModel.from_arrays(arrays)]
+        return instance
 
     def analyze(self):
         return {
-            "models": [i for i in range(len(self.models))],
+            "models": [i for i in range(self.n_models)],
             "chains": self.chains,
             "sequence": self.sequence,
             "non_standards": self.non_standards,
             "disulfide_bond_candidates": self.disulfide_bond_candidates,
             "protonation_states": self.protonation_states,
             "solvent_ions": self.solvent_ions,
+            "chain_map": self.chain_map,
             # "seqres": self.seqres,
         }
 
@@ -477,7 +914,7 @@ def run(pdb_file, model_index=0, chain_ids=None, ligand_name=None):
     :param ligand_name:
     :return:
     """
-    with open(pdb_file, 'r') as f:
+    with open_structure(pdb_file) as f:
         topo = Topology(f)
         _content = topo.cleanup(model_index, chain_ids, ligand_name)
         return _content
@@ -0,0 +1,204 @@
+"""
+prowave.utils.slurm
+
+sbatch 제출, squeue / sacct 실행 및 출력 파싱
+poll_slurm_jobs 명령이 squeue / sacct 결과를 prowave.models.JobState에 기록함
+"""
+import subprocess
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+
+
+# squeue 기본 출력과 같은 항목을 공백이 들어가도 나눌 수 있도록 '|'로 구분하여 출력함
+# 마지막 두 항목은 긴 형식의 상태 (RUNNING 등) 와 시작 시간
+SQUEUE_FORMAT = '%i|%P|%j|%u|%t|%M|%D|%R|%T|%S'
+
+SlurmJob = namedtuple('SlurmJob', ['job_id', 'partition', 'name', 'user', 'state', 'time', 'nodes', 'nodelist',
+                                   'state_name', 'start_time'])
+
+SACCT_FIELDS = ('JobID', 'State', 'NodeList', 'Start', 'End')
+
+SlurmAccount = namedtuple('SlurmAccount', ['job_id', 'state', 'nodelist', 'start_time', 'end_time'])
+
+SLURM_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def parse_slurm_time(value):
+    """
+    squeue %S, sacct Start/End 형식 (2019-03-22T11:06:00) 의 시간을 naive datetime으로 변환
+    시간이 정해지지 않은 경우 (Unknown, None, N/A) 에는 None
+    """
+    try:
+        return datetime.strptime(value.strip(), SLURM_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def format_elapsed(seconds):
+    """
+    squeue %M 과 같은 형식 ([days-]hours:minutes:seconds, 1시간 미만은 minutes:seconds) 의 경과 시간
+    """
+    seconds = max(int(seconds), 0)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days:
+        return '%d-%02d:%02d:%02d' % (days, hours, minutes, seconds)
+    if hours:
+        return '%d:%02d:%02d' % (hours, minutes, seconds)
+    return '%d:%02d' % (minutes, seconds)
+
+
+def parse_squeue(output):
+    """
+    SQUEUE_FORMAT 형식의 squeue 출력을 job id (string) 별 SlurmJob으로 변환
+
+    :param output: squeue -h -o SQUEUE_FORMAT 의 출력
+    :return: {job_id: SlurmJob}
+    """
+    jobs = dict()
+    for line in output.splitlines():
+        fields = line.strip().split('|')
+        if len(fields) != len(SlurmJob._fields):
+            continue
+        job = SlurmJob(*[field.strip() for field in fields])
+        jobs[job.job_id] = job
+    return jobs
+
+
+def squeue_jobs(squeue_exe='squeue'):
+    """
+    squeue를 실행하여 queue에 있는 job을 조회
+
+    :return: {job_id: SlurmJob}, squeue 실행에 실패하면 예외를 그대로 발생시킴
+    """
+    output = subprocess.check_output([squeue_exe, '-h', '-o', SQUEUE_FORMAT])
+    return parse_squeue(output.decode())
+
+
+def parse_sacct(output):
+    """
+    sacct -n -P -X -o SACCT_FIELDS 출력을 job id (string) 별 SlurmAccount로 변환
+    State는 'CANCELLED by 1000' 처럼 뒤에 붙는 설명을 제외한 첫 단어만 사용함
+    """
+    jobs = dict()
+    for line in output.splitlines():
+        fields = line.strip().split('|')
+        if len(fields) != len(SACCT_FIELDS):
+            continue
+        job_id, state, nodelist, start, end = [field.strip() for field in fields]
+        jobs[job_id] = SlurmAccount(job_id, (state.split() or [''])[0], nodelist,
+                                    parse_slurm_time(start), parse_slurm_time(end))
+    return jobs
+
+
+def sacct_jobs(job_ids, sacct_exe='sacct'):
+    """
+    queue에서 빠진 job의 최종 상태를 sacct로 조회
+
+    :param job_ids: 조회할 Slurm job id 의 list
+    :return: {job_id: SlurmAccount}, accounting이 설정되지 않아 sacct가 실패하면 예외를 그대로 발생시킴
+    """
+    if not job_ids:
+        return dict()
+    output = subprocess.check_output(
+        [sacct_exe, '-n', '-P', '-X', '-j', ','.join('%s' % job_id for job_id in job_ids),
+         '-o', ','.join(SACCT_FIELDS)],
+        stderr=subprocess.DEVNULL)
+    return parse_sacct(output.decode())
+
+
+def parse_sbatch(output):
+    """
+    sbatch 출력 (Submitted batch job 123) 에서 job id를 읽음
+
+    :return: job id 또는 읽을 수 없으면 -1
+    """
+    try:
+        return int(output.split()[-1])
+    except (IndexError, ValueError):
+        return -1
+
+
+def sbatch_command(script_args, job_name, partition=None, dependency=None, gres=None, array=None, sbatch_exe=None):
+    """
+    sbatch 실행 명령
+
+    :param script_args: batch script 경로와 인자의 list
+    :param array: job array task id 범위 (예: 0-9)
+    """
+    cmd = [sbatch_exe or settings.SBATCH_EXE, '--job-name', job_name]
+    if partition:
+        cmd += ['--partition', partition]
+    if dependency:
+        # 선행 job이 실패하면 의존하는 job이 queue에 계속 남아있지 않도록 취소함
+        cmd += ['--dependency', dependency, '--kill-on-invalid-dep=yes']
+    if gres:
+        cmd += ['--gres', gres]
+    if array:
+        cmd += ['--array', array]
+    return cmd + list(script_args)
+
+
+class SlurmSubmitter:
+    """
+    sbatch 제출 서비스
+    os.chdir로 프로세스 전체의 working directory를 바꾸지 않고 subprocess의 cwd로 지정하므로
+    여러 thread에서 동시에 제출할 수 있으며, 동시에 실행되는 sbatch 수는 max_workers 개로 제한됨
+    """
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, script_args, job_name, cwd=None, env=None, **kwargs):
+        """
+        sbatch를 thread pool에서 실행
+
+        :param script_args: batch script 경로와 인자의 list
+        :param job_name: --job-name
+        :param cwd: sbatch를 실행할 (job의 working directory가 될) 경로, 기본값 settings.SBATCH_WORKING_DIR
+        :param env: sbatch의 환경 변수 (기본값 os.environ), sbatch는 이 환경 변수를 job에 그대로 전달함
+        :param kwargs: sbatch_command의 partition, dependency, gres, array, sbatch_exe
+        :return: job id (실패하면 -1) 를 결과로 갖는 Future
+        """
+        cmd = sbatch_command(script_args, job_name, **kwargs)
+        return self._executor.submit(self._run, cmd, cwd or settings.SBATCH_WORKING_DIR, env)
+
+    @staticmethod
+    def _run(cmd, cwd, env=None):
+        return parse_sbatch(subprocess.check_output(cmd, cwd=cwd, env=env).decode())
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_submitter = None
+_submitter_lock = threading.Lock()
+
+
+def slurm_submitter():
+    """
+    settings.SBATCH_MAX_WORKERS를 사용하는 프로세스 공용 SlurmSubmitter
+    설정이 바뀌면 이전 submitter의 thread pool을 종료하고 (제출중인 sbatch는 끝까지 실행됨) 새로 만듦
+    """
+    global _submitter
+    with _submitter_lock:
+        if _submitter is None or _submitter.max_workers != settings.SBATCH_MAX_WORKERS:
+            if _submitter is not None:
+                _submitter.shutdown(wait=False)
+            _submitter = SlurmSubmitter(settings.SBATCH_MAX_WORKERS)
+        return _submitter
+
+
+def sbatch(script_args, job_name, cwd=None, env=None, **kwargs):
+    """
+    프로세스 공용 SlurmSubmitter로 제출하고 job id를 기다림
+    sbatch가 실패하면 CalledProcessError를 그대로 발생시킴
+
+    :return: job id 또는 sbatch 출력에서 읽을 수 없으면 -1
+    """
+    return slurm_submitter().submit(script_args, job_name, cwd=cwd, env=env, **kwargs).result()
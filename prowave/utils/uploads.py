@@ -0,0 +1,90 @@
+"""
+prowave.utils.uploads
+
+compute node가 계산 결과를 나누어 올리는 resumable upload
+
+    POST action=init                  → {'offset': 이미 받은 bytes}
+    PUT  ?offset=<N> (body: chunk)    → {'offset': N + chunk 크기}
+    POST action=commit, sha256[, size] → 201
+
+받는 중인 파일은 최종 경로 옆의 <이름>.part 에 바로 기록하고 (임시 파일로 spool 후 다시 복사하지 않음),
+commit에서 SHA-256을 확인한 뒤 같은 directory 안에서 rename 하므로 끝나지 않은 파일이 최종 이름으로 보이지 않음
+전송이 끊기면 init으로 받은 offset부터 다시 보내면 됨
+"""
+import hashlib
+import os
+
+PART_SUFFIX = '.part'
+
+BUFFER_SIZE = 1024 * 1024
+
+
+def part_path(file_path):
+    """
+    받는 중인 파일의 경로
+    """
+    return file_path + PART_SUFFIX
+
+
+def init_upload(file_path):
+    """
+    upload를 시작하거나 이어서 받을 준비
+
+    :return: 이미 받은 bytes (처음이면 0)
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(part_path(file_path), 'ab') as stream:
+        return stream.tell()
+
+
+def write_chunk(file_path, offset, stream, length=None):
+    """
+    stream (request body) 을 .part 파일의 offset 위치에 기록
+    같은 chunk를 다시 보내는 경우를 위해 offset은 이미 받은 bytes 이하여야 하며, 기록한 뒤의 내용은 버림
+
+    :param length: stream에서 읽을 bytes, 기본값은 끝까지
+    :return: 기록한 뒤 받은 bytes
+    :raise FileNotFoundError: init하지 않은 경우
+    :raise ValueError: offset이 이미 받은 bytes보다 큰 경우
+    """
+    with open(part_path(file_path), 'r+b') as part:
+        size = part.seek(0, os.SEEK_END)
+        if offset < 0 or offset > size:
+            raise ValueError('offset %d is beyond the received %d bytes' % (offset, size))
+        part.seek(offset)
+        while length is None or length > 0:
+            chunk = stream.read(BUFFER_SIZE if length is None else min(BUFFER_SIZE, length))
+            if not chunk:
+                break
+            part.write(chunk)
+            if length is not None:
+                length -= len(chunk)
+        part.truncate()
+        return part.tell()
+
+
+def file_sha256(file_path):
+    """
+    파일의 SHA-256 (hex)
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(BUFFER_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def commit_upload(file_path, sha256, size=None):
+    """
+    받은 파일의 크기와 SHA-256을 확인하고 최종 경로로 rename
+    확인에 실패하면 .part 파일을 지우므로 처음부터 다시 올려야 함
+
+    :return: 확인에 성공하면 True
+    :raise FileNotFoundError: init하지 않은 경우
+    """
+    received = part_path(file_path)
+    if (size is None or os.path.getsize(received) == size) and file_sha256(received) == sha256.lower():
+        os.replace(received, file_path)
+        return True
+    os.remove(received)
+    return False
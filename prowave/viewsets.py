@@ -0,0 +1,86 @@
+"""
+prowave.viewsets
+"""
+import hmac
+
+from rest_framework import mixins, routers, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny, BasePermission
+from rest_framework.response import Response
+
+from prowave.models import JobState, Submission
+from prowave.utils.backends import job_event_token
+
+
+class HasJobEventToken(BasePermission):
+    """
+    X-Prowave-Job-Token header가 job_event_token과 같은 요청 (compute script, prowave.scripts.jobs) 만 허용함
+    """
+    def has_permission(self, request, view):
+        token = request.META.get('HTTP_X_PROWAVE_JOB_TOKEN', '')
+        return hmac.compare_digest(token.encode(), job_event_token().encode())
+
+
+class JobStateViewSet(viewsets.GenericViewSet):
+    """
+    Slurm job 상태
+    계산 script가 start, progress, success, failure 시점에 job event를 보냄
+    """
+    queryset = JobState.objects.all()
+    permission_classes = (HasJobEventToken,)
+
+    @action(['POST'], url_path='events', detail=True)
+    def events(self, request, pk=None):
+        """
+        job event 기록
+
+        event: start, progress, success, failure
+        node, progress (0 ~ 1), message: 선택
+        array_job_id, array_task_id: job array task인 경우
+        """
+        array_job_id = request.data.get('array_job_id')
+        if array_job_id:
+            # job array task는 시작할 때 task의 job id를 처음 알게 되므로 이때 기록함
+            try:
+                JobState.array_task(int(pk), int(array_job_id), int(request.data.get('array_task_id')))
+            except (TypeError, ValueError, JobState.DoesNotExist):
+                return Response({'success': False, 'message': 'unknown job'}, status=404)
+        job = self.get_object()
+        event = request.data.get('event')
+        if event not in JobState.EVENT_STATES:
+            return Response({'success': False, 'message': 'invalid event'}, status=400)
+
+        progress = request.data.get('progress')
+        try:
+            progress = float(progress) if progress not in (None, '') else None
+        except (TypeError, ValueError):
+            return Response({'success': False, 'message': 'invalid progress'}, status=400)
+
+        job.record_event(
+            event,
+            node=request.data.get('node', ''),
+            progress=progress,
+            message=request.data.get('message', ''),
+        )
+        return Response({
+            'success': True,
+            'job_id': job.job_id,
+            'state': job.state,
+            'progress': job.progress,
+        })
+
+
+class SubmissionViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    작업 제출 대기열 (202 응답의 job handle로 상태 조회)
+    """
+    queryset = Submission.objects.all()
+    permission_classes = (AllowAny,)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_object().handle)
+
+
+router = routers.DefaultRouter()
+router.register(r'jobs', JobStateViewSet)
+router.register(r'submissions', SubmissionViewSet)
@@ -8,46 +8,75 @@ import shutil
 import subprocess
 import tempfile
 
-import requests
+from prowave.scripts.jobs import API_HOST, job_event, report_job
+from prowave.scripts.transfer import TransferClient, shared_work_dir, store_file
 
 
-CONTROLLER_HOST = os.environ.get('PROWAVE_CONTROLLER_HOST', 'slurmctld:8000')
+BASE_URL = 'http://%s/api/solvation-free-energy/works' % API_HOST
+# 작업 directory가 compute node에 mount되어 있으면 HTTP 대신 직접 읽고 씀 (prowave.scripts.transfer)
+DATA_DIR = os.environ.get('PROWAVE_DATA_DIR', '/data/prowave_data')
+
+
+def select_work_id(work_ids):
+    """
+    job array로 제출된 경우 (work_id가 12,13,14 처럼 여러 개) SLURM_ARRAY_TASK_ID 번째 work id
+    argparse type으로 사용하므로 잘못된 값은 ArgumentTypeError로 알림
+    """
+    work_ids = [int(x) for x in work_ids.split(',')]
+    if len(work_ids) == 1:
+        return work_ids[0]
+    task_id = os.environ.get('SLURM_ARRAY_TASK_ID', '')
+    if not task_id.isdigit():
+        raise argparse.ArgumentTypeError('SLURM_ARRAY_TASK_ID is required for multiple work ids')
+    if int(task_id) >= len(work_ids):
+        raise argparse.ArgumentTypeError('SLURM_ARRAY_TASK_ID %s is out of range for %d work ids'
+                                         % (task_id, len(work_ids)))
+    return work_ids[int(task_id)]
 
-if __name__ == '__main__':
-    BASE_URL = 'http://%s/api/solvation-free-energy/works' % CONTROLLER_HOST
-    PARSER = argparse.ArgumentParser()
-    PARSER.add_argument('work_id', type=int)
-    PARSER.add_argument('mode', default='m', choices=['m', 't', 'a', 'x'])
-    ARGS = PARSER.parse_args()
 
+@report_job
+def main(args):
+    """
+    Main
+    """
     # create and move to temp directory
-    TEMPDIR = tempfile.mkdtemp()
-    CWD = os.getcwd()
+    tempdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
     try:
-        os.chdir(TEMPDIR)
+        os.chdir(tempdir)
         # get cleaned.pdb from controller
-        RESP1 = requests.get('%s/%d/files/model/' % (BASE_URL, ARGS.work_id))
-        if RESP1.status_code == 200:
-            with open('model.pdb', 'wb+') as f:
-                f.write(RESP1.content)
+        # autotleap이 model.pdb를 다시 쓰므로 mount된 경우에도 link가 아닌 복사본을 사용함
+        work_dir = shared_work_dir(DATA_DIR, args.work_id, 'model.pdb')
+        client = TransferClient()
+        if work_dir:
+            shutil.copyfile(os.path.join(work_dir, 'model.pdb'), 'model.pdb')
+        else:
+            client.download('%s/%d/files/model/' % (BASE_URL, args.work_id), 'model.pdb')
 
         assert os.path.exists('model.pdb')
+        job_event('progress', progress=0.1, message='running tleap')
         subprocess.check_call(['/home/nbcc/prowave_compute/autotleap.py', '.'])
         assert os.path.exists('model.prmtop')
         assert os.path.exists('model.inpcrd')
-        subprocess.check_call(['/home/nbcc/prowave_compute/rism3d.py', '.', '-m', ARGS.mode])
+        job_event('progress', progress=0.2, message='running 3D-RISM')
+        subprocess.check_call(['/home/nbcc/prowave_compute/rism3d.py', '.', '-m', args.mode])
+        job_event('progress', progress=0.9, message='uploading results')
         # upload result.json
-        for file_to_post in ['model.pdb', 'result.json', 'model.prmtop', 'model.inpcrd',
-                             'leaprc', 'leap.log', 'plot.svg']:
-            if os.path.exists(file_to_post):
-                with open(file_to_post, 'rb') as f:
-                    RESP2 = requests.post(
-                        '%s/%d/files/' % (BASE_URL, ARGS.work_id),
-                        data={'file': file_to_post},
-                        files={'file': f}
-                    )
-                assert RESP2.status_code == 201
+        # result.json이 생기면 Work가 완료로 표시되므로 다른 파일을 모두 올린 뒤 마지막에 올림
+        for file_to_post in ['model.pdb', 'model.prmtop', 'model.inpcrd',
+                             'leaprc', 'leap.log', 'plot.svg', 'result.json']:
+            if work_dir and os.path.exists(file_to_post):
+                store_file(work_dir, file_to_post)
+            elif os.path.exists(file_to_post):
+                client.post_file('%s/%d/files/' % (BASE_URL, args.work_id), file_to_post)
     # End of execution
     finally:
-        os.chdir(CWD)
-        shutil.rmtree(TEMPDIR)
+        os.chdir(cwd)
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser()
+    PARSER.add_argument('work_id', type=select_work_id, help='work id or comma separated work ids of a job array')
+    PARSER.add_argument('mode', default='m', choices=['m', 't', 'a', 'x'])
+    main(PARSER.parse_args())
@@ -1,10 +1,166 @@
 """
 sfe.tests
 """
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from prowave.models import JobState, Submission, Work, WorkHistory
+from prowave.tests import sbatch_calls, write_fake_sbatch
+from prowave.utils.backends import job_event_token
+from prowave.utils.manifest import update_checksums
+
+
+ARTIFACTS_DIR = os.path.join(settings.BASE_DIR, 'prowave/utils/_artifacts_')
 
 
 class SFETestCase(TestCase):
     """
     Solvation Free Energy Test Case
     """
+    def setUp(self):
+        """
+        set up
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            PROWAVE_DATA_DIR=os.path.join(self.temp_dir, 'prowave_data'),
+            SBATCH_EXE=write_fake_sbatch(self.temp_dir),
+            SBATCH_WORKING_DIR=self.temp_dir,
+            PDB_SOURCES_DIR=os.path.join(self.temp_dir, 'pdb_sources'),
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        """
+        tear down
+        """
+        self.settings_override.disable()
+        shutil.rmtree(self.temp_dir)
+
+    def create_work(self):
+        """
+        _artifacts_의 PDB 파일을 업로드하여 Work 생성 요청
+        """
+        with open(os.path.join(ARTIFACTS_DIR, '1AVD.pdb'), 'rb') as stream:
+            pdb_file = SimpleUploadedFile('1AVD.pdb', stream.read())
+        return self.client.post('/api/solvation-free-energy/works/', {
+            'mode': 'm', 'source': 'upload', 'file': pdb_file, 'email': 'prowave@example.com',
+            'name': 'ProWaVE', 'title': 'Researcher', 'organization': 'NBCC',
+        }, REMOTE_ADDR='127.0.0.1')
+
+    def test_create_enqueues_submission(self):
+        """
+        Work 생성 요청은 sbatch를 실행하지 않고 202와 job handle을 반환하며, worker가 제출하는지 확인
+        """
+        response = self.create_work()
+        self.assertEqual(response.status_code, 202)
+        handle = response.json()
+        self.assertEqual(handle['state'], 'queued')
+        self.assertEqual(sbatch_calls(self.temp_dir), [])
+
+        work = Work.objects.get(id=handle['work_id'])
+        self.assertTrue(os.path.exists(os.path.join(work.work_dir, '1AVD.pdb')))
+        self.assertEqual(work.status['message'], 'Job is waiting for submission')
+
+        call_command('process_submissions', '--once', stdout=StringIO())
+        handle = self.client.get(handle['url']).json()
+        self.assertEqual(handle['state'], 'submitted')
+        self.assertTrue(handle['result']['run'])
+        self.assertEqual(work.slurm_job_id, handle['result']['slurm_job_id'])
+        self.assertTrue(JobState.is_active(work.slurm_job_id))
+        self.assertTrue(os.path.exists(os.path.join(work.work_dir, 'model.pdb')))
+        self.assertEqual(WorkHistory.objects.get(work_id=work.id).country_code, 'KR')
+        self.assertEqual(len(sbatch_calls(self.temp_dir)), 1)
+
+    def test_failed_submission(self):
+        """
+        처리 중 오류가 난 Submission은 failed 상태와 오류 메시지를 기록하고 Work.status에 표시하는지 확인
+        """
+        handle = self.create_work().json()
+        os.remove(os.path.join(Work.objects.get(id=handle['work_id']).work_dir, '1AVD.pdb'))
+
+        call_command('process_submissions', '--once', stdout=StringIO())
+        submission = Submission.objects.get(id=handle['submission_id'])
+        self.assertEqual((submission.state, submission.attempts), ('failed', 1))
+        self.assertTrue(submission.error.startswith('FileNotFoundError'))
+        self.assertTrue(Work.objects.get(id=handle['work_id']).status['failed'])
+        self.assertFalse(WorkHistory.objects.filter(work_id=handle['work_id']).exists())
+
+    def test_batch_job_array(self):
+        """
+        여러 PDB ID와 파일로 Work를 한 번에 만들고, 준비된 Work만 하나의 job array로 제출하는지 확인
+        """
+        os.makedirs(os.path.join(self.temp_dir, 'pdb_sources/1A'))
+        shutil.copy(os.path.join(ARTIFACTS_DIR, '1AVD.pdb'), os.path.join(self.temp_dir, 'pdb_sources/1A'))
+        files = []
+        for name in ('1AVD.pdb', 'broken.pdb'):
+            with open(os.path.join(ARTIFACTS_DIR, '1AVD.pdb'), 'rb') as stream:
+                files.append(SimpleUploadedFile(name, stream.read()))
+        response = self.client.post('/api/solvation-free-energy/works/batch/', {
+            'mode': 'm', 'pdb_ids': '1avd, 1AVD', 'files': files, 'email': 'prowave@example.com',
+            'name': 'ProWaVE', 'title': 'Researcher', 'organization': 'NBCC',
+        }, REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 202)
+        work_ids = response.json()['work_ids']
+        self.assertEqual(len(work_ids), 4)
+        works = [Work.objects.get(id=work_id) for work_id in work_ids]
+        self.assertEqual(works[3].status['message'], 'Job is waiting for submission')
+        os.remove(os.path.join(works[3].work_dir, 'broken.pdb'))
+
+        call_command('process_submissions', '--once', stdout=StringIO())
+        calls = sbatch_calls(self.temp_dir)
+        self.assertEqual(len(calls), 1)
+        self.assertIn('--array 0-2 ', calls[0][2])
+        self.assertTrue(calls[0][2].endswith(' %s m' % ','.join('%d' % x for x in work_ids[:3])))
+
+        array_job_id = works[0].slurm_job_id
+        self.assertEqual([work.slurm_job_id for work in works], [array_job_id] * 3 + [-1])
+        self.assertEqual([work.slurm_array_task_id for work in works], [0, 1, 2, None])
+        self.assertTrue(works[3].status['failed'])
+        self.assertTrue(works[1].status['found'])
+
+        # array task가 시작되면 task의 job id로 기록되고 Work.status는 task의 상태를 읽음
+        url = '/api/jobs/%d/events/' % (array_job_id + 10)
+        self.client.defaults['HTTP_X_PROWAVE_JOB_TOKEN'] = job_event_token()
+        self.client.post(url, {'event': 'start', 'node': 'gpu68', 'array_job_id': array_job_id, 'array_task_id': 1})
+        self.client.post(url, {'event': 'failure', 'message': 'CalledProcessError'})
+        self.assertEqual(works[1].status['message'], 'CalledProcessError')
+        self.assertTrue(works[0].status['found'])
+        self.assertEqual(self.client.post('/api/jobs/1/events/', {
+            'event': 'start', 'array_job_id': 2, 'array_task_id': 0}).status_code, 404)
+
+    def test_download_files(self):
+        """
+        model.pdb, plot.svg를 스트림하고 SENDFILE_HEADER가 지정되면 front proxy에 넘기는지 확인
+        """
+        base_dir = os.path.join(self.temp_dir, 'prowave_data/7')
+        os.makedirs(base_dir)
+        shutil.copy(os.path.join(ARTIFACTS_DIR, '1AVD.pdb'), os.path.join(base_dir, 'model.pdb'))
+
+        response = self.client.get('/api/solvation-free-energy/works/7/files/model/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'chemical/x-pdb')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="prowave_SFE_7_model.pdb"')
+        with open(os.path.join(ARTIFACTS_DIR, '1AVD.pdb'), 'rb') as stream:
+            self.assertEqual(b''.join(response.streaming_content), stream.read())
+        self.assertEqual(self.client.get('/api/solvation-free-energy/works/7/files/plot/').status_code, 404)
+
+        # SHA-256이 저장되지 않은 파일은 manifest에 포함하지 않음
+        self.assertEqual(self.client.get('/api/solvation-free-energy/works/7/files/manifest/').json(), {'files': []})
+        update_checksums(base_dir)
+        manifest = self.client.get('/api/solvation-free-energy/works/7/files/manifest/').json()
+        self.assertEqual([(item['path'], item['size']) for item in manifest['files']],
+                         [('model.pdb', os.path.getsize(os.path.join(base_dir, 'model.pdb')))])
+
+        with override_settings(SENDFILE_HEADER='X-Accel-Redirect', SENDFILE_ROOT=self.temp_dir,
+                               SENDFILE_URL_ROOT='/protected/'):
+            response = self.client.get('/api/solvation-free-energy/works/7/files/model/')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/prowave_data/7/model.pdb')
+        self.assertEqual(response.content, b'')
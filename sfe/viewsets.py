@@ -1,11 +1,11 @@
 """
 sfe.viewsets
 """
+import hashlib
 import os
 # django modules
 from django.contrib.auth.models import User
 from django.conf import settings
-from django.core.files.base import ContentFile
 from django.db import transaction
 from django.http import Http404
 from django.http.response import HttpResponse
@@ -16,6 +16,8 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 # in project modules
 from prowave.models import History, WorkHistory, Work
+from prowave.utils.fileresponse import file_response
+from prowave.utils.manifest import record_checksum, work_manifest
 from auth.serializers import UserSerializer
 from .serializers import (
     HistorySerializer,
@@ -52,6 +54,7 @@ class WorkViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         """
         ProWaVE 계산 작업 생성
+        Work를 만들고 제출 대기열에 넣은 뒤 job handle을 바로 반환함 (202)
 
         :param request:
         :return:
@@ -74,7 +77,7 @@ class WorkViewSet(viewsets.ModelViewSet):
 
             if request.data['source'] == 'rcsb':                
                 pdb_id = request.data['pdb_id']
-                work = Work.create(
+                work, submission = Work.enqueue(
                     owner=owner,
                     source=request.data['source'],
                     mode=request.data['mode'],
@@ -87,7 +90,7 @@ class WorkViewSet(viewsets.ModelViewSet):
                 )
             else:
                 pdb_file = request.FILES['file']
-                work = Work.create(
+                work, submission = Work.enqueue(
                     owner=owner,
                     source=request.data['source'],
                     mode=request.data['mode'],
@@ -98,10 +101,47 @@ class WorkViewSet(viewsets.ModelViewSet):
                     file=pdb_file,
                     organization=organization
                 )
-            return Response(work.run(), status=201)
+            # PDB 다운로드, cleanup, sbatch 제출은 process_submissions worker가 처리함
+            return Response(submission.handle, status=202)
         except AssertionError:
             return Response(data={'created': False, 'work': None}, status=400)
 
+    @action(methods=['POST'], url_path='batch', detail=False)
+    def batch(self, request):
+        """
+        여러 PDB ID (pdb_ids) 또는 파일 (files) 에 대한 ProWaVE 계산 작업을 한 번에 생성
+        Work를 bulk_create하고 하나의 Submission으로 대기열에 넣은 뒤 job handle을 바로 반환함 (202)
+        process_submissions worker가 하나의 Slurm job array로 제출함
+        """
+        pdb_ids = request.data.getlist('pdb_ids') if hasattr(request.data, 'getlist') \
+            else request.data.get('pdb_ids', [])
+        if isinstance(pdb_ids, str):
+            pdb_ids = [pdb_ids]
+        pdb_ids = [pdb_id for value in pdb_ids for pdb_id in value.replace(',', ' ').split()]
+        files = request.FILES.getlist('files')
+        try:
+            assert request.data.get('mode') and request.data.get('mode') in ('m', 't', 'a', 'x')
+            assert 0 < len(pdb_ids) + len(files) <= settings.SFE_BATCH_MAX_SIZE
+            assert all(request.data.get(key) for key in ('email', 'name', 'title', 'organization'))
+        except AssertionError:
+            return Response(data={'created': False, 'works': []}, status=400)
+
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        remote_ip = x_forwarded_for.split(',')[0] if x_forwarded_for \
+            else request.META.get('REMOTE_ADDR')
+        _, submission = Work.enqueue_batch(
+            owner=request.user if request.user.is_authenticated else None,
+            email=request.data['email'],
+            mode=request.data['mode'],
+            remote_ip=remote_ip,
+            pdb_ids=pdb_ids,
+            files=files,
+            name=request.data['name'],
+            title=request.data['title'],
+            organization=request.data['organization'],
+        )
+        return Response(submission.handle, status=202)
+
     def list(self, request, *args, **kwargs):
         """
         SFEWorkList
@@ -122,13 +162,24 @@ class WorkViewSet(viewsets.ModelViewSet):
         try:
             os.makedirs(base_dir, exist_ok=True)
             full_file_path = os.path.join(base_dir, file.name)
+            sha256 = hashlib.sha256()
             with open(full_file_path, 'wb') as stream:
                 for chunk in file.chunks():
                     stream.write(chunk)
+                    sha256.update(chunk)
+            record_checksum(full_file_path, sha256.hexdigest())
             return Response({'success': True}, status=201)
         except OSError:
             return HttpResponse({'success': False}, status=500)
 
+    @action(methods=['GET'], url_path='files/manifest', detail=True)
+    def manifest(self, request, pk=None):
+        """
+        work_dir 파일의 path, size, mtime, sha256 (SHA-256이 저장된 파일만 포함함)
+        """
+        paths = request.query_params.getlist('path') or None
+        return Response({'files': work_manifest(os.path.join(settings.PROWAVE_DATA_DIR, pk), paths)})
+
     @action(methods=['GET'], url_path='files/model', detail=True)
     def model(self, request, pk=None):
         """
@@ -138,12 +189,7 @@ class WorkViewSet(viewsets.ModelViewSet):
         pdb_file_path = os.path.join(base_dir, 'model.pdb')
         if not os.path.exists(pdb_file_path):
             raise Http404
-        with open(pdb_file_path, 'rb') as stream:
-            file_to_send = ContentFile(stream.read())
-            response = HttpResponse(file_to_send, 'chemical/x-pdb')
-            response['Content-Length'] = file_to_send.size
-            response['Content-Disposition'] = 'attachment; filename="prowave_SFE_%s_model.pdb"' % pk
-            return response
+        return file_response(request, pdb_file_path, 'chemical/x-pdb', 'prowave_SFE_%s_model.pdb' % pk)
 
     @action(methods=['GET'], url_path='files/plot', detail=True)
     def plot(self, request, pk=None):
@@ -154,12 +200,7 @@ class WorkViewSet(viewsets.ModelViewSet):
         pdb_file_path = os.path.join(base_dir, 'plot.svg')
         if not os.path.exists(pdb_file_path):
             raise Http404
-        with open(pdb_file_path, 'rb') as stream:
-            file_to_send = ContentFile(stream.read())
-            response = HttpResponse(file_to_send, 'image/svg+xml')
-            response['Content-Length'] = file_to_send.size
-            response['Content-Disposition'] = 'attachment; filename="prowave_SFE_%s_plot.svg"' % pk
-            return response
+        return file_response(request, pdb_file_path, 'image/svg+xml', 'prowave_SFE_%s_plot.svg' % pk)
 
 
 router = routers.DefaultRouter()
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.2 on 2026-10-18 11:55
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmd', '0031_workanalysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='work',
+            name='analysis',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -1,34 +1,21 @@
 """
 Core Models
 """
+import json
 import os
 import shutil
-import subprocess
-from functools import wraps
 
 import yaml
 from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import JSONField
 from django.conf import settings
 from prowave.utils import get_rcsb_pdb, save_uploaded_pdb
-from prowave.utils.pdbutil import Topology
-
-
-def working_directory(directory):
-    """
-    Decorated 함수를 지정된 working directory에서 수행하도록 하는 데코레이터
-    """
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            cwd = os.getcwd()
-            try:
-                os.chdir(directory)
-                return func(*args, **kwargs)
-            finally:
-                os.chdir(cwd)
-        return wrapper
-    return decorator
+from prowave.utils.pdbcache import invalidate_topology, load_topology
+from prowave.utils.pdbcolumnar import ColumnarModel
+from prowave.utils.pdbutil import Topology, open_structure
+from prowave.utils.backends import execution_backend
+from prowave.utils.manifest import list_files
 
 
 # Create your models here.
@@ -115,6 +102,7 @@ class Work(models.Model):
     ref_temp = models.IntegerField(default=300)
     project = models.ForeignKey(Project, null=True, on_delete=models.SET_NULL)
     is_deleted = models.BooleanField(default=False)
+    analysis = JSONField(default=dict, blank=True)  # PDB 분석결과 (model_params)
 
     @classmethod
     @transaction.atomic()
@@ -135,8 +123,7 @@ class Work(models.Model):
         os.makedirs(instance.work_dir, exist_ok=True)
         if source == 'rcsb':
             pdb_id = kwargs.get('pdb_id')
-            get_rcsb_pdb(pdb_id, instance.work_dir)
-            instance.filename = '%s.pdb' % pdb_id
+            instance.filename = os.path.basename(get_rcsb_pdb(pdb_id, instance.work_dir))
         else:
             file_obj = kwargs.get('file')
             save_uploaded_pdb(file_obj, instance.work_dir)
@@ -146,27 +133,63 @@ class Work(models.Model):
             instance.name = kwargs.get('name')
 
         instance.save()
+        instance.analyze()
         return instance
 
     def cleanup(self, model_index, chain_ids, solvent_ions, ligand_name=None):
         """
         Trajectory.cleanup
         """
-        with open(os.path.join(self.work_dir, self.filename), 'r') as stream:
-            topo = Topology(stream)
+        with open_structure(os.path.join(self.work_dir, self.filename)) as stream:
+            topo = Topology.load(stream, model_index, chain_ids, model_class=ColumnarModel)
         topo.cleanup(model_index, chain_ids, solvent_ions, ligand_name)
-        with open(os.path.join(self.work_dir, 'cleaned.pdb'), 'w') as stream:
-            stream.write(topo.deserialize())
+        cleaned_pdb_file = os.path.join(self.work_dir, 'cleaned.pdb')
+        invalidate_topology(cleaned_pdb_file)
+        with open(cleaned_pdb_file, 'w') as stream:
+            topo.write(stream)
+        self.analyze(cleaned_topo=topo)
+
+    def analyze(self, topo=None, cleaned_topo=None):
+        """
+        Trajectory.analyze
+        업로드한 PDB와 cleaned.pdb의 분석결과를 analysis 컬럼에 저장함
+        topo, cleaned_topo를 지정하지 않으면 파일에서 읽어들임
+        """
+        if topo is None:
+            topo = load_topology(os.path.join(self.work_dir, self.filename))
+        params = {
+            'models': [i for i in range(topo.n_models)],
+            'chains': topo.chains,
+            # mmCIF의 2글자 이상의 chain ID를 바꾼 경우 {PDB chain ID: mmCIF chain ID}
+            'chain_map': topo.chain_map,
+            'solvent_ions': topo.solvent_ions,
+            'non_standards': [],
+            'disulfide_bond_candidates': [],
+            'protonation_states': [],
+        }
+        cleaned_pdb_file = os.path.join(self.work_dir, 'cleaned.pdb')
+        if cleaned_topo is None and os.path.exists(cleaned_pdb_file):
+            cleaned_topo = load_topology(cleaned_pdb_file)
+        if cleaned_topo is not None:
+            params['non_standards'] = cleaned_topo.non_standards
+            params['disulfide_bond_candidates'] = cleaned_topo.disulfide_bond_candidates
+            params['protonation_states'] = cleaned_topo.protonation_states
+        # DB에서 다시 읽었을 때와 같은 값이 되도록 tuple 등을 JSON 형식으로 변환하여 보관함
+        self.analysis = json.loads(json.dumps(params))
+        self.save(update_fields=['analysis'])
+        return self.analysis
 
     def create_model(self, cyx_residues=None, protonation_states=None):
         """
         Trajectory.create_model
         """
         with open(os.path.join(self.work_dir, 'cleaned.pdb'), 'r') as stream:
-            topo = Topology(stream)
+            topo = Topology.load(stream, model_class=ColumnarModel)
         topo.create_model(cyx_residues, protonation_states)
-        with open(os.path.join(self.work_dir, 'model.pdb'), 'w') as stream:
-            stream.write(topo.deserialize())
+        model_pdb_file = os.path.join(self.work_dir, 'model.pdb')
+        invalidate_topology(model_pdb_file)
+        with open(model_pdb_file, 'w') as stream:
+            topo.write(stream)
 
     def prepare(self):
         """
@@ -188,7 +211,7 @@ class Work(models.Model):
             )
         return result
 
-    def run_simulation(self, method, index):
+    def run_simulation(self, method, index, dependency=None):
         """
         Trajectory.run_simulation
         """
@@ -198,7 +221,39 @@ class Work(models.Model):
             method,
             '%s' % index
         ]
-        return self.submit_batch(method, 'webmd', subcmd)
+        return self.submit_batch(method, 'webmd', subcmd, dependency=dependency)
+
+    def run_all_simulations(self):
+        """
+        Trajectory.run_all_simulations
+        simulations.yml에서 아직 끝나지 않은 단계를 min, eq, md 순서로 한 번에 제출함
+        각 단계는 --dependency=afterok:<이전 단계 job id> 로 연결되어 이전 단계가 성공하면 바로 시작되며,
+        실행중인 job (preparation 등) 이 있으면 첫 단계는 그 job에 연결함
+        """
+        simulations_file = os.path.join(self.work_dir, 'simulations.yml')
+        result = {'run': False, 'jobs': [], 'trajectory_id': self.id}
+        if not os.path.exists(simulations_file):
+            return result
+
+        with open(simulations_file, 'r') as stream:
+            sim = yaml.load(stream, Loader=yaml.Loader)
+
+        previous = self.slurm_job_id if self.running else None
+        files = set(self.files)
+        order = ('min', 'eq', 'md')
+        for method in sorted(sim, key=lambda x: order.index(x) if x in order else len(order)):
+            for index, item in enumerate(sim[method]):
+                if '%s.pdb' % item['basename'] in files:
+                    continue
+                dependency = 'afterok:%d' % previous if previous else None
+                job = self.run_simulation(method, index, dependency=dependency)
+                if not job['run']:
+                    # 제출에 실패하면 이후 단계는 제출하지 않고 그때까지 제출한 job만 반환함
+                    return dict(result, run=False)
+                previous = job['slurm_job_id']
+                result['jobs'].append({'method': method, 'index': index, 'slurm_job_id': previous})
+        result['run'] = bool(result['jobs'])
+        return result
 
     def run_analysis(self, method, index):
         """
@@ -210,39 +265,33 @@ class Work(models.Model):
             method,
             '%s' % index,
         ]
-        return self.submit_batch(method, 'webmd', subcmd)
+        result = self.submit_batch(method, 'webmd', subcmd)
+        if result['run']:
+            WorkAnalysisJob.objects.update_or_create(
+                job_id=result['slurm_job_id'], defaults={'work': self, 'anal_serial': int(index)})
+        return result
 
-    @working_directory('/home/nbcc')
-    def submit_batch(self, job_name, partition, subcmd):
+    def submit_batch(self, job_name, partition, subcmd, dependency=None):
         """
         Trajectory.submit_batch
         """
-        cmd = [
-            os.path.join(settings.SLURM_HOME, 'bin/sbatch'),
-            '--job-name', job_name,
-            '--partition', partition,
-        ]
-
-        cmd.extend(subcmd)
-        output = subprocess.check_output(cmd)
-        job_id = output.decode().split()[-1]
-        try:
-            slurm_job_id = int(job_id)
-            slurm_job_id_file = os.path.join(self.work_dir, 'slurm_job_id')
-            with open(slurm_job_id_file, 'w') as stream:
-                stream.write('%d' % slurm_job_id)
-            return {
-                'run': True,
-                'slurm_job_id': slurm_job_id,
-                'trajectory_id': self.id
-            }
-        except ValueError:
+        slurm_job_id = execution_backend().submit(subcmd, job_name, partition=partition, dependency=dependency)
+        if slurm_job_id < 0:
             return {
                 'run': False,
                 'slurm_job_id': -1,
                 'trajectory_id': self.id
             }
 
+        slurm_job_id_file = os.path.join(self.work_dir, 'slurm_job_id')
+        with open(slurm_job_id_file, 'w') as stream:
+            stream.write('%d' % slurm_job_id)
+        WorkJob.objects.update_or_create(job_id=slurm_job_id, defaults={'work_id': self.id})
+        return {
+            'run': True,
+            'slurm_job_id': slurm_job_id,
+            'trajectory_id': self.id
+        }
 
     @property
     def slurm_job_id(self):
@@ -260,21 +309,21 @@ class Work(models.Model):
     def running(self):
         """
         이 Trajectory가 batch한 task가 현재 실행중인지 체크
+        squeue를 실행하지 않고 execution backend가 기록한 JobState를 읽음
         """
-        squeue_lines = subprocess.check_output(['squeue', '-h']).decode().split('\n')
-        for line in squeue_lines:
-            job_status = line.strip().split()
-            if job_status and self.slurm_job_id == int(job_status[0]):
-                return True
-        return False
+        return execution_backend().is_active(self.slurm_job_id)
 
     @property
     def pdb(self):
         """
         Modelling 절차상 최종으로 생성된 pdb 파일
         """
+        try:
+            files = set(os.listdir(self.work_dir))
+        except FileNotFoundError:
+            files = set()
         for pdb_file in ['model_solv.pdb', 'model.pdb', 'cleaned.pdb']:
-            if os.path.exists(os.path.join(self.work_dir, pdb_file)):
+            if pdb_file in files:
                 return pdb_file
         return self.filename
 
@@ -285,31 +334,23 @@ class Work(models.Model):
         """
         return os.path.join(settings.WEBMD_DATA_DIR, '%d' % self.id)
 
+    @property
+    def files(self):
+        """
+        work_dir 아래 모든 파일의 상대 경로 (prowave.utils.manifest.list_files)
+        """
+        return list_files(self.work_dir)
+
     @property
     def model_params(self):
         """
         MODEL parameters
         Modeller에서 사용되는 파라메터
+        analysis 컬럼에 저장된 값을 반환하며, 저장된 값이 없는 경우 (이전에 생성된 Trajectory) 에만 PDB를 분석함
         """
-        with open(os.path.join(self.work_dir, self.filename), 'r') as stream:
-            topo = Topology(stream)
-
-        params = {
-            'models': [i for i in range(len(topo.models))],
-            'chains': topo.chains,
-            'solvent_ions': topo.solvent_ions,
-            'non_standards': [],
-            'disulfide_bond_candidates': [],
-            'protonation_states': [],
-        }
-        cleaned_pdb_file = os.path.join(self.work_dir, 'cleaned.pdb')
-        if os.path.exists(cleaned_pdb_file):
-            with open(cleaned_pdb_file, 'r') as stream:
-                cleaned_topo = Topology(stream)
-            params['non_standards'] = cleaned_topo.non_standards
-            params['disulfide_bond_candidates'] = cleaned_topo.disulfide_bond_candidates
-            params['protonation_states'] = cleaned_topo.protonation_states
-        return params
+        if not self.analysis:
+            self.analyze()
+        return self.analysis
 
     @property
     def is_modelled(self):
@@ -327,11 +368,12 @@ class Work(models.Model):
         with open(simulations_file, 'r') as stream:
             sim = yaml.load(stream, Loader=yaml.Loader)
 
+        running = self.running
+        files = set(self.files)
         previous = dict()
         for method, items in sim.items():
             for i, item in enumerate(items):
-                pdb_path = os.path.join(self.work_dir, '%s.pdb' % item['basename'])
-                item['done'] = os.path.exists(pdb_path)
+                item['done'] = '%s.pdb' % item['basename'] in files
                 item['deletable'] = True
                 item['runnable'] = False
                 item['running'] = False
@@ -340,8 +382,8 @@ class Work(models.Model):
                         key, idx, _ = previous.values()
                         sim[key][idx]['deletable'] = False
                 elif not previous or previous['done']:
-                    item['runnable'] = not self.running
-                    item['running'] = self.running
+                    item['runnable'] = not running
+                    item['running'] = running
 
                 base_url = '/api/webmd/files/%d' % self.id
                 item['pdb'] = '%s/%s.pdb' % (base_url, item['basename'])
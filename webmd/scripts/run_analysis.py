@@ -13,10 +13,13 @@ from functools import wraps
 
 import mdtraj as mdt
 import numpy as np
-import requests
 
+from prowave.scripts.jobs import API_HOST, job_event, report_job
+from prowave.scripts.transfer import InputCache, TransferClient, shared_work_dir
 
-PROWAVE_API_HOST = os.environ.get('PROWAVE_API_HOST', 'slurmctld:8000')
+
+# 작업 directory가 compute node에 mount되어 있으면 HTTP 대신 직접 읽고 씀 (prowave.scripts.transfer)
+DATA_DIR = os.environ.get('WEBMD_DATA_DIR', '/data/webmd_data')
 
 
 def temp_directory(func):
@@ -109,6 +112,7 @@ def sasa(ref, trajs):
     return 'sasa.out'
 
 
+@report_job
 @temp_directory
 def main():
     """
@@ -121,17 +125,21 @@ def main():
     args = parser.parse_args()
 
     base_url = 'http://{host}/api/webmd/files/{trajectory_id}'.format(
-        host=PROWAVE_API_HOST,
+        host=API_HOST,
         trajectory_id=args.trajectory_id
     )
     md_index = args.md_index + 1
-    os.makedirs('md')
-    for target_file in ('model.prmtop', 'model.inpcrd', 'md/md%d.dcd' % md_index):
-        reseponse = requests.get('%s/%s' % (base_url, target_file))
-        assert reseponse.status_code == 200
-        with open(target_file, 'wb') as stream:
-            stream.write(reseponse.content)
+    manifest_url = 'http://{host}/api/webmd/manifest/{trajectory_id}'.format(
+        host=API_HOST,
+        trajectory_id=args.trajectory_id
+    )
+    work_dir = shared_work_dir(DATA_DIR, args.trajectory_id, 'model.prmtop')
+    client = TransferClient(cache=InputCache.from_environ())
+    # topology와 초기 좌표는 같은 trajectory의 모든 분석에서 같으므로 node-local input cache에서 찾음
+    client.fetch(base_url, ['model.prmtop', 'model.inpcrd', 'md/md%d.dcd' % md_index], work_dir,
+                 manifest_url=manifest_url, cached=['model.prmtop', 'model.inpcrd'])
 
+    job_event('progress', progress=0.1, message='running %s' % args.method)
     ref = mdt.load('model.inpcrd', top='model.prmtop')
     trajs = mdt.load('md/md%d.dcd' % md_index, top='model.prmtop')
 
@@ -144,12 +152,12 @@ def main():
     elif args.method == 'sasa':
         out_file = sasa(ref, trajs)
 
-    with open(out_file, 'r') as stream:
-        requests.post(
-            '%s/analyses/%s%d.out' % (base_url, args.method, md_index),
-            data={'file': out_file},
-            files={'file': stream},
-        )
+    job_event('progress', progress=0.9, message='uploading results')
+    upload_url = 'http://{host}/api/webmd/uploads/{trajectory_id}'.format(
+        host=API_HOST,
+        trajectory_id=args.trajectory_id
+    )
+    client.store(upload_url, out_file, 'analyses/%s%d.out' % (args.method, md_index), work_dir)
 
 
 if __name__ == '__main__':
@@ -9,10 +9,13 @@ import subprocess
 import tempfile
 from functools import wraps
 
-import requests
+from prowave.scripts.jobs import API_HOST, job_event, report_job
+from prowave.scripts.transfer import TransferClient, shared_work_dir
 
-CONTROLLER_HOST = os.environ.get('PROWAVE_CONTROLLER_HOST', 'slurmctld:8000')
-BASE_URL = 'http://%s/api/webmd/files' % CONTROLLER_HOST
+BASE_URL = 'http://%s/api/webmd/files' % API_HOST
+UPLOAD_URL = 'http://%s/api/webmd/uploads' % API_HOST
+# 작업 directory가 compute node에 mount되어 있으면 HTTP 대신 직접 읽고 씀 (prowave.scripts.transfer)
+DATA_DIR = os.environ.get('WEBMD_DATA_DIR', '/data/webmd_data')
 
 
 def temp_directory(func):
@@ -32,6 +35,7 @@ def temp_directory(func):
     return wrapper
 
 
+@report_job
 @temp_directory
 def main():
     """
@@ -42,13 +46,13 @@ def main():
     args = parser.parse_args()
 
     # get cleaned.pdb from controller
-    get_url = '%s/%d/model.pdb' % (BASE_URL, args.trajectory_id)
-    get_response = requests.get(get_url)
-    if get_response.status_code == 200:
-        with open('model.pdb', 'wb+') as stream:
-            stream.write(get_response.content)
+    # autotleap이 model.pdb를 다시 쓰므로 mount된 경우에도 link가 아닌 복사본을 사용함
+    work_dir = shared_work_dir(DATA_DIR, args.trajectory_id, 'model.pdb')
+    client = TransferClient()
+    client.fetch('%s/%d' % (BASE_URL, args.trajectory_id), ['model.pdb'], work_dir, copy=True)
 
     assert os.path.exists('model.pdb')
+    job_event('progress', progress=0.1, message='running tleap')
     subprocess.check_call([
         '/home/nbcc/prowave_compute/autotleap.py',
         '.',
@@ -64,20 +68,14 @@ def main():
         print(log_output.decode())
 
     shutil.move('model.pdb', 'model_solv.pdb')
+    job_event('progress', progress=0.9, message='uploading results')
     for file_to_post in ['model_solv.pdb',
                          'model.prmtop',
                          'model.inpcrd',
                          'leaprc',
                          'leap.log']:
         if os.path.exists(file_to_post):
-            post_url = '%s/%d/%s' % (BASE_URL, args.trajectory_id, file_to_post)
-            with open(file_to_post, 'rb') as stream:
-                post_response = requests.post(
-                    post_url,
-                    data={'file': file_to_post},
-                    files={'file': stream}
-                )
-            assert post_response.status_code == 201
+            client.store('%s/%d' % (UPLOAD_URL, args.trajectory_id), file_to_post, work_dir=work_dir)
 
 
 if __name__ == '__main__':
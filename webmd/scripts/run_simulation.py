@@ -9,11 +9,14 @@ import subprocess
 import tempfile
 from functools import wraps
 
-import requests
 import yaml
 
+from prowave.scripts.jobs import API_HOST, job_event, report_job
+from prowave.scripts.transfer import InputCache, TransferClient, shared_work_dir
 
-PROWAVE_API_HOST = os.environ.get('PROWAVE_API_HOST', 'slurmctld:8000')
+
+# 작업 directory가 compute node에 mount되어 있으면 HTTP 대신 직접 읽고 씀 (prowave.scripts.transfer)
+DATA_DIR = os.environ.get('WEBMD_DATA_DIR', '/data/webmd_data')
 
 
 def temp_directory(func):
@@ -33,35 +36,7 @@ def temp_directory(func):
     return wrapper
 
 
-def download_file(base_url, file_path):
-    """
-    downoload file
-    """
-    get_response = requests.get('%s/%s' % (base_url, file_path))
-    assert get_response.status_code == 200
-
-    base_dir = os.path.dirname(file_path)
-    if base_dir:
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-    with open(file_path, 'wb+') as stream:
-        stream.write(get_response.content)
-        return get_response.content
-
-
-def upload_file(base_url, file_path):
-    """
-    upload file
-    """
-    with open(file_path, 'rb') as stream:
-        post_response = requests.post(
-            '%s/%s' % (base_url, file_path),
-            data={'file': file_path},
-            files={'file': stream}
-        )
-        assert post_response.status_code == 201
-
-
+@report_job
 @temp_directory
 def main():
     """
@@ -74,11 +49,21 @@ def main():
     args = parser.parse_args()
 
     base_url = 'http://{host}/api/webmd/files/{trajectory_id}'.format(
-        host=PROWAVE_API_HOST,
+        host=API_HOST,
+        trajectory_id=args.trajectory_id
+    )
+    upload_url = 'http://{host}/api/webmd/uploads/{trajectory_id}'.format(
+        host=API_HOST,
         trajectory_id=args.trajectory_id
     )
+    manifest_url = 'http://{host}/api/webmd/manifest/{trajectory_id}'.format(
+        host=API_HOST,
+        trajectory_id=args.trajectory_id
+    )
+    work_dir = shared_work_dir(DATA_DIR, args.trajectory_id, 'simulations.yml')
+    client = TransferClient(cache=InputCache.from_environ())
 
-    download_file(base_url, 'simulations.yml')
+    client.fetch(base_url, ['simulations.yml'], work_dir)
     assert os.path.exists('simulations.yml')
 
     with open('simulations.yml', 'r') as stream:
@@ -87,10 +72,10 @@ def main():
     assert args.method in simulations
     assert len(simulations[args.method]) > args.index
     simulation = simulations[args.method][args.index]
-    download_file(base_url, 'model.prmtop')
-
     assert 'reference' in simulation
-    download_file(base_url, simulation['reference'])
+    # model.prmtop은 모든 단계에서 같으므로 node-local input cache에서 찾음
+    client.fetch(base_url, ['model.prmtop', simulation['reference']], work_dir,
+                 manifest_url=manifest_url, cached=['model.prmtop'])
 
     assert 'basename' in simulation
     basename = simulation['basename']
@@ -145,11 +130,14 @@ def main():
                    'cutoff'):
             cmd.extend(['--%s' % key, str(value)])
 
+    job_event('progress', progress=0.1, message='running %s' % args.method)
     subprocess.check_call(cmd)
 
+    job_event('progress', progress=0.9, message='uploading results')
+
     for file_to_upload in (state_file, pdb_file, out_file, traj_file):
         if os.path.exists(file_to_upload):
-            upload_file(base_url, file_to_upload)
+            client.store(upload_url, file_to_upload, work_dir=work_dir)
 
 
 if __name__ == '__main__':
@@ -18,7 +18,7 @@ class TrajectorySerializer(serializers.ModelSerializer):
         Meta
         """
         model = Trajectory
-        fields = '__all__'
+        exclude = ('analysis',)
 
 
 class ProjectSerializer(serializers.ModelSerializer):
@@ -1,7 +1,26 @@
 """
 webmd.tests
 """
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from prowave.models import JobState
+from prowave.tests import sbatch_calls, write_fake_sbatch
+
+from .models import Work as Trajectory, WorkJob
+from .serializers import TrajectorySerializer
+
+
+ARTIFACTS_DIR = os.path.join(settings.BASE_DIR, 'prowave/utils/_artifacts_')
+
 
 # Create your tests here.
 class WebmdTestCase(TestCase):
@@ -18,3 +37,198 @@ class WebmdTestCase(TestCase):
         test true
         """
         self.assertTrue(True)
+
+
+class TrajectoryTestCase(TestCase):
+    """
+    webmd.models.Work (Trajectory) Test Case
+    """
+    def setUp(self):
+        """
+        set up
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            WEBMD_DATA_DIR=os.path.join(self.temp_dir, 'webmd_data'),
+            PDB_CACHE_DIR=os.path.join(self.temp_dir, 'pdb_cache'),
+        )
+        self.settings_override.enable()
+        self.owner = User.objects.create(username='webmd')
+
+    def tearDown(self):
+        """
+        tear down
+        """
+        self.settings_override.disable()
+        shutil.rmtree(self.temp_dir)
+
+    def create_trajectory(self, pdb_name='1AVD.pdb'):
+        """
+        _artifacts_의 PDB 파일을 업로드하여 Trajectory 생성
+        """
+        with open(os.path.join(ARTIFACTS_DIR, pdb_name), 'rb') as stream:
+            pdb_file = SimpleUploadedFile(pdb_name, stream.read())
+        return Trajectory.create(owner=self.owner, source='upload', project=None, file=pdb_file)
+
+    def test_analysis_stored_on_create_and_cleanup(self):
+        """
+        생성 및 cleanup 시점에 분석결과가 저장되고, 이후 model_params는 PDB를 읽지 않는지 확인
+        """
+        trajectory = self.create_trajectory()
+        self.assertEqual(trajectory.analysis['models'], [0])
+        self.assertEqual(sorted(trajectory.analysis['chains']), ['A', 'B'])
+        self.assertEqual(trajectory.analysis['disulfide_bond_candidates'], [])
+
+        trajectory.cleanup(0, [], [])
+        self.assertEqual(len(trajectory.analysis['disulfide_bond_candidates']), 2)
+
+        trajectory = Trajectory.objects.get(id=trajectory.id)
+        with mock.patch('webmd.models.load_topology', side_effect=AssertionError):
+            data = TrajectorySerializer(trajectory).data
+        self.assertEqual(data['model_params'], trajectory.analysis)
+        self.assertNotIn('analysis', data)
+
+    def test_model_params_backfill(self):
+        """
+        분석결과가 저장되지 않은 Trajectory는 model_params를 처음 읽을 때 분석결과를 저장하는지 확인
+        """
+        trajectory = self.create_trajectory()
+        Trajectory.objects.filter(id=trajectory.id).update(analysis={})
+        trajectory = Trajectory.objects.get(id=trajectory.id)
+        self.assertEqual(trajectory.model_params['models'], [0])
+        self.assertEqual(Trajectory.objects.get(id=trajectory.id).analysis, trajectory.model_params)
+
+    def test_simulations_running(self):
+        """
+        JobState에 실행중으로 기록된 job이 있으면 다음 단계를 running으로 표시하는지 확인
+        """
+        trajectory = self.create_trajectory()
+        shutil.copy(os.path.join(settings.BASE_DIR, '_artifacts_/sample_trajectory/simulations.yml'),
+                    trajectory.work_dir)
+        with open(os.path.join(trajectory.work_dir, 'slurm_job_id'), 'w') as stream:
+            stream.write('101')
+
+        JobState.submitted(101)
+
+        with override_settings(SQUEUE_EXE=os.path.join(self.temp_dir, 'missing-squeue')):
+            simulations = trajectory.simulations
+        self.assertTrue(simulations['min'][0]['running'])
+        self.assertFalse(simulations['min'][0]['runnable'])
+        self.assertFalse(simulations['min'][1]['running'])
+
+        JobState.objects.filter(job_id=101).update(state='COMPLETED')
+        self.assertTrue(trajectory.simulations['min'][0]['runnable'])
+
+    def test_run_all_simulations(self):
+        """
+        끝나지 않은 단계를 모두 제출하고, 각 단계가 이전 단계 (또는 실행중인 job) 에 afterok로 연결되는지 확인
+        """
+        trajectory = self.create_trajectory()
+        shutil.copy(os.path.join(settings.BASE_DIR, '_artifacts_/sample_trajectory/simulations.yml'),
+                    trajectory.work_dir)
+        os.makedirs(os.path.join(trajectory.work_dir, 'min'))
+        open(os.path.join(trajectory.work_dir, 'min/min1.pdb'), 'w').close()
+        with open(os.path.join(trajectory.work_dir, 'slurm_job_id'), 'w') as stream:
+            stream.write('101')
+        JobState.submitted(101)
+
+        with override_settings(SBATCH_EXE=write_fake_sbatch(self.temp_dir), SBATCH_WORKING_DIR=self.temp_dir):
+            result = trajectory.run_all_simulations()
+        jobs = result['jobs']
+        self.assertTrue(result['run'])
+        self.assertEqual([(job['method'], job['index']) for job in jobs],
+                         [('min', 1), ('eq', 0), ('eq', 1), ('md', 0), ('md', 1)])
+
+        calls = [args for _, _, args in sbatch_calls(self.temp_dir)]
+        previous = [101] + [job['slurm_job_id'] for job in jobs[:-1]]
+        for args, job_id, job in zip(calls, previous, jobs):
+            self.assertIn('--dependency afterok:%d --kill-on-invalid-dep=yes' % job_id, args)
+            self.assertTrue(args.endswith('%d %s %d' % (trajectory.id, job['method'], job['index'])))
+        self.assertEqual(trajectory.slurm_job_id, jobs[-1]['slurm_job_id'])
+        self.assertEqual(WorkJob.objects.filter(work_id=trajectory.id).count(), 5)
+        self.assertTrue(trajectory.simulations['min'][1]['running'])
+
+    def test_files_download(self):
+        """
+        파일을 한 번에 읽지 않고 FILE_RESPONSE_CHUNK_SIZE 단위로 스트림하고,
+        SENDFILE_HEADER가 지정되면 파일 경로만 header로 보내는지 확인
+        """
+        base_dir = os.path.join(self.temp_dir, 'webmd_data/3/md')
+        os.makedirs(base_dir)
+        data = os.urandom(300000)
+        with open(os.path.join(base_dir, 'md1.dcd'), 'wb') as stream:
+            stream.write(data)
+
+        with override_settings(FILE_RESPONSE_CHUNK_SIZE=65536):
+            response = self.client.get('/api/webmd/files/3/md/md1.dcd')
+            chunks = list(response.streaming_content)
+        self.assertEqual(response['Content-Length'], '300000')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="md1.dcd"')
+        self.assertEqual([len(chunk) for chunk in chunks], [65536] * 4 + [300000 - 65536 * 4])
+        self.assertEqual(b''.join(chunks), data)
+
+        file_path = os.path.join(base_dir, 'md1.dcd')
+        with override_settings(SENDFILE_HEADER='X-Sendfile'):
+            response = self.client.get('/api/webmd/files/3/md/md1.dcd')
+        self.assertEqual(response['X-Sendfile'], file_path)
+        self.assertFalse(response.streaming)
+
+        # SENDFILE_ROOT 밖의 파일은 직접 스트림함
+        with override_settings(SENDFILE_HEADER='X-Accel-Redirect', SENDFILE_ROOT='/data'):
+            response = self.client.get('/api/webmd/files/3/md/md1.dcd')
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(b''.join(response.streaming_content), data)
+
+        # trajectory directory 밖을 가리키는 경로는 읽거나 쓰지 않음
+        self.assertEqual(self.client.get('/api/webmd/files/3/../4/md/md1.dcd').status_code, 400)
+        response = self.client.post('/api/webmd/files/3/../4/model.prmtop',
+                                    {'file': SimpleUploadedFile('model.prmtop', b'prmtop')})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'webmd_data/4')))
+
+    def test_chunked_upload(self):
+        """
+        init, offset을 지정한 chunk PUT, checksum commit으로 work directory에 바로 업로드하고
+        끊긴 upload는 controller가 받은 offset부터 이어서 보낼 수 있는지 확인
+        """
+        url = '/api/webmd/uploads/3/md/md1.dcd'
+        file_path = os.path.join(self.temp_dir, 'webmd_data/3/md/md1.dcd')
+        data = os.urandom(250000)
+
+        self.assertEqual(self.client.post(url, {'action': 'init'}).json(), {'offset': 0})
+        response = self.client.put(url + '?offset=0', data[:100000], content_type='application/octet-stream')
+        self.assertEqual(response.json(), {'offset': 100000})
+        self.assertTrue(os.path.exists(file_path + '.part'))
+        self.assertFalse(os.path.exists(file_path))
+
+        # 받지 않은 구간을 건너뛴 chunk는 409와 받은 offset
+        response = self.client.put(url + '?offset=200000', data[200000:], content_type='application/octet-stream')
+        self.assertEqual((response.status_code, response.json()), (409, {'offset': 100000}))
+
+        # 다시 init하면 이어서 보낼 offset을 받고, 같은 chunk를 다시 보내도 됨
+        offset = self.client.post(url, {'action': 'init'}).json()['offset']
+        for start in (offset, 50000, 100000, 200000):
+            response = self.client.put(url + '?offset=%d' % start, data[start:start + 100000],
+                                       content_type='application/octet-stream')
+        self.assertEqual(response.json(), {'offset': 250000})
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        response = self.client.post(url, {'action': 'commit', 'sha256': sha256, 'size': 250000})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(os.path.exists(file_path + '.part'))
+        with open(file_path, 'rb') as stream:
+            self.assertEqual(stream.read(), data)
+
+        # checksum이 맞지 않으면 받은 내용을 버림
+        self.client.post(url, {'action': 'init'})
+        self.client.put(url + '?offset=0', b'broken', content_type='application/octet-stream')
+        response = self.client.post(url, {'action': 'commit', 'sha256': sha256})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(os.path.exists(file_path + '.part'))
+        self.assertEqual(self.client.post(url, {'action': 'commit', 'sha256': sha256}).status_code, 404)
+
+        self.assertEqual(self.client.post('/api/webmd/uploads/3/../4/model.prmtop', {'action': 'init'}).status_code,
+                         400)
+
+        manifest = self.client.get('/api/webmd/manifest/3').json()['files']
+        self.assertEqual([(item['path'], item['sha256']) for item in manifest], [('md/md1.dcd', sha256)])
@@ -1,13 +1,27 @@
 """
 webmd.views
 
-파일 경로를 인자로 받아서 파일을 스트림하는 endpoint
+파일 경로를 인자로 받아서 파일을 스트림하거나 업로드 받는 endpoint
 """
+import hashlib
 import os
 from django.conf import settings
-from django.core.files.base import ContentFile
-from django.http.response import HttpResponse
+from django.http.response import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from prowave.utils.fileresponse import file_response
+from prowave.utils.manifest import record_checksum, work_manifest
+from prowave.utils.uploads import commit_upload, init_upload, write_chunk
+
+
+def work_file_path(traj_id, filename):
+    """
+    webmd_data directory의 파일 경로, trajectory directory 밖을 가리키면 None
+    """
+    base_dir = os.path.join(settings.WEBMD_DATA_DIR, traj_id)
+    file_path = os.path.normpath(os.path.join(base_dir, filename))
+    if not file_path.startswith(os.path.join(base_dir, '')):
+        return None
+    return file_path
 
 
 # Create your views here.
@@ -16,7 +30,9 @@ def files(request, traj_id, filename):
     """
     webmd_data direcotory의 파일을 스트림하는 view
     """
-    file_path = os.path.join(settings.WEBMD_DATA_DIR, traj_id, filename)
+    file_path = work_file_path(traj_id, filename)
+    if file_path is None:
+        return HttpResponse("Invalid file path.", status=400)
 
     if request.method == 'POST':
         file = request.FILES.get('file')
@@ -24,17 +40,64 @@ def files(request, traj_id, filename):
         if not os.path.exists(base_dir):
             os.makedirs(base_dir)
 
+        sha256 = hashlib.sha256()
         with open(file_path, 'wb') as stream:
             for chunk in file.chunks():
                 stream.write(chunk)
-            return HttpResponse("File uploaded successfully.", status=201)    
+                sha256.update(chunk)
+        record_checksum(file_path, sha256.hexdigest())
+        return HttpResponse("File uploaded successfully.", status=201)
 
     if not os.path.exists(file_path):
         return HttpResponse("File not found.", status=404)
 
-    with open(file_path, 'rb') as stream:
-        file_to_send = ContentFile(stream.read())
-        response = HttpResponse(file_to_send, 'application/octet-stream')
-        response['Content-Length'] = file_to_send.size
-        response['Content-Disposition'] = 'attachment; filename="%s"' % os.path.basename(file_path)
-        return response
+    return file_response(request, file_path)
+
+
+@csrf_exempt
+def uploads(request, traj_id, filename):
+    """
+    webmd_data directory에 파일을 나누어 업로드 받는 view (prowave.utils.uploads)
+
+    POST action=init → {'offset'}, PUT ?offset=<N> → {'offset'}, POST action=commit, sha256, size → 201
+    """
+    file_path = work_file_path(traj_id, filename)
+    if file_path is None:
+        return HttpResponse("Invalid file path.", status=400)
+
+    try:
+        if request.method == 'PUT':
+            try:
+                offset = int(request.GET.get('offset', ''))
+            except ValueError:
+                return HttpResponse("offset is required.", status=400)
+            try:
+                return JsonResponse({'offset': write_chunk(file_path, offset, request)})
+            except ValueError:
+                return JsonResponse({'offset': init_upload(file_path)}, status=409)
+
+        if request.method != 'POST':
+            return HttpResponse(status=405)
+
+        action = request.POST.get('action')
+        if action == 'init':
+            return JsonResponse({'offset': init_upload(file_path)})
+        if action == 'commit':
+            size = request.POST.get('size')
+            if not commit_upload(file_path, request.POST.get('sha256', ''), int(size) if size else None):
+                return HttpResponse("Checksum mismatch.", status=400)
+            # commit에서 확인한 SHA-256을 저장하므로 manifest에서 다시 계산하지 않음
+            record_checksum(file_path, request.POST['sha256'])
+            return HttpResponse("File uploaded successfully.", status=201)
+    except FileNotFoundError:
+        return HttpResponse("Upload not found.", status=404)
+    return HttpResponse("Unknown action.", status=400)
+
+
+def manifest(request, traj_id):
+    """
+    trajectory directory 파일의 path, size, mtime, sha256 (prowave.utils.manifest), SHA-256이 저장된 파일만 포함함
+    ?path= 로 파일을 지정하면 그 파일만 포함하며, compute node의 input cache (prowave.scripts.transfer.InputCache) 가 사용함
+    """
+    paths = request.GET.getlist('path') or None
+    return JsonResponse({'files': work_manifest(os.path.join(settings.WEBMD_DATA_DIR, traj_id), paths)})
@@ -132,6 +132,14 @@ class TrajectoryViewSet(viewsets.ModelViewSet):
         index = request.data.get('index')
         return Response(trajectory.run_simulation(method, index))
 
+    @action(['POST'], url_path='run-all', detail=True)
+    def run_all_simulations(self, request, pk=None):
+        """
+        webmd.viewsets.TrajectoryViewSet.run_all_simulations
+        끝나지 않은 모든 simulation 단계를 dependency로 연결하여 한 번에 제출
+        """
+        trajectory = self.get_object()
+        return Response(trajectory.run_all_simulations())
 
     @action(['GET'], url_path='analyses', detail=True)
     def analyses(self, request, pk=None):
@@ -276,7 +284,12 @@ class ProjectViewSet(viewsets.ModelViewSet):
         else:
             create_args['file'] = request.data['pdb_file']
 
-        Trajectory.create(**create_args)
+        try:
+            Trajectory.create(**create_args)
+        except ValueError as e:
+            # PDB 형식으로 변환할 수 없는 구조 (chain이 너무 많은 mmCIF 등)
+            transaction.set_rollback(True)
+            return Response(data={'created': False, 'message': str(e)}, status=400)
         return Response(data=self.serializer_class(instance).data)
 
 router = routers.DefaultRouter()